@@ -4,14 +4,26 @@
 '''A DCC-agnostic adapter class to inherit and extend for software.'''
 
 # IMPORT STANDARD LIBRARIES
+import hashlib
 import logging
 import tarfile
-import zipfile
+import glob
 import abc
 import os
 
 # IMPORT LOCAL LIBRARIES
+from ..utils import install_metadata
+from ..utils import install_profile
+from ..utils import staged_install
+from ..utils import delta_install
+from ..utils import archive_cache
+from ..utils import file_store
 from ..strategies import internet
+from ..utils import tar_extract
+from ..utils import gzip_index
+from ..strategies import mirror
+from ..utils import zip_extract
+from ..utils import repack
 from ..utils import progressbar
 from ..utils import config
 from ..vendors import six
@@ -28,6 +40,19 @@ class BaseAdapter(object):
     name = ''
     strategies = []
 
+    # If True, the internet strategy may extract this adapter's TAR archive while it downloads
+    can_stream_extract = False
+
+    # If more than 0, TAR archives are extracted by `rezzurect.utils.tar_extract`
+    # using this many writer threads, instead of by `tarfile.TarFile.extractall`
+    #
+    tar_extraction_workers = 0
+
+    # `fnmatch` patterns for the file names which this adapter needs from its
+    # outer archive. If there are any, every other member is skipped.
+    #
+    archive_include_patterns = ()
+
     def __init__(self, version, architecture):
         '''Create the instance and store the user's architecture.
 
@@ -61,10 +86,14 @@ class BaseAdapter(object):
             raise EnvironmentError('Tar file "{path}" does not exist.'
                                    ''.format(path=path))
 
-        cls._extract_tar_file(path)
+        cls._extract_tar_file(
+            path,
+            cls.get_tar_destination(source, version),
+            include=cls.archive_include_patterns,
+        )
 
-    @staticmethod
-    def _extract_tar_file(path, destination=''):
+    @classmethod
+    def _extract_tar_file(cls, path, destination='', include=None, exclude=None):
         '''Extract the given TAR archive file to some path on-disk.
 
         Args:
@@ -74,12 +103,76 @@ class BaseAdapter(object):
                 The location where `path` TAR will be extracted to.
                 If no destination is given, the TAR archive's directory will
                 be used instead. Default: "".
+            include (iterable[str], optional):
+                `fnmatch` patterns for the file names of the members to
+                extract. Every other member is skipped. Default: Every member.
+            exclude (iterable[str], optional):
+                Install profile globs for the paths to skip. See `get_excluded_patterns`.
 
         '''
         if not destination:
             destination = os.path.dirname(path)
 
         LOGGER.debug('Extracting tar file "%s".', path)
+        store = get_file_store()
+        repacked = get_repack_path(path)
+
+        if repacked:
+            try:
+                repack.extract(
+                    repacked,
+                    destination,
+                    processes=config.ZIP_EXTRACTION_PROCESSES,
+                    include=include,
+                    exclude=exclude,
+                    store=store,
+                )
+            except Exception:
+                LOGGER.exception('Repacked archive "%s" failed to extract.', repacked)
+                raise
+
+            LOGGER.debug('Tar extraction finished.')
+
+            return
+
+        if config.GZIP_INDEX and gzip_index.is_supported(path) and not include:
+            try:
+                gzip_index.extract(
+                    path,
+                    destination,
+                    base=_get_gzip_index_base(path),
+                    spacing=config.GZIP_INDEX_SPACING,
+                    processes=config.GZIP_INDEX_PROCESSES,
+                    workers=cls.tar_extraction_workers or tar_extract.DEFAULT_WORKERS,
+                    exclude=exclude,
+                    store=store,
+                )
+            except Exception:
+                LOGGER.exception('Tar file "%s" failed to extract.', path)
+                raise
+
+            LOGGER.debug('Tar extraction finished.')
+
+            return
+
+        # `tarfile` writes into existing files, which could be shared with the file store
+        if cls.tar_extraction_workers or include or exclude or store:
+            try:
+                tar_extract.extract(
+                    progressbar.TarProgressFile(path, logger=LOGGER.trace),
+                    destination,
+                    workers=cls.tar_extraction_workers or tar_extract.DEFAULT_WORKERS,
+                    include=include,
+                    exclude=exclude,
+                    store=store,
+                )
+            except Exception:
+                LOGGER.exception('Tar file "%s" failed to extract.', path)
+                raise
+
+            LOGGER.debug('Tar extraction finished.')
+
+            return
 
         with tarfile.open(fileobj=progressbar.TarProgressFile(path, logger=LOGGER.trace)) as tar:
             try:
@@ -90,8 +183,52 @@ class BaseAdapter(object):
             else:
                 LOGGER.debug('Tar extraction finished.')
 
+    @classmethod
+    def _extract_nested_tar_file(cls, path, routes, manifest=False):
+        '''Extract the TAR archives inside of the TAR archive at `path`, in one pass.
+
+        Args:
+            path (str):
+                The location of the outer TAR archive.
+            routes (iterable[tuple[str, str, list[str], str]]):
+                An `fnmatch` pattern for the file name of some inner archive,
+                the folder to extract it into and, optionally, the paths to
+                skip and a sibling install folder to link unchanged files from.
+                See `rezzurect.utils.tar_extract.extract_nested`.
+            manifest (bool, optional):
+                If True, a manifest of the extracted files is written into each route's folder.
+
+        Returns:
+            list[str]: The name of every inner archive which was extracted.
+
+        '''
+        LOGGER.debug('Extracting nested tar file "%s".', path)
+        repacked = get_repack_path(path)
+        workers = cls.tar_extraction_workers or tar_extract.DEFAULT_WORKERS
+
+        try:
+            if repacked:
+                # Each inner archive is extracted on its own thread
+                extracted = repack.extract_nested(
+                    repacked, routes, workers=workers, store=get_file_store(), manifest=manifest)
+            else:
+                extracted = tar_extract.extract_nested(
+                    progressbar.TarProgressFile(path, logger=LOGGER.trace),
+                    routes,
+                    workers=workers,
+                    store=get_file_store(),
+                    manifest=manifest,
+                )
+        except Exception:
+            LOGGER.exception('Tar file "%s" failed to extract.', path)
+            raise
+
+        LOGGER.debug('Tar extraction finished.')
+
+        return extracted
+
     @staticmethod
-    def _extract_zip(zip_file_path, destination):
+    def _extract_zip(zip_file_path, destination, exclude=None, sibling='', manifest=False):
         '''Extract a ZIP file to some file location.
 
         Args:
@@ -100,14 +237,28 @@ class BaseAdapter(object):
             destination (str):
                 An absolute path to a directory where `zip_file_path`
                 will be extracted to.
+            exclude (iterable[str], optional):
+                Install profile globs for the paths to skip. See `get_excluded_patterns`.
+            sibling (str, optional):
+                The install folder of another version to link unchanged files from.
+                See `get_delta_sibling`.
+            manifest (bool, optional):
+                If True, `destination` is an install folder and a manifest of its files is written.
 
         '''
-        with zipfile.ZipFile(zip_file_path, 'r') as zip_file:
-            try:
-                zip_file.extractall(destination)
-            except Exception:  # pylint: disable=broad-except
-                LOGGER.exception('Zip file "%s" failed to unzip.', zip_file_path)
-                raise
+        try:
+            zip_extract.extract(
+                zip_file_path,
+                destination,
+                processes=config.ZIP_EXTRACTION_PROCESSES,
+                exclude=exclude,
+                store=get_file_store(),
+                sibling=sibling,
+                manifest=manifest,
+            )
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Zip file "%s" failed to unzip.', zip_file_path)
+            raise
 
     @abc.abstractmethod
     def install_from_local(self, source, install):
@@ -131,6 +282,52 @@ class BaseAdapter(object):
         '''str: Get the recommended folder for archive (installer) files to be.'''
         return os.path.join(root, 'archive')
 
+    def get_delta_sibling(self, install):
+        '''Find an installed version of this package to reuse unchanged files from.
+
+        See `rezzurect.utils.delta_install` for details.
+
+        Args:
+            install (str): The absolute path to the folder which this version is installed into.
+
+        Returns:
+            str: The sibling's install folder or "", if there is none or delta installs are off.
+
+        '''
+        if not config.DELTA_INSTALL:
+            return ''
+
+        # `install` may be a stage, which is compared to its siblings as if it were in place
+        sibling = delta_install.find_sibling(
+            staged_install.get_target(install), self.name, self.version)
+
+        if sibling:
+            LOGGER.info('Version "%s" will reuse unchanged files of "%s".', self.version, sibling)
+
+        return sibling
+
+    def get_excluded_patterns(self):
+        '''Get the globs of the paths which the user's install profile skips.
+
+        See `rezzurect.utils.install_profile` for details.
+
+        Returns:
+            list[str]: The globs, relative to the install folder. It's empty for the "full" profile.
+
+        '''
+        return install_profile.get_patterns(
+            self.name, config.INSTALL_PROFILE, config.INSTALL_PROFILES)
+
+    @classmethod
+    def get_tar_destination(cls, source, version):
+        '''str: Get the folder where the TAR archive of `version` extracts to.'''
+        return cls.get_archive_folder(source)
+
+    @classmethod
+    def get_archive_name_pattern(cls, version):
+        '''str: Get the file name (or `fnmatch` pattern) of the archive for `version`.'''
+        return os.path.basename(cls.get_archive_path_from_version('', version))
+
     @classmethod
     def get_archive_path(cls, root, file_name):
         '''str: Get the recommended folder for archive (installer) files to be.'''
@@ -195,6 +392,9 @@ class BaseAdapter(object):
     def get_strategies(cls):
         '''Get registered build strategies for this class in execution-order.
 
+        Strategies in the order which aren't registered (such as "mirror",
+        on hosts with no mirrors) are skipped.
+
         Returns:
             list[str, callable[`rezzurect.adapters.base_builder.BaseAdapter`]]:
                 The found strategies.
@@ -202,7 +402,12 @@ class BaseAdapter(object):
         '''
         strategies = {name: strategy for name, strategy in cls.strategies}
         order = cls.get_strategy_order()
-        return [(name, strategies[name]) for name in order]
+        missing = [name for name in order if name not in strategies]
+
+        if missing:
+            LOGGER.debug('Strategies "%s" are not registered and will be skipped.', missing)
+
+        return [(name, strategies[name]) for name in order if name in strategies]
 
     def make_install(self):
         '''Try different build methods until something works.
@@ -233,6 +438,99 @@ class BaseAdapter(object):
         return set()
 
 
+def get_file_store():
+    '''Get the store which every extracted file is shared with, if the user enabled it.
+
+    See `rezzurect.utils.file_store` for details.
+
+    Returns:
+        `rezzurect.utils.file_store.FileStore` or NoneType: The store, if it's enabled.
+
+    '''
+    return file_store.get_store(config.FILE_STORE, config.REZ_PACKAGE_ROOT)
+
+
+def get_repack_path(path):
+    '''Find the repacked copy of the archive at `path`, if it has one.
+
+    See `rezzurect.utils.repack` for details.
+
+    Args:
+        path (str): The absolute path to some archive file.
+
+    Returns:
+        str: The absolute path to the repacked copy, in the archive cache, if it exists.
+
+    '''
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+
+    if not cache or not os.path.isfile(path):
+        return ''
+
+    cached_path = cache.find_file(path)
+
+    if not cached_path or not os.path.isfile(repack.get_path(cached_path)):
+        return ''
+
+    return repack.get_path(cached_path)
+
+
+def repack_archive(path):
+    '''Repack the archive at `path` in the archive cache, unless it's already repacked.
+
+    A failure is logged but never raised because the original archive can
+    still be installed.
+
+    Args:
+        path (str): The absolute path to some verified archive file.
+
+    Returns:
+        str: The absolute path to the repacked copy, if there is one.
+
+    '''
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+    cached_path = cache.find_file(path) if cache else ''
+
+    if not cached_path or not repack.is_supported(cached_path):
+        return ''
+
+    repacked = repack.get_path(cached_path)
+
+    if os.path.isfile(repacked):
+        return repacked
+
+    try:
+        return repack.repack(cached_path, repacked)
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception('Archive "%s" could not be repacked.', cached_path)
+
+        return ''
+
+
+def _get_gzip_index_base(path):
+    '''Find where the seek-point index of the archive at `path` should be stored.
+
+    Archives in the archive cache are shared by every package folder so their
+    index is kept beside the cached copy, where every install can reuse it.
+
+    Args:
+        path (str): The absolute path to some gzip-compressed TAR archive.
+
+    Returns:
+        str: The path which the index files are named after. See `rezzurect.utils.gzip_index`.
+
+    '''
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+
+    if cache:
+        cached_path = cache.find_file(path)
+
+        if cached_path:
+            return cached_path
+
+    return path
+
+
 def add_from_internet_build(package, system, architecture, source_path, install_path, adapter):
     '''Download the installer for `package` and then install it.
 
@@ -256,6 +554,26 @@ def add_from_internet_build(package, system, architecture, source_path, install_
     '''
     destination = adapter.get_archive_folder(source_path)
 
+    if not os.path.isdir(destination):
+        os.makedirs(destination)
+
+    if config.STREAM_EXTRACTION and adapter.can_stream_extract:
+        internet.stream_extract(
+            package,
+            adapter.version,
+            system,
+            architecture,
+            destination,
+            adapter.get_tar_destination(source_path, adapter.version),
+            include=adapter.archive_include_patterns,
+        )
+
+        LOGGER.info('Streamed package/version "%s/%s".', package, adapter.version)
+
+        add_local_filesystem_build(source_path, install_path, adapter)
+
+        return
+
     destination = internet.download(
         package,
         adapter.version,
@@ -279,6 +597,73 @@ def add_from_internet_build(package, system, architecture, source_path, install_
     add_local_filesystem_build(source_path, install_path, adapter)
 
 
+def add_from_mirror_build(package, system, architecture, source_path, install_path, adapter):
+    '''Download the installer for `package` from the fastest studio mirror and install it.
+
+    Args:
+        package (str):
+            The name of packaget to get an installer from a mirror.
+        system (str):
+            The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (str):
+            The bits of the `system`. Example: "x86_64", "AMD64", etc.
+        source_path (str):
+            The absolute path to where the Rez package is located, on-disk.
+        install_path (str):
+            The absolute path to where the package will be installed into.
+        adapter (`rezzurect.adapters.base_builder.BaseAdapter`):
+            The object which is used to "install" the files.
+
+    Raises:
+        RuntimeError:
+            If no mirrors are configured or no mirror has the installer.
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`:
+            If the downloaded installer doesn't match its expected digest.
+
+    '''
+    if not config.MIRRORS:
+        raise RuntimeError('No mirrors are defined. Add a "mirrors" list to your .respawnrc.')
+
+    file_name = internet.get_archive_file_name(package, adapter.version, system, architecture)
+
+    if not file_name:
+        file_name = adapter.get_archive_name_pattern(adapter.version)
+
+    if not file_name or glob.has_magic(file_name):
+        raise RuntimeError(
+            'Package/Version "{package}/{adapter.version}" has no known archive name.'
+            ''.format(package=package, adapter=adapter))
+
+    destination = adapter.get_archive_folder(source_path)
+
+    if not os.path.isdir(destination):
+        os.makedirs(destination)
+
+    hasher = hashlib.sha256()
+    destination = mirror.download(
+        config.MIRRORS,
+        file_name,
+        destination,
+        reporthook=progressbar.UrllibProgress(LOGGER.trace).download_progress_hook,
+        hasher=hasher,
+    )
+    digest = internet.verify_archive(destination, digest=hasher.hexdigest())
+
+    LOGGER.info(
+        'Downloaded package/version "%s/%s" from a mirror to path, "%s".',
+        package,
+        adapter.version,
+        destination,
+    )
+
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+
+    if cache:
+        cache.add(destination, digest=digest)
+
+    add_local_filesystem_build(source_path, install_path, adapter)
+
+
 def add_link_build(adapter):
     '''Add the command which lets the user link Rez to an existing install.
 
@@ -303,6 +688,10 @@ def add_link_build(adapter):
 def add_local_filesystem_build(source_path, install_path, adapter):
     '''Search the user's files and build the Rez package.
 
+    Unless the "staged_installs" setting is off, the package is installed
+    into a stage beside `install_path` and only moved into place once it
+    succeeds. See `rezzurect.utils.staged_install`.
+
     Args:
         source_path (str):
             The absolute path to where the Rez package is located, on-disk.
@@ -311,8 +700,71 @@ def add_local_filesystem_build(source_path, install_path, adapter):
         adapter (`rezzurect.adapters.base_builder.BaseAdapter`):
             The object which is used to "install" the files.
 
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`:
+            If the archive doesn't match its expected digest.
+
     '''
-    if not os.path.isdir(install_path):
-        os.makedirs(install_path)
+    fetch_from_archive_cache(source_path, adapter)
+
+    path = adapter.get_archive_path_from_version(source_path, adapter.version)
+
+    if path and os.path.isfile(path):
+        internet.verify_archive(path)
+
+        if config.REPACK_ARCHIVES:
+            repack_archive(path)
+
+    if not config.STAGED_INSTALLS:
+        if not os.path.isdir(install_path):
+            os.makedirs(install_path)
 
+        _install_from_local(source_path, install_path, adapter)
+
+        return
+
+    # A failed install is abandoned in its stage so `install_path` is never left half-made
+    with staged_install.Stage(install_path) as stage:
+        _install_from_local(source_path, stage.path, adapter)
+
+
+def _install_from_local(source_path, install_path, adapter):
+    '''Install the adapter's package into `install_path` and record how it was made.'''
     adapter.install_from_local(source_path, install_path)
+
+    install_metadata.update(
+        install_path,
+        excluded=adapter.get_excluded_patterns(),
+        package=adapter.name,
+        profile=config.INSTALL_PROFILE or install_profile.FULL,
+        version=adapter.version,
+    )
+
+
+def fetch_from_archive_cache(source_path, adapter):
+    '''Copy the adapter's archive out of the archive cache if it isn't on-disk yet.
+
+    Args:
+        source_path (str):
+            The absolute path to where the Rez package is located, on-disk.
+        adapter (`rezzurect.adapters.base_builder.BaseAdapter`):
+            The object whose archive will be searched for.
+
+    Returns:
+        str: The absolute path to the copied archive, if any.
+
+    '''
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+
+    if not cache:
+        return ''
+
+    path = adapter.get_archive_path_from_version(source_path, adapter.version)
+
+    if path and os.path.isfile(path):
+        return ''
+
+    return cache.fetch_name(
+        adapter.get_archive_name_pattern(adapter.version),
+        adapter.get_archive_folder(source_path),
+    )
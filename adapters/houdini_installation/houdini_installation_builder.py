@@ -18,7 +18,9 @@ import glob
 import os
 
 # IMPORT LOCAL LIBRARIES
+from ...utils import install_profile
 from .. import base_builder
+from ...utils import config
 from ... import chooser
 from . import helper
 
@@ -58,6 +60,11 @@ class BaseHoudiniAdapter(base_builder.BaseAdapter):
         except IndexError:
             return ''
 
+    @classmethod
+    def get_archive_name_pattern(cls, version):
+        '''str: Get the `fnmatch` pattern of the Houdini archive for `version`.'''
+        return cls._install_archive_name_template.format(version=version)
+
     @classmethod
     def get_archive_path_from_version(cls, source, version):
         '''Get the recommended folder for archive (installer) files to be.
@@ -84,6 +91,13 @@ class LinuxAdapter(BaseHoudiniAdapter):
     '''An adapter for installing Houdini onto a Linux machine.'''
 
     name = 'houdini'
+    can_stream_extract = True
+
+    # houdini.tar.gz has tens of thousands of small files
+    tar_extraction_workers = 8
+
+    # The rest of the archive is SideFX's installer and the packages it bundles
+    archive_include_patterns = ('houdini.tar.gz', 'python*.tar.gz')
 
     @staticmethod
     def _get_python_tar_files(root):
@@ -95,6 +109,49 @@ class LinuxAdapter(BaseHoudiniAdapter):
         except IndexError:
             return ''
 
+    def _install_from_archive(self, source, install):
+        '''Extract Houdini's inner TAR files straight out of the downloaded archive.
+
+        The outer archive is never extracted to disk. "houdini.tar.gz" and
+        every "python*.tar.gz" are decompressed directly from it. Files which
+        are unchanged since another installed version of Houdini are linked
+        from it instead of being written. See `get_delta_sibling`.
+
+        Args:
+            source (str):
+                The absolute path to the package folder where the Houdini
+                executable would be found.
+            install (str):
+                The absolute directory where `source` will be installed into.
+
+        Raises:
+            EnvironmentError: If the archive or its inner Houdini TAR file is missing.
+
+        '''
+        path = self.get_archive_path_from_version(source, self.version)
+
+        if not os.path.isfile(path):
+            raise EnvironmentError('Tar file "{path}" does not exist.'.format(path=path))
+
+        excluded = self.get_excluded_patterns()
+        sibling = self.get_delta_sibling(install)
+        extracted = self._extract_nested_tar_file(
+            path,
+            [
+                ('houdini.tar.gz', install, excluded, sibling),
+                (
+                    'python*.tar.gz',
+                    os.path.join(install, 'python'),
+                    install_profile.get_relative_patterns(excluded, 'python'),
+                    os.path.join(sibling, 'python') if sibling else '',
+                ),
+            ],
+            manifest=True,
+        )
+
+        if not any(os.path.basename(name) == 'houdini.tar.gz' for name in extracted):
+            raise EnvironmentError('Houdini tar file missing from "{path}".'.format(path=path))
+
     def get_preinstalled_executables(self):
         '''Get a list of possible pre-installed executable Houdini files.
 
@@ -127,21 +184,25 @@ class LinuxAdapter(BaseHoudiniAdapter):
         extracted_folder = self.get_extracted_folder(source, self.version)
 
         if not os.path.isdir(extracted_folder):
-            self._extract_tar(source, self.version)
+            self._install_from_archive(source, install)
+
+            return
 
-        extracted_folder = self.get_extracted_folder(source, self.version)
         houdini_tar = os.path.join(extracted_folder, 'houdini.tar.gz')
 
         if not os.path.isfile(houdini_tar):
             raise EnvironmentError('Houdini tar file missing from "{extracted_folder}".'
                                    ''.format(extracted_folder=extracted_folder))
 
-        self._extract_tar_file(houdini_tar, install)
+        excluded = self.get_excluded_patterns()
+        self._extract_tar_file(houdini_tar, install, exclude=excluded)
 
         python_install_folder = os.path.join(install, 'python')
+        python_excluded = install_profile.get_relative_patterns(excluded, 'python')
 
         for python_archive_file in self._get_python_tar_files(extracted_folder):
-            self._extract_tar_file(python_archive_file, python_install_folder)
+            self._extract_tar_file(
+                python_archive_file, python_install_folder, exclude=python_excluded)
 
 
 # class WindowsAdapter(BaseHoudiniAdapter):
@@ -281,10 +342,17 @@ def register(source_path, install_path, system, architecture):
         # add_houdini_from_ftp_build = functools.partial(
         #     base_builder.add_from_internet_build,
         #     'houdini', system, architecture, source_path, install_path)
+        add_houdini_from_mirror_build = functools.partial(
+            base_builder.add_from_mirror_build,
+            'houdini', system, architecture, source_path, install_path)
         add_houdini_local_filesystem_build = functools.partial(
             base_builder.add_local_filesystem_build, source_path, install_path)
 
         adapter.strategies.append(('local', add_houdini_local_filesystem_build))
+
+        if config.MIRRORS:  # Hosts with no mirrors skip straight to the next strategy
+            adapter.strategies.append(('mirror', add_houdini_from_mirror_build))
+
         # TODO : Re-add this once SideFX gets back to me. Ticket ID "SESI #67857"
         # adapter.strategies.append(('internet', add_houdini_from_ftp_build))
         adapter.strategies.append(('link', base_builder.add_link_build))
@@ -4,7 +4,6 @@
 '''A set of general adapter classes which can be used to build Rez packages.'''
 
 # IMPORT STANDARD LIBRARIES
-import subprocess
 import functools
 import logging
 import zipfile
@@ -13,7 +12,10 @@ import stat
 import os
 
 # IMPORT LOCAL LIBRARIES
+from ...utils import install_profile
+from ...utils import rpm_extract
 from .. import base_builder
+from ...utils import config
 from ... import chooser
 from . import helper
 
@@ -100,33 +102,20 @@ class LinuxAdapter(BaseMayaAdapter):
     '''An adapter for installing Maya onto a Linux machine.'''
 
     name = 'maya'
+    can_stream_extract = True
     _install_archive_name_template = 'Autodesk_Maya_{major}_EN_Linux_64bit.tgz'
     _install_folder_template = 'Autodesk_Maya_{major}_EN_Linux_64bit'
 
-    @classmethod
-    def _extract_tar(cls, source, version):
-        '''Extract the TAR archive to get Maya's main installation folder.
-
-        Args:
-            source (str): The absolute path to this Rez package's version folder.
-            version (str): The raw version information which is used to "find"
-                           the TAR archive name. Example: "2018".
+    # Everything else in the archive is the vendor's graphical installer
+    archive_include_patterns = ('Maya*.rpm', 'adlmapps*.rpm', 'package.zip')
 
-        Raises:
-            EnvironmentError: If no archive file could be found.
-
-        '''
+    @classmethod
+    def get_tar_destination(cls, source, version):
+        '''str: Get the folder where Maya's TAR archive extracts its installation files to.'''
         path = cls.get_archive_path_from_version(source, version)
-
-        if not os.path.isfile(path):
-            raise EnvironmentError('Tar file "{path}" does not exist.'
-                                   ''.format(path=path))
-
-        root = os.path.dirname(path)
         base_name = os.path.splitext(os.path.basename(path))[0]
-        destination = os.path.join(root, base_name)
 
-        cls._extract_tar_file(path, destination)
+        return os.path.join(os.path.dirname(path), base_name)
 
     def get_preinstalled_executables(self):
         '''Get a list of possible pre-installed executable Maya files.
@@ -165,23 +154,18 @@ class LinuxAdapter(BaseMayaAdapter):
 
         major = helper.get_version_parts(self.version)
 
-        rpm_files = [
-            os.path.join(directory, 'Maya*.rpm'),
-            os.path.join(directory, 'adlmapps*.rpm'),
-        ]
+        rpm_files = []
 
-        for template in rpm_files:
-            # TODO : Replace rpm2cpio with a better method, later
-            for rpm_file in glob.glob(template):
-                command = 'cd "{install}" && rpm2cpio "{rpm_file}" | cpio -idmv -W none' \
-                    ''.format(install=install, rpm_file=rpm_file)
+        for template in ('Maya*.rpm', 'adlmapps*.rpm'):
+            rpm_files.extend(sorted(glob.glob(os.path.join(directory, template))))
 
-                stdout, stderr = subprocess.Popen(
-                    [command],
-                    shell=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                ).communicate()
+        if not rpm_files:
+            raise EnvironmentError('No Maya RPM files were found in "{directory}".'
+                                   ''.format(directory=directory))
+
+        excluded = self.get_excluded_patterns()
+        rpm_extract.extract_many(
+            rpm_files, install, exclude=excluded, store=base_builder.get_file_store())
 
         mtoa_zip_file = os.path.join(directory, 'package.zip')
 
@@ -190,7 +174,11 @@ class LinuxAdapter(BaseMayaAdapter):
         if not os.path.isdir(mtoa_destination):
             os.makedirs(mtoa_destination)
 
-        self._extract_zip(mtoa_zip_file, mtoa_destination)
+        self._extract_zip(
+            mtoa_zip_file,
+            mtoa_destination,
+            exclude=install_profile.get_relative_patterns(excluded, 'opt/solidangle/mtoa'),
+        )
 
 
 def register(source_path, install_path, system, architecture):
@@ -222,10 +210,17 @@ def register(source_path, install_path, system, architecture):
         add_maya_from_internet_build = functools.partial(
             base_builder.add_from_internet_build,
             'maya', system, architecture, source_path, install_path)
+        add_maya_from_mirror_build = functools.partial(
+            base_builder.add_from_mirror_build,
+            'maya', system, architecture, source_path, install_path)
         add_maya_local_filesystem_build = functools.partial(
             base_builder.add_local_filesystem_build, source_path, install_path)
 
         adapter.strategies.append(('local', add_maya_local_filesystem_build))
+
+        if config.MIRRORS:  # Hosts with no mirrors skip straight to the next strategy
+            adapter.strategies.append(('mirror', add_maya_from_mirror_build))
+
         adapter.strategies.append(('internet', add_maya_from_internet_build))
         adapter.strategies.append(('link', base_builder.add_link_build))
 
@@ -7,11 +7,14 @@
 import subprocess
 import functools
 import logging
-import stat
 import os
 
 # IMPORT LOCAL LIBRARIES
+from ...utils import zip_extract
+from ...utils import progressbar
+from ...utils import repack
 from .. import base_builder
+from ...utils import config
 from ... import chooser
 from . import helper
 
@@ -108,8 +111,64 @@ class LinuxAdapter(BaseNukeAdapter):
     '''An adapter for installing Nuke onto a Linux machine.'''
 
     name = 'nuke'
+    can_stream_extract = True
     _install_archive_name_template = 'Nuke{major}.{minor}v{patch}-linux-x86-release-64.tgz'
     _install_file_name_template = 'Nuke{major}.{minor}v{patch}-linux-x86-release-64-installer'
+    archive_include_patterns = ('Nuke*-installer', )
+
+    def _install_from_archive(self, source, install):
+        '''Unzip the Nuke installer straight out of the downloaded TGZ archive.
+
+        The installer is spooled into memory (or an unlinked temporary file,
+        if it's bigger than the "spool_memory_limit" setting) so it's never
+        written to the archive folder.
+
+        Args:
+            source (str):
+                The absolute path to the package folder where the Nuke executable
+                would be found.
+            install (str):
+                The absolute directory where `source` will be installed into.
+
+        Raises:
+            EnvironmentError: If the archive or its installer is missing.
+
+        '''
+        path = self.get_archive_path_from_version(source, self.version)
+
+        if not os.path.isfile(path):
+            raise EnvironmentError('Tar file "{path}" does not exist.'.format(path=path))
+
+        installer = os.path.basename(self.get_install_file(source, self.version))
+
+        _LOGGER.debug('Unzipping "%s" out of "%s".', installer, path)
+
+        options = {
+            'exclude': self.get_excluded_patterns(),
+            'manifest': True,
+            'sibling': self.get_delta_sibling(install),
+            'store': base_builder.get_file_store(),
+            'threads': config.ZIP_EXTRACTION_PROCESSES,
+        }
+        repacked = base_builder.get_repack_path(path)
+        found = ''
+
+        if repacked:
+            # The installer is stored as-is in the repacked archive so it's read in place
+            found = repack.extract_inner_zip(repacked, installer, install, **options)
+
+        if not found:
+            found = zip_extract.extract_from_tar(
+                progressbar.TarProgressFile(path, logger=_LOGGER.trace),
+                installer,
+                install,
+                memory_limit=config.SPOOL_MEMORY_LIMIT,
+                **options
+            )
+
+        if not found:
+            raise EnvironmentError('Installer "{installer}" is missing from "{path}".'
+                                   ''.format(installer=installer, path=path))
 
     def get_preinstalled_executables(self):
         '''Get a list of possible pre-installed executable Nuke files.
@@ -143,12 +202,30 @@ class LinuxAdapter(BaseNukeAdapter):
         try:
             zip_file_path = super(LinuxAdapter, self).install_from_local(source, install)
         except EnvironmentError:
-            self._extract_tar(source, self.version)
-            zip_file_path = super(LinuxAdapter, self).install_from_local(source, install)
+            zip_file_path = ''
+
+        if not zip_file_path and not config.KEEP_INNER_INSTALLERS:
+            self._install_from_archive(source, install)
+        else:
+            if not zip_file_path:
+                self._extract_tar(source, self.version)
+                zip_file_path = super(LinuxAdapter, self).install_from_local(source, install)
+
+            _LOGGER.debug('Unzipping "%s".', zip_file_path)
 
-        _LOGGER.debug('Unzipping "%s".', zip_file_path)
+            self._extract_zip(
+                zip_file_path,
+                install,
+                exclude=self.get_excluded_patterns(),
+                sibling=self.get_delta_sibling(install),
+                manifest=True,
+            )
 
-        self._extract_zip(zip_file_path, install)
+            archive = self.get_archive_path_from_version(source, self.version)
+
+            # The installer can be made again from its TGZ archive so only keep it if asked to
+            if not config.KEEP_INNER_INSTALLERS and os.path.isfile(archive):
+                os.remove(zip_file_path)
 
         major, minor, _ = helper.get_version_parts(self.version)
         executable = 'Nuke{major}.{minor}'.format(major=major, minor=minor)
@@ -158,10 +235,6 @@ class LinuxAdapter(BaseNukeAdapter):
             raise EnvironmentError('Zip failed to extract to folder "{install}".'
                                    ''.format(install=install))
 
-        # Reference: https://stackoverflow.com/questions/12791997
-        executable_stats = os.stat(executable)
-        os.chmod(executable, executable_stats.st_mode | stat.S_IEXEC)
-
 
 class WindowsAdapter(BaseNukeAdapter):
 
@@ -288,10 +361,17 @@ def register(source_path, install_path, system, architecture):
         add_nuke_from_internet_build = functools.partial(
             base_builder.add_from_internet_build,
             'nuke', system, architecture, source_path, install_path)
+        add_nuke_from_mirror_build = functools.partial(
+            base_builder.add_from_mirror_build,
+            'nuke', system, architecture, source_path, install_path)
         add_nuke_local_filesystem_build = functools.partial(
             base_builder.add_local_filesystem_build, source_path, install_path)
 
         adapter.strategies.append(('local', add_nuke_local_filesystem_build))
+
+        if config.MIRRORS:  # Hosts with no mirrors skip straight to the next strategy
+            adapter.strategies.append(('mirror', add_nuke_from_mirror_build))
+
         adapter.strategies.append(('internet', add_nuke_from_internet_build))
         adapter.strategies.append(('link', base_builder.add_link_build))
 
@@ -0,0 +1,570 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''A small pull-through caching server for package installer archives.
+
+Run it on a machine that every render node can reach:
+
+    python -m rezzurect.cache_server --root /mnt/installers --port 8765
+
+and add `download_proxy: http://that-machine:8765` to each node's .respawnrc.
+
+Every installer in `rezzurect.strategies.internet.get_catalog` is served
+by its file name. Example: "http://that-machine:8765/Nuke11.2v3-linux-x86-release-64.tgz".
+
+The first request for an installer downloads it from the vendor. While it
+downloads, every request for that installer (including the first) is
+streamed the bytes as they arrive, so there is only ever one upstream
+download. Ranges aren't offered until the installer is complete, so that
+clients read it as one stream instead of planning segments which would wait
+on bytes that haven't arrived yet. A Range which starts inside the bytes
+that are already on-disk (such as a client's one-byte probe) is answered
+with its bytes but an unknown total size ("bytes 0-0/*"). Any other Range
+gets the whole file, with a 200. Once the installer is complete, it's
+served from disk with full Range support.
+
+The installer's ETag comes from the vendor's validator and is kept beside
+the installer, so it's the same while it's filling and once it's complete.
+
+Complete installers also have a block signature, at the installer's URL
+plus ".blocks.json", so that clients can reuse blocks of the archives that
+they already have. See `rezzurect.utils.block_reuse`.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import threading
+import argparse
+import hashlib
+import logging
+import time
+import re
+import os
+
+# IMPORT LOCAL LIBRARIES
+from .utils import block_reuse
+from .strategies import internet
+from .vendors import six
+
+
+_RANGE_EXPRESSION = re.compile(r'bytes=(?P<start>\d*)-(?P<end>\d*)$')
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_PORT = 8765
+DEFAULT_TIMEOUT = 30
+ETAG_SUFFIX = '.etag'
+LOGGER = logging.getLogger('rezzurect.cache_server')
+
+
+class _Fill(object):
+
+    '''An upstream download which is being written to disk and read by clients.
+
+    Attributes:
+        etag (str): The strong ETag which clients are given for the file.
+        size (int or NoneType): The size of the file, if the upstream server reported it.
+        written (int): The number of bytes which are on-disk so far.
+        done (bool): If the whole file was downloaded.
+        failed (bool): If the upstream download stopped because of an error.
+
+    '''
+
+    def __init__(self, url, path):
+        '''Create the instance.
+
+        Args:
+            url (str): The upstream address to download.
+            path (str): The absolute path where the finished file will be written.
+
+        '''
+        super(_Fill, self).__init__()
+
+        self._condition = threading.Condition()
+        self.url = url
+        self.path = path
+        self.part_path = path + '.part'
+        self.etag = ''
+        self.size = None
+        self.written = 0
+        self.done = False
+        self.failed = False
+        self.started = False
+
+    def _update(self, **attributes):
+        '''Set attributes and wake up every client which is waiting for them.'''
+        with self._condition:
+            for name, value in attributes.items():
+                setattr(self, name, value)
+
+            self._condition.notify_all()
+
+    def run(self):
+        '''Download the upstream file to disk.'''
+        try:
+            response = six.moves.urllib.request.urlopen(self.url, timeout=DEFAULT_TIMEOUT)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Upstream "%s" could not be opened.', self.url)
+            self._update(failed=True, started=True)
+
+            return
+
+        try:
+            headers = response.info()
+            length = headers.get('Content-Length', '') or ''
+            size = int(length) if length.isdigit() else None
+            etag = _make_etag(
+                self.url, headers.get('ETag', '') or '', headers.get('Last-Modified', '') or '')
+
+            with open(self.part_path, 'wb') as file_:
+                self._update(etag=etag, size=size, started=True)
+
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                    file_.write(chunk)
+                    file_.flush()
+                    self._update(written=self.written + len(chunk))
+
+            if size is not None and self.written != size:
+                raise IOError('Upstream "{url}" stopped early.'.format(url=self.url))
+
+            _write_etag(self.path, etag)
+            os.rename(self.part_path, self.path)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Upstream "%s" failed to download.', self.url)
+            self._update(failed=True, started=True)
+        else:
+            LOGGER.info('Finished caching "%s".', self.url)
+            self._update(done=True)
+        finally:
+            response.close()
+
+    def wait_until_started(self):
+        '''Block until the upstream server responds (or fails).'''
+        with self._condition:
+            while not self.started:
+                self._condition.wait(1)
+
+    def wait_for(self, position):
+        '''Block until there are bytes after `position` or the download stops.
+
+        Returns:
+            int: The number of bytes that are on-disk.
+
+        '''
+        with self._condition:
+            while self.written <= position and not self.done and not self.failed:
+                self._condition.wait(1)
+
+            return self.written
+
+
+def _make_etag(url, etag, last_modified):
+    '''Choose the ETag which clients are given for an installer.
+
+    Args:
+        url (str): The upstream address of the installer.
+        etag (str): The upstream "ETag" header, if any.
+        last_modified (str): The upstream "Last-Modified" header, if any.
+
+    Returns:
+        str: The upstream ETag, if it's strong, or else a strong ETag which is made from the rest.
+
+    '''
+    if etag and not etag.startswith('W/'):
+        return etag
+
+    seed = '{url}|{etag}|{last_modified}'.format(
+        url=url, etag=etag, last_modified=last_modified or time.time())
+
+    return '"{0}"'.format(hashlib.sha1(seed.encode('utf-8')).hexdigest()[:24])
+
+
+def _write_etag(path, etag):
+    '''Keep `etag` beside the installer at `path` so it's still served once the fill is done.'''
+    temporary_path = '{path}{suffix}.{pid}.tmp'.format(
+        path=path, suffix=ETAG_SUFFIX, pid=os.getpid())
+
+    with open(temporary_path, 'w') as file_:
+        file_.write(etag)
+
+    if os.name == 'nt' and os.path.isfile(path + ETAG_SUFFIX):
+        os.remove(path + ETAG_SUFFIX)
+
+    os.rename(temporary_path, path + ETAG_SUFFIX)
+
+
+def _read_etag(path):
+    '''str: The ETag of the cached file at `path`.'''
+    try:
+        with open(path + ETAG_SUFFIX, 'r') as file_:
+            etag = file_.read().strip()
+    except IOError:
+        etag = ''
+
+    if etag:
+        return etag
+
+    # Files which weren't filled by this server (such as signatures) are named by their mtime
+    return '"{0}-{1:x}"'.format(
+        hashlib.sha1(path.encode('utf-8')).hexdigest()[:16], int(os.path.getmtime(path)))
+
+
+def _get_range(match, size):
+    '''Find the bytes which a "Range" header asks for.
+
+    Args:
+        match (`re.Match`): The header, matched by `_RANGE_EXPRESSION`.
+        size (int): The number of bytes in the requested file.
+
+    Returns:
+        tuple[int, int]: The first and last byte. If the first is after the last, no bytes match.
+
+    '''
+    start, end = 0, size - 1
+
+    if match.group('start'):
+        start = int(match.group('start'))
+        end = min(int(match.group('end') or size - 1), size - 1)
+    elif match.group('end'):
+        start = max(size - int(match.group('end')), 0)
+
+    return (start, end)
+
+
+class PullThroughCache(object):
+
+    '''The files of a cache server and the upstream downloads which fill them.'''
+
+    def __init__(self, root, catalog):
+        '''Create the instance.
+
+        Args:
+            root (str): The absolute path to the folder where installers are stored.
+            catalog (dict[str, str]): Each installer's file name and its upstream URL.
+
+        '''
+        super(PullThroughCache, self).__init__()
+
+        self._lock = threading.Lock()
+        self._fills = dict()
+        self.signature_lock = threading.Lock()
+        self.root = root
+        self.catalog = catalog
+
+    def get_path(self, file_name):
+        '''str: The absolute path where `file_name` is cached.'''
+        return os.path.join(self.root, file_name)
+
+    def get_fill(self, file_name):
+        '''Get the upstream download for `file_name`, starting it if needed.
+
+        Returns:
+            `_Fill` or NoneType: The running download or nothing, if the file is already cached.
+
+        '''
+        with self._lock:
+            fill = self._fills.get(file_name)
+
+            if fill and not fill.done and not fill.failed:
+                return fill
+
+            if os.path.isfile(self.get_path(file_name)):
+                return None
+
+            LOGGER.info('Caching "%s" from upstream.', file_name)
+
+            fill = _Fill(self.catalog[file_name], self.get_path(file_name))
+            self._fills[file_name] = fill
+            thread = threading.Thread(target=fill.run)
+            thread.daemon = True
+            thread.start()
+
+            return fill
+
+
+class CacheRequestHandler(six.moves.BaseHTTPServer.BaseHTTPRequestHandler):
+
+    '''Serve cached installers by file name, filling the cache on-demand.'''
+
+    protocol_version = 'HTTP/1.1'
+
+    def _get_file_name(self):
+        '''str: The requested installer's file name, if it is in the catalog.'''
+        path = six.moves.urllib.parse.urlsplit(self.path).path
+        file_name = six.moves.urllib.parse.unquote(path.lstrip('/'))
+
+        if file_name not in self.server.cache.catalog:
+            return ''
+
+        return file_name
+
+    def _send_cached(self, path, send_body):
+        '''Send a completely-cached file, honoring a single byte Range.'''
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = _RANGE_EXPRESSION.match(self.headers.get('Range', '') or '')
+        etag = _read_etag(path)
+
+        if_range = self.headers.get('If-Range', '')
+
+        if match and (not if_range or if_range == etag):
+            start, end = _get_range(match, size)
+
+            if start > end:
+                self._send_unsatisfiable(size)
+
+                return
+
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {start}-{end}/{size}'.format(
+                start=start, end=end, size=size))
+        else:
+            self.send_response(200)
+
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        self.end_headers()
+
+        if not send_body:
+            return
+
+        with open(path, 'rb') as file_:
+            file_.seek(start)
+            remaining = end - start + 1
+
+            while remaining > 0:
+                chunk = file_.read(min(CHUNK_SIZE, remaining))
+
+                if not chunk:
+                    break
+
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _send_unsatisfiable(self, size):
+        '''Tell the client that its byte range is outside of a file which has `size` bytes.'''
+        self.send_response(416)
+        self.send_header('Content-Range', 'bytes */{size}'.format(size=size))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_filling(self, fill, send_body):
+        '''Stream a file to the client while it is still being downloaded.
+
+        A single byte Range is only answered (with a 206) if it starts
+        inside of the bytes which are already on-disk and its end is
+        known. Its total size is left out so that the client doesn't plan
+        segments against a file which is still filling. Every other request
+        gets the whole file, from the start, with a 200.
+
+        '''
+        fill.wait_until_started()
+
+        if fill.failed:
+            self.send_error(502, 'Upstream download failed')
+
+            return
+
+        match = _RANGE_EXPRESSION.match(self.headers.get('Range', '') or '')
+        if_range = self.headers.get('If-Range', '')
+        start, end = 0, None
+
+        if match and match.group('start') and fill.size is not None and \
+                (not if_range or if_range == fill.etag):
+            start, end = _get_range(match, fill.size)
+
+            if start > end:
+                self._send_unsatisfiable(fill.size)
+
+                return
+
+        if end is not None and start < fill.written:
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {start}-{end}/*'.format(start=start, end=end))
+            self.send_header('Content-Length', str(end - start + 1))
+        else:
+            # Ranges which start past the written bytes would wait (and time out) on the upstream
+            start, end = 0, None
+            self.send_response(200)
+
+            if fill.size is not None:
+                self.send_header('Content-Length', str(fill.size))
+            else:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+
+        self.send_header('Accept-Ranges', 'none')
+        self.send_header('ETag', fill.etag)
+        self.end_headers()
+
+        if not send_body:
+            return
+
+        try:
+            file_ = open(fill.part_path, 'rb')
+        except IOError:
+            # The download finished and was renamed just before the file could be opened
+            file_ = open(fill.path, 'rb')
+
+        try:
+            with file_:
+                self._copy_filling(fill, file_, start, end)
+        except (IOError, OSError) as error:  # `socket.error` inherits from `IOError`
+            # Clients may hang up once they have the bytes they need
+            LOGGER.debug('Client "%s" closed its connection. %s', self.client_address[0], error)
+            self.close_connection = True
+
+    def _copy_filling(self, fill, file_, start, end):
+        '''Send the bytes from `start` to `end` (inclusive) of `fill`, as they're written.
+
+        Args:
+            fill (`_Fill`): The running download.
+            file_ (file-like): The opened file which `fill` writes into.
+            start (int): The first byte to send.
+            end (int or NoneType): The last byte to send or None, to send the rest of the file.
+
+        '''
+        position = start
+
+        while end is None or position <= end:
+            available = fill.wait_for(position)
+
+            if available <= position:
+                if fill.failed:
+                    # Closing early tells the client that its download is incomplete
+                    self.close_connection = True
+
+                return
+
+            if end is not None:
+                available = min(available, end + 1)
+
+            file_.seek(position)
+            chunk = file_.read(min(CHUNK_SIZE, available - position))
+            self.wfile.write(chunk)
+            position += len(chunk)
+
+    def _send_signature(self, file_name, send_body):
+        '''Send the block signature of a completely-cached installer.'''
+        if self.server.cache.get_fill(file_name):
+            self.send_error(404, 'Installer is not cached yet')
+
+            return
+
+        with self.server.cache.signature_lock:
+            path = block_reuse.write_signature(self.server.cache.get_path(file_name))
+
+        self._send_cached(path, send_body)
+
+    def _handle(self, send_body):
+        '''Send the requested installer.'''
+        path = six.moves.urllib.parse.urlsplit(self.path).path
+
+        if path.endswith(block_reuse.SIGNATURE_SUFFIX):
+            file_name = six.moves.urllib.parse.unquote(
+                path.lstrip('/')[:-len(block_reuse.SIGNATURE_SUFFIX)])
+
+            if file_name in self.server.cache.catalog:
+                self._send_signature(file_name, send_body)
+            else:
+                self.send_error(404, 'Not a known installer')
+
+            return
+
+        file_name = self._get_file_name()
+
+        if not file_name:
+            self.send_error(404, 'Not a known installer')
+
+            return
+
+        fill = self.server.cache.get_fill(file_name)
+
+        if fill:
+            self._send_filling(fill, send_body)
+        else:
+            self._send_cached(self.server.cache.get_path(file_name), send_body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        '''Send the requested installer.'''
+        self._handle(send_body=True)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        '''Send the headers of the requested installer.'''
+        self._handle(send_body=False)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        '''Send request logs to the rezzurect logger instead of stderr.'''
+        LOGGER.debug(format, *args)
+
+
+class CacheServer(six.moves.socketserver.ThreadingMixIn, six.moves.BaseHTTPServer.HTTPServer):
+
+    '''A threaded HTTP server which knows its `PullThroughCache`.'''
+
+    daemon_threads = True
+
+    def __init__(self, address, cache):
+        '''Create the server.
+
+        Args:
+            address (tuple[str, int]): The host and port to listen on.
+            cache (`PullThroughCache`): The files to serve.
+
+        '''
+        six.moves.BaseHTTPServer.HTTPServer.__init__(self, address, CacheRequestHandler)
+
+        self.cache = cache
+
+
+def get_catalog():
+    '''dict[str, str]: Every known installer file name and its upstream URL.'''
+    return {internet.get_recommended_file_name(url): url
+            for url in internet.get_catalog().values()}
+
+
+def make_server(root, host='', port=DEFAULT_PORT):
+    '''Create a server which caches installers into the `root` folder.
+
+    Args:
+        root (str): The absolute path to the folder where installers are stored.
+        host (str, optional): The address to listen on. Default: every address.
+        port (int, optional): The port to listen on.
+
+    Returns:
+        `CacheServer`: The created server. Call `serve_forever` to run it.
+
+    '''
+    if not os.path.isdir(root):
+        os.makedirs(root)
+
+    # Any ".part" file is left over from a server which was stopped mid-download
+    for name in os.listdir(root):
+        if name.endswith('.part'):
+            os.remove(os.path.join(root, name))
+
+    return CacheServer((host, port), PullThroughCache(root, get_catalog()))
+
+
+def main(arguments=None):
+    '''Run the cache server until it is interrupted.'''
+    parser = argparse.ArgumentParser(description='Serve and cache package installers.')
+    parser.add_argument('--root', required=True, help='The folder to store installers in.')
+    parser.add_argument('--host', default='', help='The address to listen on.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='The port to listen on.')
+    options = parser.parse_args(arguments)
+
+    logging.basicConfig(level=logging.INFO)
+    server = make_server(os.path.abspath(options.root), host=options.host, port=options.port)
+
+    LOGGER.info('Serving "%s" on port "%s".', options.root, server.server_address[1])
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
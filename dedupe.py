@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Share the identical files of existing package installs, using hardlinks.
+
+New installs are shared with the file store as they're extracted, once the
+"file_store" key is set in the user's .respawnrc file. This command does the
+same for installs which were made before then, or by an installer which
+rezzurect doesn't extract itself.
+
+Run it like this:
+
+    python -m rezzurect.dedupe --dry-run
+    python -m rezzurect.dedupe /path/to/packages/nuke_installation
+
+See `rezzurect.utils.file_store` for details.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import argparse
+import logging
+import os
+
+# IMPORT LOCAL LIBRARIES
+from .utils import file_store
+from .utils import config
+from .utils import logger
+
+
+LOGGER = logging.getLogger('rezzurect.dedupe')
+
+
+def dedupe(folders, root='', dry_run=False):
+    '''Share every file in `folders` with the file store of the package root, `root`.
+
+    Args:
+        folders (iterable[str]):
+            The absolute paths to some install folders (or to folders of installs).
+        root (str, optional):
+            The folder which every installed Rez package is in. The file
+            store is kept here. Default: The "rez_package_root" setting.
+        dry_run (bool, optional):
+            If True, nothing is changed. Only the bytes which would be saved are counted.
+
+    Raises:
+        RuntimeError: If no package root is known.
+
+    Returns:
+        int: The number of bytes saved (or that would be saved).
+
+    '''
+    root = root or config.REZ_PACKAGE_ROOT
+
+    if not root:
+        raise RuntimeError('No package root is defined. Add "rez_package_root" to your .respawnrc.')
+
+    store = file_store.get_store(True, root)
+    saved = 0
+
+    for folder in folders:
+        if not os.path.isdir(folder):
+            LOGGER.warning('Folder "%s" does not exist and will be skipped.', folder)
+            continue
+
+        folder_saved = file_store.dedupe(folder, store, dry_run=dry_run)
+        saved += folder_saved
+
+        LOGGER.info('Folder "%s" saved "%s" bytes.', folder, folder_saved)
+
+    return saved
+
+
+def main(arguments=None):
+    '''Dedupe the requested install folders.'''
+    parser = argparse.ArgumentParser(
+        description='Replace identical files in package installs with hardlinks to one copy.')
+    parser.add_argument('folders', nargs='*',
+                        help='Install folders. Default: Every package in the package root.')
+    parser.add_argument('--root', default='',
+                        help='The package root, where the file store is kept.')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only report how much space would be saved.')
+    options = parser.parse_args(arguments)
+
+    root = options.root or config.REZ_PACKAGE_ROOT
+    folders = options.folders or [root]
+
+    logger.init()
+    saved = dedupe(folders, root=root, dry_run=options.dry_run)
+
+    print('{verb} {size:.1f} MB.'.format(
+        verb='Would save' if options.dry_run else 'Saved', size=saved / (1024.0 * 1024.0)))
+
+
+if __name__ == '__main__':
+    main()
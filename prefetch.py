@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Download package installers into the archive cache ahead of time.
+
+Nothing is built. The installers are only downloaded so that, when an
+artist or a farm job later installs the package, the "local" strategy finds
+the archive in the archive cache and the download is skipped.
+
+Requests can be given directly or read from a show's manifest file, which
+has one package request per line. Blank lines and "#" comments are ignored.
+
+    # show_dcc_manifest.txt
+    nuke_installation-11.2v3
+    maya_installation-2018
+    houdini_installation-16.5.536
+
+Run it like this:
+
+    python -m rezzurect.prefetch --manifest show_dcc_manifest.txt --background
+
+The "archive_cache" key must be set in the user's .respawnrc file.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import subprocess
+import platform
+import argparse
+import logging
+import sys
+import os
+
+# IMPORT LOCAL LIBRARIES
+from .strategies import internet
+from .utils import archive_cache
+from .utils import common
+from .utils import config
+from .utils import logger
+
+
+DOWNLOADS_FOLDER = 'downloads'
+INSTALLATION_SUFFIX = '_installation'
+NICE_INCREMENT = 19
+LOGGER = logging.getLogger('rezzurect.prefetch')
+
+
+def parse_request(text):
+    '''Split a Rez package request into its package name and version.
+
+    The "_installation" suffix is removed because installers are catalogued
+    by the name of the software. Example: "nuke_installation-11.2v3" -> ("nuke", "11.2v3").
+
+    Args:
+        text (str): The request. Example: "nuke-11.2v3".
+
+    Raises:
+        ValueError: If `text` has no version.
+
+    Returns:
+        tuple[str, str]: The package name and its version.
+
+    '''
+    package, _, version = text.strip().partition('-')
+
+    if not package or not version:
+        raise ValueError('Request "{text}" must be written as "package-version".'.format(text=text))
+
+    if package.endswith(INSTALLATION_SUFFIX):
+        package = package[:-len(INSTALLATION_SUFFIX)]
+
+    return (package, version)
+
+
+def read_manifest(path):
+    '''list[str]: Get every package request in the manifest file at `path`.'''
+    requests = []
+
+    with open(path, 'r') as file_:
+        for line in file_:
+            line = line.split('#')[0].strip()
+
+            if line:
+                requests.append(line)
+
+    return requests
+
+
+def resolve(requests, system, architecture):
+    '''Find the URL that each package request would download from.
+
+    Args:
+        requests (iterable[str]): Package requests. Example: ["nuke-11.2v3"].
+        system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (int): The bits of the `system`. Example: 64.
+
+    Returns:
+        list[tuple[str, str, str]]:
+            The package, version, and URL of every request which has a
+            reachable installer. Every other request is logged and skipped.
+
+    '''
+    resolved = []
+
+    for request in requests:
+        try:
+            package, version = parse_request(request)
+        except ValueError as error:
+            LOGGER.warning('Request "%s" will be skipped. %s', request, error)
+            continue
+
+        url = internet._get_url(package, version, system, architecture)  # pylint: disable=protected-access
+
+        if not url:
+            LOGGER.warning('Request "%s" has no reachable installer and will be skipped.', request)
+            continue
+
+        resolved.append((package, version, url))
+
+    return resolved
+
+
+def lower_priority():
+    '''Make the current process yield the CPU (and disk, on Linux) to other work.'''
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(NICE_INCREMENT)
+        except OSError:
+            LOGGER.debug('Process priority could not be lowered.')
+
+    if platform.system() != 'Linux':
+        return
+
+    # Put the process in the "idle" I/O class so it only touches the disk when nothing else does
+    try:
+        with open(os.devnull, 'w') as null:
+            subprocess.call(
+                ['ionice', '-c', '3', '-p', str(os.getpid())],
+                stdout=null,
+                stderr=subprocess.STDOUT,
+            )
+    except OSError:
+        LOGGER.debug('ionice was not found. I/O priority was not lowered.')
+
+
+def get_download_folder(cache, package, version):
+    '''Find the folder where a package-version's archive downloads to, before it's cached.
+
+    Args:
+        cache (`rezzurect.utils.archive_cache.ArchiveCache`): The archive cache to prefetch into.
+        package (str): The name of the package. Example: "nuke".
+        version (str): The specific version of `package`. Example: "11.2v3".
+
+    Returns:
+        str: The absolute path to the folder, inside of the archive cache.
+
+    '''
+    return os.path.join(cache.root, DOWNLOADS_FOLDER, package, version)
+
+
+def prefetch(requests, system=platform.system(), architecture=common.get_architecture()):
+    '''Download the installer of every package request into the archive cache.
+
+    Args:
+        requests (iterable[str]):
+            Package requests. Example: ["nuke-11.2v3", "maya_installation-2018"].
+        system (str, optional):
+            The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (int, optional):
+            The bits of the `system`. Example: 64.
+
+    Raises:
+        RuntimeError: If no archive cache is configured.
+
+    Returns:
+        dict[str, str]: Each package-version and the path to its archive in the cache.
+
+    '''
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+
+    if not cache:
+        raise RuntimeError('No archive cache is defined. Add "archive_cache" to your .respawnrc.')
+
+    resolved = resolve(requests, system, architecture)
+
+    if not resolved:
+        return dict()
+
+    # The archives are downloaded into a stable folder for each package-version
+    # and `internet.download` adds them to the cache. If a prefetch is
+    # interrupted, its partial downloads are kept there so the next run resumes them.
+    #
+    folders = [get_download_folder(cache, package, version) for package, version, _ in resolved]
+
+    for folder in folders:
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    results = internet.download_many(
+        [(package, version, system, architecture, folder)
+         for (package, version, _), folder in zip(resolved, folders)])
+
+    archives = dict()
+
+    for (package, version, url), result in zip(resolved, results):
+        request = '{package}-{version}'.format(package=package, version=version)
+
+        if isinstance(result, Exception):
+            LOGGER.error('Request "%s" failed to prefetch: %s', request, result)
+            continue
+
+        archives[request] = cache.find_url(url)
+
+        # The cache has its own link to the archive now so the downloaded copy isn't needed
+        if archives[request] and os.path.isfile(result):
+            os.remove(result)
+
+        LOGGER.info('Request "%s" is in the archive cache.', request)
+
+    return archives
+
+
+def start_background(arguments):
+    '''Run this module again, as a detached process, with `arguments`.
+
+    Returns:
+        `subprocess.Popen`: The started process.
+
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [root] + [path for path in [environment.get('PYTHONPATH', '')] if path])
+    options = dict()
+
+    if os.name == 'nt':
+        options['creationflags'] = 0x00000008 | 0x00004000  # DETACHED_PROCESS | BELOW_NORMAL
+    else:
+        options['preexec_fn'] = os.setsid
+
+    with open(os.devnull, 'r+') as null:
+        return subprocess.Popen(
+            [sys.executable, '-m', 'rezzurect.prefetch'] + list(arguments),
+            stdin=null,
+            stdout=null,
+            stderr=null,
+            close_fds=os.name != 'nt',
+            env=environment,
+            **options
+        )
+
+
+def main(arguments=None):
+    '''Prefetch the requested package installers.'''
+    parser = argparse.ArgumentParser(
+        description='Download package installers into the archive cache, without building them.')
+    parser.add_argument('requests', nargs='*', help='Package requests. Example: "nuke-11.2v3".')
+    parser.add_argument('--manifest', help='A file of package requests, one per line.')
+    parser.add_argument('--system', default=platform.system(), help='Example: "Linux".')
+    parser.add_argument('--architecture', type=int, default=common.get_architecture(),
+                        help='Example: 64.')
+    parser.add_argument('--priority', default='prefetch',
+                        help='The bandwidth priority class of the downloads. See "bandwidth_limit".')
+    parser.add_argument('--background', action='store_true',
+                        help='Run as a detached, low priority process and return immediately.')
+    options = parser.parse_args(arguments)
+
+    requests = list(options.requests)
+
+    if options.manifest:
+        requests.extend(read_manifest(options.manifest))
+
+    if not requests:
+        parser.error('No package requests were given.')
+
+    if options.background:
+        arguments = list(sys.argv[1:] if arguments is None else arguments)
+        arguments.remove('--background')
+        process = start_background(arguments)
+        print('Prefetching in the background, as process "{pid}".'.format(pid=process.pid))
+
+        return
+
+    logger.init()
+    lower_priority()
+    config.BANDWIDTH_PRIORITY = options.priority
+    prefetch(requests, system=options.system, architecture=options.architecture)
+
+
+if __name__ == '__main__':
+    main()
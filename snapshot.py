@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Export a finished package install into a bundle file and import it on another machine.
+
+Importing a bundle is a bulk copy. None of the package's install steps
+(downloads, RPM extraction, nested archives, vendor installers) run again,
+which makes it the fastest way to bring up a new render node.
+
+Run it like this:
+
+    python -m rezzurect.snapshot export /packages/nuke_installation/11.2v3 nuke-11.2v3.bundle
+    python -m rezzurect.snapshot import nuke-11.2v3.bundle /packages/nuke_installation/11.2v3
+
+See `rezzurect.utils.install_bundle` for details.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import argparse
+import logging
+
+# IMPORT LOCAL LIBRARIES
+from .utils import install_bundle
+from .utils import tar_extract
+from .utils import file_store
+from .utils import config
+from .utils import logger
+
+
+LOGGER = logging.getLogger('rezzurect.snapshot')
+
+
+def _describe(index):
+    '''str: Summarize the package of a bundle's index, for printing.'''
+    record = index.get('record', dict())
+
+    if not record.get('package'):
+        return '"{name}"'.format(name=index.get('name', ''))
+
+    return '{package}-{version} ({profile} profile)'.format(
+        package=record['package'],
+        version=record.get('version', ''),
+        profile=record.get('profile', 'full'),
+    )
+
+
+def main(arguments=None):
+    '''Export or import a package install.'''
+    parser = argparse.ArgumentParser(
+        description='Save package installs into bundle files and restore them.')
+    commands = parser.add_subparsers(dest='command')
+
+    export_parser = commands.add_parser('export', help='Save an install folder into a bundle.')
+    export_parser.add_argument('folder', help='The install folder to save.')
+    export_parser.add_argument('bundle', help='The bundle file to write.')
+    export_parser.add_argument('--compress', action='store_true',
+                               help='gzip the bundle. It is smaller but slower to import.')
+
+    import_parser = commands.add_parser('import', help='Restore an install folder from a bundle.')
+    import_parser.add_argument('bundle', help='The bundle file to read.')
+    import_parser.add_argument('folder', help='The install folder to make.')
+    import_parser.add_argument('--workers', type=int, default=tar_extract.DEFAULT_WORKERS,
+                               help='The number of threads which write files.')
+    import_parser.add_argument('--replace', action='store_true',
+                               help='Replace the install folder if it already exists.')
+
+    options = parser.parse_args(arguments)
+
+    if not options.command:
+        parser.error('Choose "export" or "import".')
+
+    logger.init()
+
+    if options.command == 'export':
+        index = install_bundle.export(options.folder, options.bundle, compress=options.compress)
+        print('Exported {package} into "{bundle}".'.format(
+            package=_describe(index), bundle=options.bundle))
+
+        return
+
+    index = install_bundle.restore(
+        options.bundle,
+        options.folder,
+        workers=options.workers,
+        replace=options.replace,
+        store=file_store.get_store(config.FILE_STORE, config.REZ_PACKAGE_ROOT),
+    )
+    print('Imported {package} into "{folder}".'.format(
+        package=_describe(index), folder=options.folder))
+
+
+if __name__ == '__main__':
+    main()
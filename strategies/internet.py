@@ -4,35 +4,46 @@
 '''A set of functions for downloading executable files over the Internet.'''
 
 # IMPORT STANDARD LIBRARIES
+import functools
 import logging
+import glob
 import os
 
 # IMPORT LOCAL LIBRARIES
+from ..utils import stream_extract as stream_extract_
+from ..utils import rezzurect_exceptions
+from ..utils import archive_cache
+from ..utils import block_reuse
+from ..utils import bandwidth
 from ..utils import progressbar
+from ..utils import downloader
+from ..utils import checksum
 from ..utils import common
+from ..utils import config
 from ..vendors import six
 
+try:
+    from ..utils import async_downloader
+except SyntaxError:  # Python 2 can't parse coroutines
+    async_downloader = None
 
-LOGGER = logging.getLogger('rezzurect.internet')
 
+LOGGER = logging.getLogger('rezzurect.internet')
 
-def _get_url(package, version, system, architecture):
-    '''Find the URL for the package and system and return it.
 
-    Args:
-        package (str): The name of the package to get a URL for. Example: "houdini".
-        system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
-        architecture (str): The bits of the `system`. Example: "x86_64", "AMD64", etc.
+def get_catalog():
+    '''Get every known package installer and the URL that it can be downloaded from.
 
     Returns:
-        str: The found URL, if any.
+        dict[tuple[str, str, str, int], str]:
+            Each package, version, system, and architecture and its URL.
 
     '''
     # TODO : Move this to a config file somewhere else
     nuke_root = 'https://www.foundry.com/products/download_product?file='
     houdini_ftp_165 = 'ftp://ftp.sidefx.com/public/Houdini16.5/Build.536'
 
-    references = {
+    return {
         ('houdini', '16.5.536', 'Linux', 64):
             '{0}/houdini-16.5.536-linux_x86_64_gcc4.8.tar.gz'.format(houdini_ftp_165),
         # TODO : Re-add this once SideFX gets back to me. Ticket ID "SESI #67857"
@@ -50,44 +61,224 @@ def _get_url(package, version, system, architecture):
             '{nuke_root}Nuke10.5v8-win-x86-release-64.zip'.format(nuke_root=nuke_root),
     }
 
+
+def _get_catalog_url(package, version, system, architecture):
+    '''Find the URL for the package and system, without checking if it can be reached.
+
+    Args:
+        package (str): The name of the package to get a URL for. Example: "houdini".
+        system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (str): The bits of the `system`. Example: "x86_64", "AMD64", etc.
+
+    Returns:
+        str: The found URL, if any.
+
+    '''
     option = (package, version, system, architecture)
 
     LOGGER.trace('Checking for URL using "%s".', option)
 
-    try:
-        url = references[option]
-    except KeyError:
-        return ''
+    return get_catalog().get(option, '')
+
+
+def _is_url_reachable(url):
+    '''bool: Check if `url` can be downloaded, using the user's probe cache settings.'''
+    return common.is_url_reachable(
+        url,
+        cache_path=config.URL_REACHABILITY_CACHE,
+        reachable_ttl=config.URL_REACHABLE_TTL,
+        unreachable_ttl=config.URL_UNREACHABLE_TTL,
+    )
 
-    if common.is_url_reachable(url):
+
+def _get_url(package, version, system, architecture):
+    '''Find the URL for the package and system and return it.
+
+    Args:
+        package (str): The name of the package to get a URL for. Example: "houdini".
+        system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (str): The bits of the `system`. Example: "x86_64", "AMD64", etc.
+
+    Returns:
+        str: The found URL, if it exists and can be reached.
+
+    '''
+    url = _get_catalog_url(package, version, system, architecture)
+
+    if url and _is_url_reachable(url):
         return url
 
     return ''
 
 
-def _install_from_url(url, destination):
+def _get_throttle():
+    '''Get the host-wide bandwidth limit which is set in the user's .respawnrc file.
+
+    Returns:
+        `rezzurect.utils.bandwidth.Throttle` or NoneType: The limit, if "bandwidth_limit" is set.
+
+    '''
+    return bandwidth.get_throttle(
+        config.BANDWIDTH_STATE,
+        config.BANDWIDTH_LIMIT,
+        config.BANDWIDTH_PRIORITY,
+        priorities=config.BANDWIDTH_PRIORITIES,
+    )
+
+
+def _install_from_url(url, destination, limiter=None):
     '''Download the contents of the URL to some location on-disk.
 
+    If the server supports byte ranges, the file is split into segments
+    which are downloaded at the same time. Interrupted downloads are kept
+    next to `destination` and are resumed the next time this function runs.
+    See `rezzurect.utils.downloader`.
+
     Args:
         url (str): The Internet address to download from.
         destination (str): The location where the package's files should download to.
+        limiter (`rezzurect.utils.downloader.ConnectionLimiter`, optional):
+            A cap on the connections which this download shares with others.
 
     Raises:
         RuntimeError: If the Internet download is interrupted (by the user or
                       by the Internet connection).
 
+    Returns:
+        str: The sha256 hex digest of the downloaded file.
+
+    '''
+    if config.BLOCK_REUSE:
+        block_reuse.prepare(url, destination, _get_reusable_archives(destination))
+
+    remote = downloader.download(
+        url,
+        destination,
+        connections=config.DOWNLOAD_CONNECTIONS,
+        reporthook=progressbar.UrllibProgress(LOGGER.trace).download_progress_hook,
+        limiter=limiter,
+        throttle=_get_throttle(),
+    )
+
+    return remote.sha256
+
+
+def _get_reusable_archives(destination):
+    '''Find the local archives which may share blocks with the archive at `destination`.
+
+    That's an older copy of the same file, in the archive folder of any
+    version of the package, or else the most recently downloaded archive of
+    the same type from one other version. Scanning a file costs about as
+    much as downloading it, so unrelated archives aren't searched.
+
+    Args:
+        destination (str): The absolute path where some archive will be downloaded to.
+
+    Returns:
+        list[str]: The absolute paths to every found archive.
+
+    '''
+    archive_folder = os.path.dirname(destination)
+    version_folder = os.path.dirname(archive_folder)
+    package_folder = os.path.dirname(version_folder)
+    name = os.path.basename(destination)
+    paths = set(glob.glob(
+        os.path.join(package_folder, '*', os.path.basename(archive_folder), name)))
+
+    if paths:
+        return sorted(paths)
+
+    siblings = [
+        path for path in glob.glob(os.path.join(
+            package_folder, '*', os.path.basename(archive_folder),
+            '*' + os.path.splitext(destination)[1]))
+        if os.path.dirname(os.path.dirname(path)) != version_folder
+    ]
+
+    if not siblings:
+        return []
+
+    return [max(siblings, key=os.path.getmtime)]
+
+
+def get_expected_digest(file_name):
+    '''Find the size and sha256 digest that an archive is supposed to have.
+
+    Expected digests are listed in the "archive_digests" key of the user's
+    .respawnrc file. Example:
+
+        archive_digests:
+            Nuke11.2v3-linux-x86-release-64.tgz:
+                sha256: 9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08
+                size: 1045139521
+
+    Args:
+        file_name (str): The name of some archive. Example: "Nuke11.2v3-linux-x86-release-64.tgz".
+
+    Returns:
+        tuple[int or NoneType, str]: The expected size and digest. Either may be empty if unknown.
+
+    '''
+    expected = config.ARCHIVE_DIGESTS.get(file_name) or dict()
+
+    return (expected.get('size'), expected.get('sha256', ''))
+
+
+def verify_archive(path, digest=''):
+    '''Check an archive against its expected size and digest and remember its digest.
+
+    Args:
+        path (str): The absolute path to some archive file.
+        digest (str, optional): The sha256 of `path`, if it's already known.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`:
+            If the archive doesn't match. The archive is deleted so that a
+            later install doesn't trust it.
+
+    Returns:
+        str: The sha256 hex digest of `path`, if it was known or had to be computed.
+
     '''
+    size, sha256 = get_expected_digest(os.path.basename(path))
+    cache = checksum.get_cache(config.VERIFICATION_CACHE)
+
+    if sha256 and not digest:
+        digest = checksum.get_file_digest(path, cache=cache)
+
     try:
-        six.moves.urllib.request.urlretrieve(
-            url,
-            destination,
-            reporthook=progressbar.UrllibProgress(LOGGER.trace).download_progress_hook,
-        )
-    except six.moves.urllib.ContentTooShortError:
-        # Reference: https://docs.python.org/2/library/urllib.html#urllib.ContentTooShortError
-        # "This can occur, for example, when the download is interrupted."
-        #
-        raise RuntimeError('Download was interrupted')
+        checksum.verify(path, size=size, sha256=sha256, digest=digest)
+    except rezzurect_exceptions.ChecksumError:
+        LOGGER.error('Archive "%s" is corrupt and will be removed.', path)
+        os.remove(path)
+
+        raise
+
+    if digest and cache:
+        cache.record(path, digest)
+
+    return digest
+
+
+def get_archive_file_name(package, version, system, architecture):
+    '''Find the file name that the archive for some package would download as.
+
+    Args:
+        package (str): The name of the package to get a URL for. Example: "houdini".
+        version (str): The specific version of `package` to download.
+        system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (str): The bits of the `system`. Example: "x86_64", "AMD64", etc.
+
+    Returns:
+        str: The found file name, if any.
+
+    '''
+    url = _get_catalog_url(package, version, system, architecture)
+
+    if not url:
+        return ''
+
+    return get_recommended_file_name(url)
 
 
 def get_recommended_file_name(url):
@@ -117,22 +308,45 @@ def get_recommended_file_name(url):
     return path.split('/')[-1]
 
 
-def download(package, version, system, architecture, destination):
-    '''Download a package from online, using http/https.
+def _get_proxied_url(url):
+    '''Get the address that `url` should be downloaded from.
+
+    If the user has a "download_proxy" (see `rezzurect.cache_server`), the
+    file is downloaded from the proxy instead of the vendor's server.
+
+    Args:
+        url (str): The vendor's address for some installer.
+
+    Returns:
+        str: The address on the proxy or `url` if there is no proxy.
+
+    '''
+    if not config.DOWNLOAD_PROXY:
+        return url
+
+    file_name = get_recommended_file_name(url)
+
+    return config.DOWNLOAD_PROXY.rstrip('/') + '/' + six.moves.urllib.parse.quote(file_name)
+
+
+def _get_download_details(package, version, system, architecture):
+    '''Find the URL and the file name of the archive to download.
 
     Args:
         package (str): The name of the package to get a URL for. Example: "houdini".
         version (str): The specific version of `package` to download.
         system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
         architecture (str): The bits of the `system`. Example: "x86_64", "AMD64", etc.
-        destination (str): The location where the package's files should download to.
 
     Raises:
         RuntimeError: If no URL for the given settings could be found
                       or if a filename for the given URL could be found.
 
+    Returns:
+        tuple[str, str]: The found URL and its file name.
+
     '''
-    url = _get_url(package, version, system, architecture)
+    url = _get_catalog_url(package, version, system, architecture)
 
     if not url:
         raise RuntimeError('No URL could be found for "{data}".'.format(
@@ -143,7 +357,188 @@ def download(package, version, system, architecture, destination):
     if not file_name:
         raise RuntimeError('No filename could be found for "{url}".'.format(url=url))
 
+    return (url, file_name)
+
+
+def _validate_reachable(url):
+    '''Make sure that `url` can be downloaded.
+
+    Raises:
+        RuntimeError: If the URL could not be reached.
+
+    '''
+    if not _is_url_reachable(url):
+        raise RuntimeError('URL "{url}" could not be reached.'.format(url=url))
+
+
+def download(package, version, system, architecture, destination, limiter=None):
+    '''Download a package from online, using http/https.
+
+    If an archive cache is configured, the archive is taken from the cache
+    when possible and any newly-downloaded archive is added to it.
+
+    Args:
+        package (str): The name of the package to get a URL for. Example: "houdini".
+        version (str): The specific version of `package` to download.
+        system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (str): The bits of the `system`. Example: "x86_64", "AMD64", etc.
+        destination (str): The location where the package's files should download to.
+        limiter (`rezzurect.utils.downloader.ConnectionLimiter`, optional):
+            A cap on the connections which this download shares with others.
+
+    Raises:
+        RuntimeError:
+            If no URL for the given settings could be found or reached
+            or if a filename for the given URL could be found.
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`:
+            If the downloaded archive doesn't match its expected digest.
+
+    '''
+    url, file_name = _get_download_details(package, version, system, architecture)
     destination = os.path.join(destination, file_name)
-    _install_from_url(url, destination)
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+
+    source = _get_proxied_url(url)
+
+    if not cache:
+        _validate_reachable(source)
+        verify_archive(destination, digest=_install_from_url(source, destination, limiter=limiter))
+
+        return destination
+
+    # Only one process downloads `url` at a time. Everyone else waits and
+    # then gets the archive from the cache, instead of downloading it again
+    #
+    with cache.get_lock(url):
+        digest = cache.fetch_url(url, destination)
+
+        if digest:
+            verify_archive(destination, digest=digest)
+
+            return destination
+
+        _validate_reachable(source)
+        digest = verify_archive(
+            destination, digest=_install_from_url(source, destination, limiter=limiter))
+        cache.add(destination, url=url, digest=digest)
+
+    return destination
+
+
+def download_many(requests):
+    '''Download the archives of several packages at the same time.
+
+    Every download shares the "download_connection_limit" and
+    "download_host_connections" caps from the user's .respawnrc so,
+    for example, two packages from the same vendor don't open twice as many
+    connections to that vendor's server.
+
+    On Python 2, the archives are downloaded one at a time instead.
+
+    Args:
+        requests (iterable[tuple[str, str, str, int, str]]):
+            The package, version, system, architecture, and destination
+            folder of each archive. See `download`.
+
+    Returns:
+        list[str or Exception]:
+            The path to each downloaded archive or the error which stopped
+            it, in the same order as `requests`.
+
+    '''
+    functions = [functools.partial(download, *request) for request in requests]
+
+    if async_downloader:
+        return async_downloader.run_all(
+            functions,
+            connections=config.DOWNLOAD_CONNECTION_LIMIT,
+            host_connections=config.DOWNLOAD_HOST_CONNECTIONS,
+        )
+
+    limiter = downloader.ConnectionLimiter(
+        total=config.DOWNLOAD_CONNECTION_LIMIT,
+        per_host=config.DOWNLOAD_HOST_CONNECTIONS,
+    )
+    results = []
+
+    for function in functions:
+        try:
+            results.append(function(limiter=limiter))
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception('Download "%s" failed.', function.args)
+            results.append(error)
+
+    return results
+
+
+def stream_extract(package, version, system, architecture, destination, extract_to, include=None):
+    '''Download a package's TAR archive and extract it while it downloads.
+
+    The archive is only written to disk if an archive cache is configured.
+    If the cache already has the archive, it's copied into `destination`
+    and nothing is extracted. The caller is expected to extract it normally.
+
+    Args:
+        package (str): The name of the package to get a URL for. Example: "houdini".
+        version (str): The specific version of `package` to download.
+        system (str): The name of the OS platform. Example: "Linux", "Windows", etc.
+        architecture (str): The bits of the `system`. Example: "x86_64", "AMD64", etc.
+        destination (str): The folder where the package's archive would download to.
+        extract_to (str): The folder where the archive's contents will be extracted to.
+        include (iterable[str], optional): `fnmatch` patterns of the members to extract.
+
+    Raises:
+        RuntimeError:
+            If no URL for the given settings could be found or reached
+            or if the download was interrupted.
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`:
+            If the archive doesn't match its expected digest. Nothing is extracted.
+
+    Returns:
+        str: The absolute path to the archive, if it was written to disk.
+
+    '''
+    url, file_name = _get_download_details(package, version, system, architecture)
+    destination = os.path.join(destination, file_name)
+    cache = archive_cache.get_cache(config.ARCHIVE_CACHE, config.VERIFICATION_CACHE)
+    reporthook = progressbar.UrllibProgress(LOGGER.trace).download_progress_hook
+    source = _get_proxied_url(url)
+    size, sha256 = get_expected_digest(file_name)
+
+    if not cache:
+        _validate_reachable(source)
+        stream_extract_.extract_url(
+            source,
+            extract_to,
+            reporthook=reporthook,
+            size=size,
+            sha256=sha256,
+            throttle=_get_throttle(),
+            include=include,
+        )
+
+        return ''
+
+    with cache.get_lock(url):
+        digest = cache.fetch_url(url, destination)
+
+        if digest:
+            verify_archive(destination, digest=digest)
+
+            return destination
+
+        _validate_reachable(source)
+        digest = stream_extract_.extract_url(
+            source,
+            extract_to,
+            tee_path=destination,
+            reporthook=reporthook,
+            size=size,
+            sha256=sha256,
+            throttle=_get_throttle(),
+            include=include,
+        )
+        verify_archive(destination, digest=digest)
+        cache.add(destination, url=url, digest=digest)
 
     return destination
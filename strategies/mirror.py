@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''A set of functions for downloading installer files from studio mirrors.
+
+A mirror is any folder of installer archives which can be reached with a
+"file://", "http://", or "https://" URL. For example, a shared drive or a
+small web server on the LAN. Mirrors are listed in the "mirrors" key of the
+user's .respawnrc file.
+
+Every mirror is probed at the same time. The mirrors which have the archive
+are ranked by how long they'd take to send the whole file, based on their
+measured latency and throughput. The archive is then downloaded from the
+fastest mirror. If that mirror fails part-way through, the download
+continues from the same byte on the next mirror.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+from __future__ import division
+import threading
+import logging
+import time
+import os
+
+# IMPORT LOCAL LIBRARIES
+from ..vendors import six
+
+
+_TRANSFER_ERRORS = (IOError, OSError, six.moves.http_client.HTTPException)
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_TIMEOUT = 10
+SAMPLE_SIZE = 256 * 1024
+LOGGER = logging.getLogger('rezzurect.mirror')
+
+
+class Mirror(object):  # pylint: disable=too-few-public-methods
+
+    '''The measured speed of a mirror which has some archive.
+
+    Attributes:
+        url (str): The address of the archive on this mirror.
+        size (int or NoneType): The size of the archive, if the mirror reported it.
+        latency (float): The number of seconds before the mirror started to respond.
+        throughput (float): The number of bytes per second that the mirror sent.
+
+    '''
+
+    def __init__(self, url, size, latency, throughput):
+        '''Create the instance and store its measurements.'''
+        super(Mirror, self).__init__()
+
+        self.url = url
+        self.size = size
+        self.latency = latency
+        self.throughput = throughput
+
+    def get_estimated_time(self):
+        '''float: The number of seconds that this mirror would take to send the archive.'''
+        if not self.throughput:
+            return float('inf')
+
+        return self.latency + (self.size or 0) / self.throughput
+
+
+def _is_file_url(url):
+    '''bool: Check if `url` points to a file on a local or shared drive.'''
+    return url.lower().startswith('file:')
+
+
+def _get_file_path(url):
+    '''str: Convert a "file://" URL into a path on-disk.'''
+    _, _, path, _, _ = six.moves.urlparse.urlsplit(url)
+
+    return six.moves.urllib.request.url2pathname(path)
+
+
+def _open_at(url, offset, timeout=DEFAULT_TIMEOUT):
+    '''Open `url` for reading, starting at byte `offset`.
+
+    Raises:
+        IOError: If the mirror can't send bytes from `offset`.
+
+    Returns:
+        tuple[file-like, int or NoneType]: The opened stream and the total size of the file.
+
+    '''
+    if _is_file_url(url):
+        path = _get_file_path(url)
+        file_ = open(path, 'rb')
+        file_.seek(offset)
+
+        return (file_, os.path.getsize(path))
+
+    headers = dict()
+
+    if offset:
+        headers['Range'] = 'bytes={offset}-'.format(offset=offset)
+
+    request = six.moves.urllib.request.Request(url, headers=headers)
+    response = six.moves.urllib.request.urlopen(request, timeout=timeout)
+
+    if offset and response.getcode() != 206:
+        response.close()
+
+        raise IOError('Mirror "{url}" does not support resuming.'.format(url=url))
+
+    length = response.info().get('Content-Length', '') or ''
+
+    if not length.isdigit():
+        return (response, None)
+
+    return (response, offset + int(length))
+
+
+def get_url(root, file_name):
+    '''str: Get the address of `file_name` on the mirror at `root`.'''
+    return root.rstrip('/') + '/' + six.moves.urllib.parse.quote(file_name)
+
+
+def probe(url, timeout=DEFAULT_TIMEOUT):
+    '''Measure how quickly a mirror can send `url`.
+
+    Args:
+        url (str): The address of an archive on some mirror.
+        timeout (int, optional): The number of seconds to wait for the mirror.
+
+    Returns:
+        `Mirror` or NoneType: The measurements, if the mirror has the archive.
+
+    '''
+    started = time.time()
+
+    try:
+        stream, size = _open_at(url, 0, timeout=timeout)
+    except (IOError, OSError, ValueError):  # `URLError` inherits from `IOError`
+        LOGGER.debug('Mirror URL "%s" could not be opened.', url)
+        return None
+
+    try:
+        latency = time.time() - started
+        sample_started = time.time()
+        sample = stream.read(SAMPLE_SIZE)
+        duration = max(time.time() - sample_started, 1e-6)
+    except _TRANSFER_ERRORS:
+        LOGGER.debug('Mirror URL "%s" could not be read.', url)
+        return None
+    finally:
+        stream.close()
+
+    return Mirror(url, size, latency, len(sample) / duration)
+
+
+def rank(roots, file_name, timeout=DEFAULT_TIMEOUT):
+    '''Probe every mirror at once and sort the ones that have `file_name`, fastest-first.
+
+    Args:
+        roots (list[str]): The base address of each mirror.
+        file_name (str): The name of the archive to look for.
+        timeout (int, optional): The number of seconds to wait for each mirror.
+
+    Returns:
+        list[`Mirror`]: The mirrors which have the archive.
+
+    '''
+    results = []
+
+    def _probe(url):
+        mirror = probe(url, timeout=timeout)
+
+        if mirror:
+            results.append(mirror)
+
+    threads = [threading.Thread(target=_probe, args=(get_url(root, file_name), ))
+               for root in roots]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    return sorted(results, key=lambda mirror: (mirror.get_estimated_time(), mirror.latency))
+
+
+def download(roots, file_name, destination, timeout=DEFAULT_TIMEOUT, reporthook=None, hasher=None):
+    '''Download `file_name` from the fastest mirror, switching mirrors if one fails.
+
+    Args:
+        roots (list[str]):
+            The base address of each mirror.
+        file_name (str):
+            The name of the archive to download.
+        destination (str):
+            The folder where the archive will be written.
+        timeout (int, optional):
+            The number of seconds before an unresponsive mirror is skipped.
+        reporthook (callable[int, int, int], optional):
+            A function in the same style as `urllib.urlretrieve`'s reporthook.
+        hasher (`hashlib.sha256`, optional):
+            If given, it is updated with every byte of the archive, in order.
+
+    Raises:
+        RuntimeError: If no mirror has the archive or every mirror failed.
+
+    Returns:
+        str: The absolute path to the downloaded archive.
+
+    '''
+    mirrors = rank(roots, file_name, timeout=timeout)
+
+    if not mirrors:
+        raise RuntimeError('No mirror has file "{file_name}". Mirrors were "{roots}".'
+                           ''.format(file_name=file_name, roots=roots))
+
+    path = os.path.join(destination, file_name)
+    part_path = path + '.part'
+    size = mirrors[0].size
+    offset = 0
+
+    with open(part_path, 'wb') as file_:
+        for mirror in mirrors:
+            if size is not None and mirror.size not in (None, size):
+                LOGGER.warning('Skipping mirror "%s" because its file is a different size.',
+                               mirror.url)
+                continue
+
+            LOGGER.info('Downloading "%s" from byte "%s".', mirror.url, offset)
+
+            try:
+                stream, total = _open_at(mirror.url, offset, timeout=timeout)
+            except (IOError, OSError, ValueError):
+                LOGGER.exception('Mirror "%s" could not be opened.', mirror.url)
+                continue
+
+            size = size or total
+
+            try:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):  # pylint: disable=cell-var-from-loop
+                    file_.write(chunk)
+                    offset += len(chunk)
+
+                    if hasher:
+                        hasher.update(chunk)
+
+                    if reporthook and size:
+                        reporthook(offset, 1, size)
+            except _TRANSFER_ERRORS:
+                LOGGER.exception('Mirror "%s" failed at byte "%s".', mirror.url, offset)
+                continue
+            finally:
+                stream.close()
+
+            if size is None or offset == size:
+                break
+
+            LOGGER.warning('Mirror "%s" stopped early at byte "%s".', mirror.url, offset)
+        else:
+            file_.close()
+            os.remove(part_path)
+
+            raise RuntimeError('Every mirror failed to download "{file_name}".'
+                               ''.format(file_name=file_name))
+
+    if os.name == 'nt' and os.path.isfile(path):
+        os.remove(path)
+
+    os.rename(part_path, path)
+
+    return path
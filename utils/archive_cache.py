@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''A content-addressed store for installer archives.
+
+Every package keeps its installers in its own "archive" folder. This cache
+lets those folders share one copy of each archive, even across different Rez
+package roots (or machines, if the cache is on a shared drive).
+
+The cache folder is laid out like this:
+
+    {root}/objects/ab/abcdef...  # The archive, named by its sha256 digest
+    {root}/urls/0123...json      # The digest of the archive for some URL
+    {root}/names/Nuke...tgz.json # The digest of the archive for some file name
+    {root}/locks/0123...lock     # Held while some process downloads a URL
+
+Archives are handed out using a reflink (copy-on-write clone) where the file
+system supports it, then a hardlink, and then a regular copy.
+
+A file outside of the cache is only trusted as a copy of a cached archive
+if its sha256 digest matches. Digests are looked up in a
+`rezzurect.utils.checksum.VerificationCache` so each file is hashed once.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import hashlib
+import fnmatch
+import logging
+import shutil
+import errno
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# IMPORT LOCAL LIBRARIES
+from . import filelock
+from . import checksum
+
+
+_FICLONE = 0x40049409  # Linux's copy-on-write clone `ioctl` request
+LOGGER = logging.getLogger('rezzurect.archive_cache')
+
+
+class ArchiveCache(object):
+
+    '''A folder of archives which are keyed by URL, file name, and digest.'''
+
+    def __init__(self, root, verification=None):
+        '''Create the instance.
+
+        Args:
+            root (str):
+                The absolute path to the cache folder.
+            verification (`rezzurect.utils.checksum.VerificationCache`, optional):
+                If given, the known digests of files on-disk, so they aren't hashed again.
+
+        '''
+        super(ArchiveCache, self).__init__()
+
+        self.root = root
+        self.verification = verification
+
+    @staticmethod
+    def _get_key(text):
+        '''str: Make a name for `text` which is safe to use as a file name.'''
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _has_digest(self, path, digest):
+        '''bool: Check if the file at `path` has the sha256 digest, `digest`.'''
+        try:
+            return checksum.get_file_digest(path, cache=self.verification) == digest
+        except (IOError, OSError):
+            return False
+
+    def _read_record(self, path):
+        '''Get the archive which a URL or name record file points to.
+
+        Args:
+            path (str): The absolute path to some record file.
+
+        Returns:
+            dict[str, str or int]: The found record or an empty dict, if it is missing or broken.
+
+        '''
+        try:
+            with open(path, 'r') as file_:
+                record = json.load(file_)
+        except (IOError, ValueError):
+            return dict()
+
+        object_path = self.get_object_path(record.get('digest', ''))
+
+        if not os.path.isfile(object_path) or os.path.getsize(object_path) != record.get('size'):
+            return dict()
+
+        return record
+
+    @staticmethod
+    def _write_record(path, record):
+        '''Write `record` to `path` so that readers never see a partial file.'''
+        _make_directory(os.path.dirname(path))
+        temporary_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+
+        with open(temporary_path, 'w') as file_:
+            json.dump(record, file_)
+
+        _replace(temporary_path, path)
+
+    def add(self, path, url='', digest=''):
+        '''Store a copy of the archive file at `path` in the cache.
+
+        Args:
+            path (str):
+                The absolute path to an archive file.
+            url (str, optional):
+                The address that `path` was downloaded from, if any.
+            digest (str, optional):
+                The sha256 of `path`. If no digest is given, it will be computed.
+
+        Returns:
+            str: The sha256 digest of `path`.
+
+        '''
+        if not digest:
+            digest = checksum.get_file_digest(path)
+
+        object_path = self.get_object_path(digest)
+
+        if not os.path.isfile(object_path):
+            _make_directory(os.path.dirname(object_path))
+            temporary_path = '{path}.{pid}.tmp'.format(path=object_path, pid=os.getpid())
+            link(path, temporary_path)
+            _replace(temporary_path, object_path)
+
+        name = os.path.basename(path)
+        record = {'digest': digest, 'name': name, 'size': os.path.getsize(object_path), 'url': url}
+        self._write_record(self.get_name_record_path(name), record)
+
+        if url:
+            self._write_record(self.get_url_record_path(url), record)
+
+        LOGGER.debug('Added "%s" to the archive cache as "%s".', path, digest)
+
+        return digest
+
+    def fetch_name(self, pattern, folder):
+        '''Copy the first cached archive whose file name matches `pattern` into `folder`.
+
+        Args:
+            pattern (str): A file name or `fnmatch` pattern. Example: "houdini-*.tar.gz".
+            folder (str): The absolute path to the directory to put the archive into.
+
+        Returns:
+            str: The absolute path to the copied archive, if any.
+
+        '''
+        names_folder = os.path.join(self.root, 'names')
+
+        if not pattern or not os.path.isdir(names_folder):
+            return ''
+
+        for record_name in sorted(os.listdir(names_folder)):
+            name, extension = os.path.splitext(record_name)
+
+            if extension != '.json' or not fnmatch.fnmatch(name, pattern):
+                continue
+
+            record = self._read_record(os.path.join(names_folder, record_name))
+
+            if record:
+                destination = os.path.join(folder, record['name'])
+                self._fetch(record, destination)
+
+                return destination
+
+        return ''
+
+    def fetch_url(self, url, destination):
+        '''Copy the cached archive for `url` to `destination`, if it has been cached.
+
+        Returns:
+            str: The sha256 digest of the found archive or an empty string, if it wasn't found.
+
+        '''
+        record = self._read_record(self.get_url_record_path(url))
+
+        if not record:
+            return ''
+
+        self._fetch(record, destination)
+
+        return record['digest']
+
+    def find_file(self, path):
+        '''Get the cached copy of the archive file at `path`, if it has been cached.
+
+        The archive is matched by its file name, size and sha256 digest.
+
+        Args:
+            path (str): The absolute path to some archive file.
+
+        Returns:
+            str: The absolute path to the cached archive, if it was found.
+
+        '''
+        record = self._read_record(self.get_name_record_path(os.path.basename(path)))
+
+        if not record or record['size'] != os.path.getsize(path):
+            return ''
+
+        if not self._has_digest(path, record['digest']):
+            LOGGER.warning('File "%s" does not match its copy in the archive cache.', path)
+
+            return ''
+
+        return self.get_object_path(record['digest'])
+
+    def find_url(self, url):
+        '''str: The absolute path to the cached archive for `url`, if it has been cached.'''
+        record = self._read_record(self.get_url_record_path(url))
+
+        if not record:
+            return ''
+
+        return self.get_object_path(record['digest'])
+
+    def _fetch(self, record, destination):
+        '''Link the archive of `record` to `destination`, unless it's already there.'''
+        if os.path.isfile(destination) and os.path.getsize(destination) == record['size'] and \
+                self._has_digest(destination, record['digest']):
+            return
+
+        _make_directory(os.path.dirname(destination))
+        temporary_path = '{path}.{pid}.tmp'.format(path=destination, pid=os.getpid())
+        link(self.get_object_path(record['digest']), temporary_path)
+        _replace(temporary_path, destination)
+
+        if self.verification:
+            self.verification.record(destination, record['digest'])
+
+        LOGGER.info('Found "%s" in the archive cache.', destination)
+
+    def get_lock(self, url):
+        '''`rezzurect.utils.filelock.FileLock`: A lock for whoever downloads `url`.'''
+        return filelock.FileLock(
+            os.path.join(self.root, 'locks', self._get_key(url) + '.lock'))
+
+    def get_name_record_path(self, name):
+        '''str: The file which points some archive file name to its digest.'''
+        return os.path.join(self.root, 'names', name + '.json')
+
+    def get_object_path(self, digest):
+        '''str: The absolute path where the archive for `digest` is stored.'''
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def get_url_record_path(self, url):
+        '''str: The file which points some URL to the digest of its archive.'''
+        return os.path.join(self.root, 'urls', self._get_key(url) + '.json')
+
+
+def _make_directory(path):
+    '''Create `path` if it doesn't exist, ignoring other processes which make it too.'''
+    try:
+        os.makedirs(path)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+
+def _replace(source, destination):
+    '''Rename `source` to `destination`, overwriting `destination` if needed.'''
+    if os.name == 'nt' and os.path.isfile(destination):
+        os.remove(destination)
+
+    os.rename(source, destination)
+
+
+def _reflink(source, destination):
+    '''bool: Make `destination` a copy-on-write clone of `source`, if supported.'''
+    if not fcntl:
+        return False
+
+    with open(source, 'rb') as source_file:
+        with open(destination, 'wb') as destination_file:
+            try:
+                fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+            except (IOError, OSError):
+                pass
+            else:
+                return True
+
+    os.remove(destination)
+
+    return False
+
+
+def get_cache(root, verification=''):
+    '''Create a cache for `root`.
+
+    Args:
+        root (str):
+            The cache's folder. "~" and environment variables are expanded.
+        verification (str, optional):
+            The JSON file of a `rezzurect.utils.checksum.VerificationCache`.
+            If not given, every file which is checked is hashed.
+
+    Returns:
+        `ArchiveCache` or NoneType: The cache or nothing, if no folder was given.
+
+    '''
+    if not root:
+        return None
+
+    return ArchiveCache(
+        os.path.expandvars(os.path.expanduser(root)),
+        verification=checksum.get_cache(verification),
+    )
+
+
+def link(source, destination):
+    '''Make `destination` share the contents of `source` as cheaply as possible.
+
+    The link is tried as a reflink, then a hardlink, and then a regular copy.
+
+    '''
+    if _reflink(source, destination):
+        return
+
+    try:
+        os.link(source, destination)
+    except (AttributeError, OSError):  # `os.link` doesn't exist for Python 2 on Windows
+        shutil.copy2(source, destination)
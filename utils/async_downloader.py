@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Run several downloads at the same time using asyncio.
+
+This module requires Python 3.5+. `rezzurect.strategies.internet` imports
+it only when it can, and downloads one package at a time when it can't.
+
+Each download still goes through `rezzurect.utils.downloader` (so it's
+segmented, resumable, and hashed while it downloads) but it runs on a worker
+thread which the event loop awaits. Every download shares one
+`rezzurect.utils.downloader.ConnectionLimiter` so, together, they never
+open more than `connections` connections or `host_connections` connections
+to any one server.
+
+Example:
+    >>> async def fetch(engine):
+    ...     return await asyncio.gather(
+    ...         engine.download('https://example.com/a.tgz', '/tmp/a.tgz'),
+    ...         engine.download('https://example.com/b.tgz', '/tmp/b.tgz'),
+    ...     )
+    >>> with DownloadEngine() as engine:
+    ...     run(fetch(engine))
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import concurrent.futures
+import functools
+import asyncio
+import logging
+
+# IMPORT LOCAL LIBRARIES
+from . import downloader
+
+
+DEFAULT_CONNECTIONS = 8
+DEFAULT_HOST_CONNECTIONS = 4
+LOGGER = logging.getLogger('rezzurect.async_downloader')
+
+
+class DownloadEngine(object):
+
+    '''A pool of download workers which share one connection limit.
+
+    Attributes:
+        limiter (`rezzurect.utils.downloader.ConnectionLimiter`):
+            The cap which every download of this engine shares.
+
+    '''
+
+    def __init__(self, connections=DEFAULT_CONNECTIONS,
+                 host_connections=DEFAULT_HOST_CONNECTIONS, jobs=None):
+        '''Create the instance.
+
+        Args:
+            connections (int, optional):
+                The most connections that every download may open, combined.
+            host_connections (int, optional):
+                The most connections that every download may open to one server, combined.
+            jobs (int, optional):
+                The most downloads which may run at once. Default: `connections`.
+
+        '''
+        super(DownloadEngine, self).__init__()
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs or connections)
+        self.limiter = downloader.ConnectionLimiter(total=connections, per_host=host_connections)
+
+    def __enter__(self):
+        '''`DownloadEngine`: Use this engine until the context closes.'''
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        '''Wait for every worker to stop.'''
+        self.close()
+
+    def close(self):
+        '''Wait for every running download to finish and stop the workers.'''
+        self._executor.shutdown(wait=True)
+
+    async def call(self, function, *args, **kwargs):
+        '''Run a blocking download function on a worker thread.
+
+        Args:
+            function (callable):
+                The function to run. It must accept a `limiter` keyword, which
+                is given this engine's `limiter`.
+            *args (list):
+                Positional arguments for `function`.
+            **kwargs (dict[str]):
+                Keyword arguments for `function`.
+
+        Returns:
+            The return value of `function`.
+
+        '''
+        loop = asyncio.get_event_loop()
+
+        return await loop.run_in_executor(
+            self._executor, functools.partial(function, *args, limiter=self.limiter, **kwargs))
+
+    async def download(self, url, path, connections=downloader.DEFAULT_CONNECTIONS,
+                       reporthook=None):
+        '''Download `url` to `path`. See `rezzurect.utils.downloader.download`.
+
+        Returns:
+            `rezzurect.utils.downloader.RemoteFile`: The description of the downloaded file.
+
+        '''
+        return await self.call(
+            downloader.download, url, path, connections=connections, reporthook=reporthook)
+
+    async def gather(self, functions):
+        '''Run every function at the same time and wait for all of them to finish.
+
+        Args:
+            functions (iterable[callable]): Blocking functions which accept a `limiter` keyword.
+
+        Returns:
+            list: The result of each function (or the exception which it raised), in order.
+
+        '''
+        return await asyncio.gather(
+            *[self.call(function) for function in functions], return_exceptions=True)
+
+
+def run(coroutine):
+    '''Run `coroutine` on a new event loop until it finishes and return its result.'''
+    loop = asyncio.new_event_loop()
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def run_all(functions, connections=DEFAULT_CONNECTIONS, host_connections=DEFAULT_HOST_CONNECTIONS):
+    '''Run several blocking download functions at the same time.
+
+    Args:
+        functions (list[callable]):
+            Functions which accept a `limiter` keyword. Usually, `functools.partial` objects.
+        connections (int, optional):
+            The most connections that every function may open, combined.
+        host_connections (int, optional):
+            The most connections that every function may open to one server, combined.
+
+    Returns:
+        list: The result of each function (or the exception which it raised), in order.
+
+    '''
+    functions = list(functions)
+
+    if not functions:
+        return []
+
+    LOGGER.debug('Running "%s" downloads at once.', len(functions))
+
+    with DownloadEngine(connections, host_connections, jobs=len(functions)) as engine:
+        return run(engine.gather(functions))
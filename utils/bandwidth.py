@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''A host-wide download bandwidth limit which is shared by every process.
+
+Every process on the host reads and writes one small state file, guarded by
+a `rezzurect.utils.filelock.FileLock`. The state file holds a token bucket
+which refills at the host's byte rate, plus every download which is waiting
+for tokens and its priority class.
+
+Each priority class has a rank. A download only gets tokens when no download
+of a higher class is waiting for them. So an artist's interactive install
+takes the whole limit while it runs, farm downloads get whatever it leaves
+and prefetches only run on bandwidth that nothing else wants.
+
+Example:
+    >>> throttle = Throttle('/tmp/bandwidth.json', 10 * 1024 * 1024, 'farm')
+    >>> throttle.consume(1024 * 1024)  # Waits until 1 MB may be downloaded
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+from __future__ import division
+import threading
+import logging
+import json
+import time
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import filelock
+
+
+DEFAULT_PRIORITIES = ('interactive', 'farm', 'prefetch')
+MAXIMUM_WAIT = 0.5
+MINIMUM_WAIT = 0.01
+WAITER_TIMEOUT = 2
+LOGGER = logging.getLogger('rezzurect.bandwidth')
+
+
+class Throttle(object):
+
+    '''A token bucket which is shared, through a file, by every process on the host.
+
+    Attributes:
+        path (str): The state file which every process shares.
+        rate (int): The most bytes per second that the whole host may download.
+        priority (str): The class of this process's downloads. Example: "interactive".
+        priorities (list[str]): Every class, from the highest priority to the lowest.
+
+    '''
+
+    def __init__(self, path, rate, priority, priorities=DEFAULT_PRIORITIES):
+        '''Create the instance.
+
+        Args:
+            path (str):
+                The absolute path to the state file which every process shares.
+            rate (int):
+                The most bytes per second that the whole host may download.
+            priority (str):
+                The class of this process's downloads. Example: "interactive".
+            priorities (iterable[str], optional):
+                Every class, from the highest priority to the lowest. If
+                `priority` isn't one of them, it gets the lowest priority.
+
+        '''
+        super(Throttle, self).__init__()
+
+        self._lock = filelock.FileLock(path + '.lock')
+        self.path = path
+        self.rate = rate
+        self.priority = priority
+        self.priorities = list(priorities)
+
+    def _get_rank(self, priority):
+        '''int: The position of `priority`, where 0 is the highest priority.'''
+        try:
+            return self.priorities.index(priority)
+        except ValueError:
+            return len(self.priorities)
+
+    def _read(self):
+        '''dict[str]: The current state of the bucket.'''
+        try:
+            with open(self.path, 'r') as file_:
+                return json.load(file_)
+        except (IOError, ValueError):
+            return {'tokens': self.rate, 'updated': time.time(), 'waiting': dict()}
+
+    def _write(self, state):
+        '''Save `state` for the other processes. The caller must hold the lock.'''
+        temporary_path = '{path}.{pid}.tmp'.format(path=self.path, pid=os.getpid())
+
+        with open(temporary_path, 'w') as file_:
+            json.dump(state, file_)
+
+        if os.name == 'nt' and os.path.isfile(self.path):
+            os.remove(self.path)
+
+        os.rename(temporary_path, self.path)
+
+    def _try_take(self, key, count):
+        '''Take `count` tokens if this download is allowed to, or register it as waiting.
+
+        Args:
+            key (str): A name which is unique to the calling thread.
+            count (int): The number of bytes to take tokens for.
+
+        Returns:
+            float: 0 if the tokens were taken or, otherwise, the number of seconds to wait.
+
+        '''
+        now = time.time()
+
+        with self._lock:
+            state = self._read()
+            elapsed = max(now - state.get('updated', now), 0)
+
+            # The bucket holds, at most, one second of tokens
+            tokens = min(state.get('tokens', 0) + elapsed * self.rate, self.rate)
+            waiting = {
+                name: waiter for name, waiter in state.get('waiting', dict()).items()
+                if now - waiter['seen'] < WAITER_TIMEOUT and name != key
+            }
+            rank = self._get_rank(self.priority)
+            outranked = any(self._get_rank(waiter['priority']) < rank for waiter in waiting.values())
+
+            if tokens > 0 and not outranked:
+                # Tokens are allowed to go negative so that a chunk which is
+                # bigger than the bucket still gets through, eventually
+                #
+                tokens -= count
+                delay = 0
+            else:
+                waiting[key] = {'priority': self.priority, 'seen': now}
+                delay = min(max(-tokens / self.rate, MINIMUM_WAIT), MAXIMUM_WAIT)
+
+            state = {'tokens': tokens, 'updated': now, 'waiting': waiting}
+
+            try:
+                self._write(state)
+            except (IOError, OSError):
+                LOGGER.warning('Bandwidth state "%s" could not be written.', self.path)
+
+        return delay
+
+    def consume(self, count):
+        '''Wait until `count` more bytes may be downloaded.
+
+        Args:
+            count (int): The number of bytes which were (or are about to be) downloaded.
+
+        '''
+        key = '{pid}-{thread}'.format(pid=os.getpid(), thread=threading.current_thread().ident)
+
+        while True:
+            delay = self._try_take(key, count)
+
+            if not delay:
+                return
+
+            time.sleep(delay)
+
+
+def get_throttle(path, rate, priority, priorities=DEFAULT_PRIORITIES):
+    '''Create a host-wide bandwidth limit.
+
+    Args:
+        path (str):
+            The state file which every process shares. "~" and environment variables are expanded.
+        rate (int):
+            The most bytes per second that the whole host may download.
+        priority (str):
+            The class of this process's downloads. Example: "interactive".
+        priorities (iterable[str], optional):
+            Every class, from the highest priority to the lowest.
+
+    Returns:
+        `Throttle` or NoneType: The limit or nothing, if there is no `rate`.
+
+    '''
+    if not rate or not path:
+        return None
+
+    path = os.path.expandvars(os.path.expanduser(path))
+    directory = os.path.dirname(path)
+
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Another process may have made the folder at the same time
+            if not os.path.isdir(directory):
+                raise
+
+    return Throttle(path, rate, priority, priorities=priorities)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Reuse the blocks of local archives when a similar archive is downloaded.
+
+This works like zsync. The server publishes a "signature" of each archive
+next to it (see `get_signature_url` and `rezzurect.cache_server`). The
+signature lists a weak, rolling checksum and a strong checksum for every
+fixed-size block of the archive.
+
+Before an archive downloads, every local archive which might share content
+with it (an older version or an earlier copy of the same file) is scanned
+with the rolling checksum. Each block which is found is copied into the
+download's ".part" file and recorded as already downloaded. The regular
+resumable downloader (`rezzurect.utils.downloader`) then only fetches the
+byte ranges which weren't found.
+
+The weak checksum is Adler-32, so a whole block is hashed by `zlib` and
+only the one-byte roll between blocks runs in Python. Regions of a local
+file which match nothing are scanned one byte at a time, which is the slow
+part. Regions which match are skipped over a whole block at a time.
+
+So that a scan never costs more than the download it saves, each search
+has a byte and a time budget (`SCAN_BYTE_LIMIT` and `SCAN_TIME_LIMIT`), a
+file is given up on if its first `PROBE_SIZE` bytes hold no weak checksum
+of the signature, and compressed files (gzip, xz, bzip2) are only scanned
+if their first block matches. A compressed stream rarely shares any block
+after its first changed byte.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import hashlib
+import logging
+import json
+import time
+import zlib
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import downloader
+from ..vendors import six
+
+
+_ADLER_MODULUS = 65521
+DEFAULT_BLOCK_SIZE = 64 * 1024
+SCAN_BUFFER_SIZE = 8 * 1024 * 1024
+SCAN_BYTE_LIMIT = 256 * 1024 * 1024
+SCAN_TIME_LIMIT = 60
+PROBE_SIZE = 4 * 1024 * 1024
+_COMPRESSED_MAGICS = (
+    b'\x1f\x8b',  # gzip
+    b'\xfd7zXZ\x00',  # xz
+    b'BZh',  # bzip2
+)
+SIGNATURE_SUFFIX = '.blocks.json'
+LOGGER = logging.getLogger('rezzurect.block_reuse')
+
+
+def _get_weak(data):
+    '''int: The Adler-32 checksum of `data`.'''
+    return zlib.adler32(bytes(data)) & 0xffffffff
+
+
+def _get_strong(data):
+    '''str: The checksum which confirms that two blocks, whose weak checksums match, are equal.'''
+    return hashlib.sha1(bytes(data)).hexdigest()
+
+
+def _roll(weak, outgoing, incoming, block_size):
+    '''Move an Adler-32 checksum forward by one byte.
+
+    Args:
+        weak (int): The checksum of the current block.
+        outgoing (int): The first byte of the current block.
+        incoming (int): The byte just after the current block.
+        block_size (int): The number of bytes in the block.
+
+    Returns:
+        int: The checksum of the block which starts one byte later.
+
+    '''
+    low = weak & 0xffff
+    high = weak >> 16
+    low = (low - outgoing + incoming) % _ADLER_MODULUS
+    high = (high - block_size * outgoing + low - 1) % _ADLER_MODULUS
+
+    return (high << 16) | low
+
+
+def get_signature_url(url):
+    '''str: The address where the server publishes the signature of `url`.'''
+    scheme, netloc, path, query, fragment = six.moves.urllib.parse.urlsplit(url)
+
+    return six.moves.urllib.parse.urlunsplit(
+        (scheme, netloc, path + SIGNATURE_SUFFIX, query, fragment))
+
+
+def make_signature(path, block_size=DEFAULT_BLOCK_SIZE):
+    '''Describe every block of the file at `path`.
+
+    Args:
+        path (str): The absolute path to some archive.
+        block_size (int, optional): The number of bytes in each block.
+
+    Returns:
+        dict[str, int or list[list[int, str]]]:
+            The size of the file, the block size, and the weak and strong
+            checksum of every block. The last block may be shorter than `block_size`.
+
+    '''
+    blocks = []
+
+    with open(path, 'rb') as file_:
+        for block in iter(lambda: file_.read(block_size), b''):
+            blocks.append([_get_weak(block), _get_strong(block)])
+
+    return {'block_size': block_size, 'blocks': blocks, 'size': os.path.getsize(path)}
+
+
+def write_signature(path, block_size=DEFAULT_BLOCK_SIZE):
+    '''Write the signature of `path` next to it, if it's missing or out of date.
+
+    Returns:
+        str: The absolute path to the signature file.
+
+    '''
+    signature_path = path + SIGNATURE_SUFFIX
+
+    if os.path.isfile(signature_path) and \
+            os.path.getmtime(signature_path) >= os.path.getmtime(path):
+        return signature_path
+
+    temporary_path = '{path}.{pid}.tmp'.format(path=signature_path, pid=os.getpid())
+
+    with open(temporary_path, 'w') as file_:
+        json.dump(make_signature(path, block_size=block_size), file_)
+
+    if os.name == 'nt' and os.path.isfile(signature_path):
+        os.remove(signature_path)
+
+    os.rename(temporary_path, signature_path)
+
+    return signature_path
+
+
+def fetch_signature(url, timeout=downloader.DEFAULT_TIMEOUT):
+    '''Download the signature of `url`, if the server publishes one.
+
+    Returns:
+        dict or NoneType: The signature. See `make_signature`.
+
+    '''
+    try:
+        response = six.moves.urllib.request.urlopen(get_signature_url(url), timeout=timeout)
+    except (IOError, OSError, ValueError):  # `URLError` inherits from `IOError`
+        LOGGER.debug('URL "%s" has no block signature.', url)
+        return None
+
+    try:
+        signature = json.loads(response.read().decode('utf-8'))
+    except (IOError, ValueError, six.moves.http_client.HTTPException):
+        LOGGER.warning('The block signature of "%s" could not be read.', url)
+        return None
+    finally:
+        response.close()
+
+    if not isinstance(signature, dict) or not signature.get('block_size'):
+        return None
+
+    return signature
+
+
+def _is_compressed(path):
+    '''bool: Check if the file at `path` is a compressed stream, from its first bytes.'''
+    with open(path, 'rb') as file_:
+        return file_.read(8).startswith(_COMPRESSED_MAGICS)
+
+
+def _is_first_block_equal(path, signature):
+    '''bool: Check if the file at `path` starts with the first block of `signature`.'''
+    if not signature['blocks']:
+        return False
+
+    with open(path, 'rb') as file_:
+        block = file_.read(signature['block_size'])
+
+    weak, strong = signature['blocks'][0]
+
+    return _get_weak(block) == weak and _get_strong(block) == strong
+
+
+def _find_in_file(path, signature, weak_index, matches, byte_limit, deadline):
+    '''Find the blocks of `signature` which appear anywhere in the file at `path`.
+
+    The scan stops early once `byte_limit` bytes were scanned, once
+    `deadline` passes, or if the first `PROBE_SIZE` bytes of the file hold
+    no weak checksum of `signature`.
+
+    Args:
+        path (str): The absolute path to some local file.
+        signature (dict): The blocks to look for. See `make_signature`.
+        weak_index (dict[int, list[int]]): Each weak checksum and its block numbers.
+        matches (dict[int, tuple[str, int]]):
+            Every block which was already found and where it was found. It
+            is updated with the blocks from `path`.
+        byte_limit (int): The most bytes of `path` which may be scanned.
+        deadline (float): The time, in seconds since the epoch, when the scan must stop.
+
+    Returns:
+        int: The number of bytes of `path` which were scanned.
+
+    '''
+    block_size = signature['block_size']
+    blocks = signature['blocks']
+
+    with open(path, 'rb') as file_:
+        buffer_ = bytearray(file_.read(SCAN_BUFFER_SIZE + block_size))
+        buffer_start = 0  # The offset of `buffer_` within the file
+        position = 0  # The start of the current block, within `buffer_`
+        weak = None
+        has_hit = False
+        next_check = block_size  # The offset where the deadline is checked next
+
+        while len(matches) < len(blocks):
+            scanned = buffer_start + position
+
+            if scanned >= next_check:
+                next_check = scanned + block_size
+
+                if not has_hit and scanned >= PROBE_SIZE:
+                    LOGGER.debug('File "%s" has no reusable blocks in its first bytes.', path)
+                    return scanned
+
+                if scanned >= byte_limit or time.time() > deadline:
+                    LOGGER.debug('Scan of "%s" stopped at byte "%s".', path, scanned)
+                    return scanned
+
+            if position + block_size >= len(buffer_):
+                more = file_.read(SCAN_BUFFER_SIZE)
+
+                if more:
+                    buffer_ = buffer_[position:] + bytearray(more)
+                    buffer_start += position
+                    position = 0
+                elif position + block_size > len(buffer_):
+                    return scanned
+
+            if weak is None:
+                weak = _get_weak(buffer_[position:position + block_size])
+
+            found = False
+            strong = ''
+
+            for index in weak_index.get(weak, []):
+                has_hit = True
+
+                if index in matches:
+                    continue
+
+                strong = strong or _get_strong(buffer_[position:position + block_size])
+
+                if blocks[index][1] == strong:
+                    matches[index] = (path, buffer_start + position)
+                    found = True
+
+            if found:
+                position += block_size
+                weak = None
+
+                continue
+
+            if position + block_size >= len(buffer_):
+                # The last possible block of the file was checked
+                return scanned
+
+            weak = _roll(weak, buffer_[position], buffer_[position + block_size], block_size)
+            position += 1
+
+    return buffer_start + position
+
+
+def find_blocks(signature, paths, byte_limit=SCAN_BYTE_LIMIT, time_limit=SCAN_TIME_LIMIT):
+    '''Search local files for the blocks of some remote file.
+
+    Args:
+        signature (dict):
+            The remote file's blocks. See `make_signature`.
+        paths (iterable[str]):
+            The absolute paths to local files which may share blocks.
+        byte_limit (int, optional):
+            The most bytes which may be scanned, across every file in `paths`.
+        time_limit (float, optional):
+            The most seconds which may be spent scanning, across every file in `paths`.
+
+    Returns:
+        dict[int, tuple[str, int]]: Each found block number, the file it was found in, and where.
+
+    '''
+    block_size = signature['block_size']
+    weak_index = dict()
+
+    for index, (weak, _) in enumerate(signature['blocks']):
+        # The last block may be shorter than the rest so only full blocks are searched for
+        if (index + 1) * block_size <= signature['size']:
+            weak_index.setdefault(weak, []).append(index)
+
+    matches = dict()
+    deadline = time.time() + time_limit
+
+    for path in paths:
+        if byte_limit <= 0 or time.time() > deadline:
+            LOGGER.info('The block scan ran out of budget. The rest of the blocks will download.')
+            break
+
+        try:
+            if _is_compressed(path) and not _is_first_block_equal(path, signature):
+                LOGGER.debug('Compressed file "%s" was skipped. Its first block differs.', path)
+                continue
+
+            byte_limit -= _find_in_file(path, signature, weak_index, matches, byte_limit, deadline)
+        except (IOError, OSError):
+            LOGGER.warning('File "%s" could not be scanned for reusable blocks.', path)
+
+    return matches
+
+
+def prepare(url, path, paths, timeout=downloader.DEFAULT_TIMEOUT):
+    '''Seed the partial download of `url` with blocks from local files.
+
+    After this function runs, `rezzurect.utils.downloader.download` only
+    downloads the blocks which weren't found.
+
+    Nothing is done if the server publishes no signature, doesn't support
+    byte ranges, or if `path` already has a partial download to resume.
+
+    Args:
+        url (str): The address of the file which will be downloaded.
+        path (str): The absolute path where the file will be downloaded to.
+        paths (iterable[str]): The absolute paths to local files which may share blocks.
+        timeout (int, optional): The number of seconds before a request gives up.
+
+    Returns:
+        int: The number of bytes which were reused.
+
+    '''
+    paths = [path_ for path_ in paths if os.path.isfile(path_)]
+
+    if not paths or downloader.PartialDownload.load(path, url):
+        return 0
+
+    signature = fetch_signature(url, timeout=timeout)
+
+    if not signature:
+        return 0
+
+    remote = downloader.get_remote_file(url, timeout=timeout)
+
+    if not remote.supports_ranges or remote.size != signature.get('size'):
+        LOGGER.info('URL "%s" does not match its signature. Blocks will not be reused.', url)
+        return 0
+
+    matches = find_blocks(signature, paths)
+
+    if not matches:
+        return 0
+
+    block_size = signature['block_size']
+    state = downloader.PartialDownload(path, remote)
+    state.allocate()
+    reused = 0
+
+    with open(state.get_part_path(path), 'r+b') as part:
+        for index, (source, offset) in sorted(matches.items()):
+            with open(source, 'rb') as file_:
+                file_.seek(offset)
+                data = file_.read(block_size)
+
+            part.seek(index * block_size)
+            part.write(data)
+            state.add(index * block_size, index * block_size + len(data))
+            reused += len(data)
+
+    state.save()
+
+    LOGGER.info(
+        'Reused "%s" of "%s" bytes of "%s" from local files.', reused, remote.size, url)
+
+    return reused
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Verify installer archives against their expected size and sha256 digest.
+
+Hashing a multi-gigabyte archive takes a while so every digest which is
+computed (or which is computed while an archive downloads) is recorded in
+a `VerificationCache`. The cache is keyed on each file's path, size, and
+modification time so a known archive is never hashed twice.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import threading
+import hashlib
+import logging
+import json
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import rezzurect_exceptions
+
+
+_READ_SIZE = 1024 * 1024
+LOGGER = logging.getLogger('rezzurect.checksum')
+
+
+class VerificationCache(object):
+
+    '''A JSON file which remembers the sha256 digest of files on-disk.'''
+
+    def __init__(self, path):
+        '''Create the instance.
+
+        Args:
+            path (str): The absolute path to the JSON file to read from and write to.
+
+        '''
+        super(VerificationCache, self).__init__()
+
+        self._lock = threading.Lock()
+        self.path = path
+
+    @staticmethod
+    def _get_key(path):
+        '''str: The cache's key for `path`.'''
+        return os.path.normcase(os.path.abspath(path))
+
+    def _read(self):
+        '''dict[str, dict[str, str or int or float]]: Every recorded digest.'''
+        try:
+            with open(self.path, 'r') as file_:
+                return json.load(file_)
+        except (IOError, ValueError):
+            return dict()
+
+    def get(self, path):
+        '''Find the recorded digest of `path`, if the file hasn't changed since.
+
+        Returns:
+            str: The sha256 hex digest or an empty string if it's unknown or out of date.
+
+        '''
+        record = self._read().get(self._get_key(path))
+
+        if not record:
+            return ''
+
+        stat = os.stat(path)
+
+        if record.get('size') != stat.st_size or record.get('mtime') != stat.st_mtime:
+            return ''
+
+        return record.get('sha256', '')
+
+    def record(self, path, sha256):
+        '''Remember that the file at `path` has the digest `sha256`.'''
+        stat = os.stat(path)
+
+        with self._lock:
+            records = self._read()
+            records[self._get_key(path)] = {
+                'mtime': stat.st_mtime,
+                'sha256': sha256,
+                'size': stat.st_size,
+            }
+
+            directory = os.path.dirname(self.path)
+
+            try:
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+
+                temporary_path = '{path}.{pid}.tmp'.format(path=self.path, pid=os.getpid())
+
+                with open(temporary_path, 'w') as file_:
+                    json.dump(records, file_)
+
+                if os.name == 'nt' and os.path.isfile(self.path):
+                    os.remove(self.path)
+
+                os.rename(temporary_path, self.path)
+            except (IOError, OSError):
+                # The cache is only an optimization so failing to write it is fine
+                LOGGER.warning('Verification cache "%s" could not be written.', self.path)
+
+
+def get_cache(path):
+    '''`VerificationCache` or NoneType: Create a cache for `path`, if a path was given.'''
+    if not path:
+        return None
+
+    return VerificationCache(os.path.expandvars(os.path.expanduser(path)))
+
+
+def get_file_digest(path, cache=None):
+    '''Get the sha256 hex digest of the file at `path`.
+
+    Args:
+        path (str): The file to hash.
+        cache (`VerificationCache`, optional): If given, used to skip hashing known files.
+
+    Returns:
+        str: The found digest.
+
+    '''
+    if cache:
+        digest = cache.get(path)
+
+        if digest:
+            return digest
+
+    hasher = hashlib.sha256()
+
+    with open(path, 'rb') as file_:
+        for chunk in iter(lambda: file_.read(_READ_SIZE), b''):
+            hasher.update(chunk)
+
+    digest = hasher.hexdigest()
+
+    if cache:
+        cache.record(path, digest)
+
+    return digest
+
+
+def verify(path, size=None, sha256='', digest='', cache=None):
+    '''Check that the file at `path` has the expected size and digest.
+
+    Args:
+        path (str):
+            The file to check.
+        size (int, optional):
+            The expected number of bytes. If not given, the size isn't checked.
+        sha256 (str, optional):
+            The expected sha256 hex digest. If not given, the digest isn't checked.
+        digest (str, optional):
+            The actual digest of `path`, if it's already known (because it
+            was computed while `path` downloaded, for example).
+        cache (`VerificationCache`, optional):
+            If given, used to skip hashing known files.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`: If `path` doesn't match.
+
+    '''
+    if sha256 and not digest:
+        digest = get_file_digest(path, cache=cache)
+
+    verify_digest(path, os.path.getsize(path), digest, size=size, sha256=sha256)
+
+
+def verify_digest(name, actual_size, digest, size=None, sha256=''):
+    '''Check that some already-measured data has the expected size and digest.
+
+    Args:
+        name (str):
+            A path or URL which describes the data, for error messages.
+        actual_size (int):
+            The number of bytes in the data.
+        digest (str):
+            The sha256 hex digest of the data.
+        size (int, optional):
+            The expected number of bytes. If not given, the size isn't checked.
+        sha256 (str, optional):
+            The expected sha256 hex digest. If not given, the digest isn't checked.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`: If the data doesn't match.
+
+    '''
+    if size is not None and actual_size != size:
+        raise rezzurect_exceptions.ChecksumError(
+            '"{name}" is "{actual_size}" bytes but should be "{size}".'
+            ''.format(name=name, actual_size=actual_size, size=size))
+
+    if not sha256:
+        return
+
+    if digest.lower() != sha256.lower():
+        raise rezzurect_exceptions.ChecksumError(
+            '"{name}" has sha256 "{digest}" but should be "{sha256}".'
+            ''.format(name=name, digest=digest, sha256=sha256))
+
+    LOGGER.debug('"%s" matches its expected digest.', name)
@@ -5,21 +5,161 @@
 
 # IMPORT STANDARD LIBRARIES
 import platform
+import tempfile
+import socket
+import ftplib
+import json
+import time
+import os
 
 # IMPORT THIRD-PARTY LIBRARIES
 from six.moves import urllib
 
 
-def is_url_reachable(url):
-    '''bool: If the http/https URL points to a valid address.'''
+_NETWORK_ERRORS = (urllib.error.URLError, socket.error, socket.timeout, ValueError)
+DEFAULT_PROBE_TIMEOUT = 10
+DEFAULT_REACHABLE_TTL = 600
+DEFAULT_UNREACHABLE_TTL = 60
+DEFAULT_REACHABILITY_CACHE = os.path.join(
+    tempfile.gettempdir(), '.rezzurect', 'url_reachability.json')
+
+
+class _HeadRequest(urllib.request.Request):  # pylint: disable=too-few-public-methods
+
+    '''A request which only asks for headers (Python 2 has no `method` argument).'''
+
+    def get_method(self):
+        '''str: The HTTP method of this request.'''
+        return 'HEAD'
+
+
+def _probe_ftp(url, timeout):
+    '''bool: Ask an FTP server for the size of a file, without downloading it.'''
+    parts = urllib.parse.urlsplit(url)
+    connection = ftplib.FTP(timeout=timeout)
+
+    try:
+        connection.connect(parts.hostname, parts.port or ftplib.FTP_PORT)
+        connection.login(parts.username or 'anonymous', parts.password or '')
+        connection.voidcmd('TYPE I')  # Some servers only answer SIZE in binary mode
+
+        return connection.size(urllib.parse.unquote(parts.path)) is not None
+    except ftplib.all_errors:
+        return False
+    finally:
+        connection.close()
+
+
+def _probe_http(url, timeout):
+    '''bool: Ask an HTTP server if `url` exists, without downloading its body.
+
+    HEAD is tried first. Some download servers refuse HEAD requests so, if it
+    fails, a zero-byte Range request is sent instead and closed right away.
+
+    '''
+    try:
+        urllib.request.urlopen(_HeadRequest(url), timeout=timeout).close()
+    except urllib.error.HTTPError as error:
+        if error.code == 404:
+            return False
+    except _NETWORK_ERRORS:
+        return False
+    else:
+        return True
+
+    request = urllib.request.Request(url, headers={'Range': 'bytes=0-0'})
+
     try:
-        urllib.request.urlopen(url)
-    except (urllib.HTTPError, urllib.URLError):
+        urllib.request.urlopen(request, timeout=timeout).close()
+    except _NETWORK_ERRORS:
         return False
 
     return True
 
 
+def _read_reachability_cache(path):
+    '''dict[str, dict[str, bool or float]]: Get every cached probe result.'''
+    try:
+        with open(path, 'r') as file_:
+            return json.load(file_)
+    except (IOError, ValueError):
+        return dict()
+
+
+def _write_reachability_cache(path, url, reachable):
+    '''Add the probe result of `url` to the cache file at `path`.'''
+    directory = os.path.dirname(path)
+
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        results = _read_reachability_cache(path)
+        results[url] = {'reachable': reachable, 'time': time.time()}
+        temporary_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+
+        with open(temporary_path, 'w') as file_:
+            json.dump(results, file_)
+
+        if os.name == 'nt' and os.path.isfile(path):
+            os.remove(path)
+
+        os.rename(temporary_path, path)
+    except (IOError, OSError):
+        # The cache is only an optimization so failing to write it is fine
+        pass
+
+
+def is_url_reachable(
+        url,
+        timeout=DEFAULT_PROBE_TIMEOUT,
+        cache_path=DEFAULT_REACHABILITY_CACHE,
+        reachable_ttl=DEFAULT_REACHABLE_TTL,
+        unreachable_ttl=DEFAULT_UNREACHABLE_TTL,
+):
+    '''Check if the URL points to a valid address, without downloading it.
+
+    Results are cached on-disk so that many processes which check the same
+    URL don't each contact its server. Unreachable URLs are cached for a
+    shorter time than reachable URLs, so that a server which comes back
+    online is noticed quickly.
+
+    Args:
+        url (str):
+            The http/https/ftp address to check.
+        timeout (int, optional):
+            The number of seconds to wait for the server.
+        cache_path (str, optional):
+            The JSON file where results are cached. If empty, nothing is cached.
+        reachable_ttl (int, optional):
+            The number of seconds that a reachable result is trusted.
+        unreachable_ttl (int, optional):
+            The number of seconds that an unreachable result is trusted.
+
+    Returns:
+        bool: If the URL can be downloaded.
+
+    '''
+    if cache_path:
+        result = _read_reachability_cache(cache_path).get(url)
+
+        if result:
+            ttl = reachable_ttl if result.get('reachable') else unreachable_ttl
+
+            if 0 <= time.time() - result.get('time', 0) < ttl:
+                return bool(result.get('reachable'))
+
+    if url.lower().startswith('ftp://'):
+        reachable = _probe_ftp(url, timeout)
+    else:
+        reachable = _probe_http(url, timeout)
+
+    if cache_path:
+        _write_reachability_cache(cache_path, url, reachable)
+
+    return reachable
+
+
 def get_architecture():
     '''int: What the bit architecture of the user's current platform is (32 or 64).'''
     bits, _ = platform.architecture()
@@ -11,37 +11,200 @@ from . import config_helper as _config_helper
 
 __SETTINGS = _config_helper.get_settings()
 
+ARCHIVE_CACHE = __SETTINGS.get('archive_cache', '')
+
+ARCHIVE_DIGESTS = __SETTINGS.get('archive_digests', dict())
+
 AUTO_INSTALLS = __SETTINGS.get('auto_installs', True)
 
+BANDWIDTH_LIMIT = __SETTINGS.get('bandwidth_limit', 0)
+
+BANDWIDTH_PRIORITIES = __SETTINGS.get('bandwidth_priorities', ['interactive', 'farm', 'prefetch'])
+
+BANDWIDTH_PRIORITY = __SETTINGS.get('bandwidth_priority', 'interactive')
+
+BANDWIDTH_STATE = __SETTINGS.get(
+    'bandwidth_state',
+    os.path.join(tempfile.gettempdir(), '.rezzurect', 'bandwidth.json'),
+)
+
+BLOCK_REUSE = __SETTINGS.get('block_reuse', False)
+
 CUSTOM_KEYS = __SETTINGS.get('keys', dict())
 
+DELTA_INSTALL = __SETTINGS.get('delta_install', False)
+
+DOWNLOAD_CONNECTIONS = __SETTINGS.get('download_connections', 4)
+
+DOWNLOAD_CONNECTION_LIMIT = __SETTINGS.get('download_connection_limit', 8)
+
+DOWNLOAD_HOST_CONNECTIONS = __SETTINGS.get('download_host_connections', 4)
+
+DOWNLOAD_PROXY = __SETTINGS.get('download_proxy', '')
+
+FILE_STORE = __SETTINGS.get('file_store', False)
+
+GZIP_INDEX = __SETTINGS.get('gzip_index', False)
+
+GZIP_INDEX_PROCESSES = __SETTINGS.get('gzip_index_processes', 0)
+
+GZIP_INDEX_SPACING = __SETTINGS.get('gzip_index_spacing', 4 * 1024 * 1024)
+
+INSTALL_PROFILE = __SETTINGS.get('install_profile', 'full')
+
+INSTALL_PROFILES = __SETTINGS.get('install_profiles', dict())
+
 INTERNET_DOWNLOADS = __SETTINGS.get('internet_downloads', True)
 
+KEEP_INNER_INSTALLERS = __SETTINGS.get('keep_inner_installers', False)
+
+MIRRORS = __SETTINGS.get('mirrors', [])
+
+REPACK_ARCHIVES = __SETTINGS.get('repack_archives', False)
+
 REZZURECT_LOG_PATH = __SETTINGS.get('rezzurect_log_path', os.path.join(tempfile.gettempdir(), '.rezzurect'))
 
 REZ_PACKAGE_ROOT = _config_helper.get_root_package_folder()
 
+SPOOL_MEMORY_LIMIT = __SETTINGS.get('spool_memory_limit', 512 * 1024 * 1024)
+
+STAGED_INSTALLS = __SETTINGS.get('staged_installs', True)
+
 STRATEGY_ORDERS = __SETTINGS.get('strategy_orders', dict())
 
+STREAM_EXTRACTION = __SETTINGS.get('stream_extraction', False)
+
+URL_REACHABILITY_CACHE = __SETTINGS.get(
+    'url_reachability_cache',
+    os.path.join(tempfile.gettempdir(), '.rezzurect', 'url_reachability.json'),
+)
+
+URL_REACHABLE_TTL = __SETTINGS.get('url_reachable_ttl', 600)
+
+URL_UNREACHABLE_TTL = __SETTINGS.get('url_unreachable_ttl', 60)
+
+VERIFICATION_CACHE = __SETTINGS.get(
+    'verification_cache',
+    os.path.join(tempfile.gettempdir(), '.rezzurect', 'verified_archives.json'),
+)
+
+ZIP_EXTRACTION_PROCESSES = __SETTINGS.get('zip_extraction_processes', 0)
+
 
 def recalculate():
+    global ARCHIVE_CACHE
+    global ARCHIVE_DIGESTS
     global AUTO_INSTALLS
+    global BANDWIDTH_LIMIT
+    global BANDWIDTH_PRIORITIES
+    global BANDWIDTH_PRIORITY
+    global BANDWIDTH_STATE
+    global BLOCK_REUSE
     global CUSTOM_KEYS
+    global DELTA_INSTALL
+    global DOWNLOAD_CONNECTIONS
+    global DOWNLOAD_CONNECTION_LIMIT
+    global DOWNLOAD_HOST_CONNECTIONS
+    global DOWNLOAD_PROXY
+    global FILE_STORE
+    global GZIP_INDEX
+    global GZIP_INDEX_PROCESSES
+    global GZIP_INDEX_SPACING
+    global INSTALL_PROFILE
+    global INSTALL_PROFILES
     global INTERNET_DOWNLOADS
+    global KEEP_INNER_INSTALLERS
+    global MIRRORS
+    global REPACK_ARCHIVES
     global REZZURECT_LOG_PATH
     global REZ_PACKAGE_ROOT
+    global SPOOL_MEMORY_LIMIT
+    global STAGED_INSTALLS
     global STRATEGY_ORDERS
+    global STREAM_EXTRACTION
+    global URL_REACHABILITY_CACHE
+    global URL_REACHABLE_TTL
+    global URL_UNREACHABLE_TTL
+    global VERIFICATION_CACHE
+    global ZIP_EXTRACTION_PROCESSES
 
     settings = _config_helper.get_settings()
 
+    ARCHIVE_CACHE = settings.get('archive_cache', '')
+
+    ARCHIVE_DIGESTS = settings.get('archive_digests', dict())
+
     AUTO_INSTALLS = settings.get('auto_installs', True)
 
+    BANDWIDTH_LIMIT = settings.get('bandwidth_limit', 0)
+
+    BANDWIDTH_PRIORITIES = settings.get('bandwidth_priorities', ['interactive', 'farm', 'prefetch'])
+
+    BANDWIDTH_PRIORITY = settings.get('bandwidth_priority', 'interactive')
+
+    BANDWIDTH_STATE = settings.get(
+        'bandwidth_state',
+        os.path.join(tempfile.gettempdir(), '.rezzurect', 'bandwidth.json'),
+    )
+
+    BLOCK_REUSE = settings.get('block_reuse', False)
+
     CUSTOM_KEYS = settings.get('keys', dict())
 
+    DELTA_INSTALL = settings.get('delta_install', False)
+
+    DOWNLOAD_CONNECTIONS = settings.get('download_connections', 4)
+
+    DOWNLOAD_CONNECTION_LIMIT = settings.get('download_connection_limit', 8)
+
+    DOWNLOAD_HOST_CONNECTIONS = settings.get('download_host_connections', 4)
+
+    DOWNLOAD_PROXY = settings.get('download_proxy', '')
+
+    FILE_STORE = settings.get('file_store', False)
+
+    GZIP_INDEX = settings.get('gzip_index', False)
+
+    GZIP_INDEX_PROCESSES = settings.get('gzip_index_processes', 0)
+
+    GZIP_INDEX_SPACING = settings.get('gzip_index_spacing', 4 * 1024 * 1024)
+
+    INSTALL_PROFILE = settings.get('install_profile', 'full')
+
+    INSTALL_PROFILES = settings.get('install_profiles', dict())
+
     INTERNET_DOWNLOADS = settings.get('internet_downloads', True)
 
+    KEEP_INNER_INSTALLERS = settings.get('keep_inner_installers', False)
+
+    MIRRORS = settings.get('mirrors', [])
+
+    REPACK_ARCHIVES = settings.get('repack_archives', False)
+
     REZZURECT_LOG_PATH = settings.get('rezzurect_log_path', os.path.join(tempfile.gettempdir(), '.rezzurect'))
 
     REZ_PACKAGE_ROOT = _config_helper.get_root_package_folder()
 
+    SPOOL_MEMORY_LIMIT = settings.get('spool_memory_limit', 512 * 1024 * 1024)
+
+    STAGED_INSTALLS = settings.get('staged_installs', True)
+
     STRATEGY_ORDERS = settings.get('strategy_orders', dict())
+
+    STREAM_EXTRACTION = settings.get('stream_extraction', False)
+
+    URL_REACHABILITY_CACHE = settings.get(
+        'url_reachability_cache',
+        os.path.join(tempfile.gettempdir(), '.rezzurect', 'url_reachability.json'),
+    )
+
+    URL_REACHABLE_TTL = settings.get('url_reachable_ttl', 600)
+
+    URL_UNREACHABLE_TTL = settings.get('url_unreachable_ttl', 60)
+
+    VERIFICATION_CACHE = settings.get(
+        'verification_cache',
+        os.path.join(tempfile.gettempdir(), '.rezzurect', 'verified_archives.json'),
+    )
+
+    ZIP_EXTRACTION_PROCESSES = settings.get('zip_extraction_processes', 0)
@@ -127,6 +127,9 @@ def get_environment_variables():
     if 'REZZURECT_STRATEGY_ORDERS' in os.environ:
         output['strategy_orders'] = {'*': os.environ['REZZURECT_STRATEGY_ORDERS'].split(',')}
 
+    if 'RESPAWN_INSTALL_PROFILE' in os.environ:
+        output['install_profile'] = os.environ['RESPAWN_INSTALL_PROFILE']
+
     if 'RESPAWN_REZ_PACKAGE_ROOT' in os.environ:
         output['rez_package_root'] = os.environ['RESPAWN_REZ_PACKAGE_ROOT']
 
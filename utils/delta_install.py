@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Install a new version of a package by reusing the files of an installed sibling.
+
+Every install which is extracted from a ZIP or TAR archive writes a manifest
+of its files next to its install record. The details of each file are
+copied out of the archive, so making the manifest costs nothing extra. A ZIP
+archive's central directory gives each file's size, CRC-32 and Unix
+permissions. A TAR archive has no checksums so its headers give each file's
+size, permissions and modification time ("modified").
+
+    {"Nuke11.2": {"crc": 2418236744, "mode": 493, "mtime": 1537217563, "size": 5184}, ...}
+    {"bin/hython": {"mode": 493, "modified": 1539990427, "mtime": 1539990427, "size": 9216}, ...}
+
+When the "delta_install" setting is on and another version of the same
+package is already installed beside the new one, the new archive's details
+are compared to that sibling's manifest. Files whose details are all
+unchanged are copied from the sibling with `rezzurect.utils.archive_cache.link`
+(a reflink, if the file system supports it, or else a hardlink) instead of
+being written. A ZIP archive's changed files are the only ones which are
+inflated. A TAR archive is still read front to back, but its unchanged
+files are never written, which is most of an install's time on a network
+file system.
+
+Hardlinked files share one inode, the same as files in
+`rezzurect.utils.file_store`, so install folders must never be written into
+in-place. A sibling file is only reused if its size and modification time
+still match its manifest.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import logging
+import json
+import stat
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import install_metadata
+from . import archive_cache
+
+
+MANIFEST_NAME = '.rezzurect_manifest.json'
+LOGGER = logging.getLogger('rezzurect.delta_install')
+
+
+def _get_path(root, name):
+    '''str: The absolute path of the manifest entry, `name`, inside of the `root` folder.'''
+    return os.path.join(root, *name.split('/'))
+
+
+def get_manifest_path(install):
+    '''str: The manifest file of the install folder, `install`.'''
+    return os.path.join(install, MANIFEST_NAME)
+
+
+def read_manifest(install):
+    '''dict[str, dict[str, int]]: Every file in the manifest of the install folder, `install`.'''
+    try:
+        with open(get_manifest_path(install), 'r') as file_:
+            return json.load(file_)
+    except (IOError, ValueError):
+        return dict()
+
+
+def write_manifest(install, entries):
+    '''Record the files which were just installed into `install`.
+
+    Entries whose file wasn't installed (because an install profile skipped it,
+    for example) are left out.
+
+    Args:
+        install (str):
+            The absolute path to some package's install folder.
+        entries (dict[str, dict[str, int]]):
+            The relative path of every file, using "/" separators, and its
+            details from the archive. See `link_file`.
+
+    '''
+    manifest = dict()
+
+    for name, entry in entries.items():
+        try:
+            details = os.lstat(_get_path(install, name))
+        except OSError:
+            continue
+
+        if stat.S_ISREG(details.st_mode):
+            manifest[name] = dict(entry, mtime=int(details.st_mtime))
+
+    path = get_manifest_path(install)
+    temporary_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+
+    with open(temporary_path, 'w') as file_:
+        json.dump(manifest, file_, sort_keys=True)
+
+    if os.name == 'nt' and os.path.isfile(path):
+        os.remove(path)
+
+    os.rename(temporary_path, path)
+
+    LOGGER.debug('Wrote a manifest of "%s" files into "%s".', len(manifest), install)
+
+
+def find_sibling(install, package, version):
+    '''Find another installed version of a package which has a manifest.
+
+    Siblings are found by swapping `version` in `install` for every other
+    folder name beside it. So variants, such as
+    ".../nuke_installation/11.2v4/platform-linux", are compared to the same
+    variant of each sibling.
+
+    Args:
+        install (str): The absolute path to the new install folder.
+        package (str): The name of the package. Example: "nuke".
+        version (str): The version which is being installed. Example: "11.2v4".
+
+    Returns:
+        str: The install folder of the most recently installed sibling, or "" if there is none.
+
+    '''
+    parts = os.path.normpath(install).split(os.sep)
+
+    if version in parts:
+        index = len(parts) - parts[::-1].index(version) - 1
+        parent = os.sep.join(parts[:index]) or os.sep
+        tail = parts[index + 1:]
+    else:
+        parent = os.path.dirname(os.path.normpath(install))
+        tail = []
+
+    try:
+        names = os.listdir(parent)
+    except OSError:
+        return ''
+
+    siblings = []
+
+    for name in names:
+        if name.startswith('.'):
+            continue  # Staged, retired, or otherwise hidden folders are never siblings
+
+        folder = os.path.join(parent, name, *tail)
+
+        if os.path.normpath(folder) == os.path.normpath(install):
+            continue
+
+        record = install_metadata.read(folder)
+
+        if record.get('package') != package or record.get('version') == version:
+            continue
+
+        manifest = get_manifest_path(folder)
+
+        if os.path.isfile(manifest):
+            siblings.append((os.path.getmtime(manifest), folder))
+
+    if not siblings:
+        return ''
+
+    return max(siblings)[1]
+
+
+def link_file(name, entry, manifest, sibling, destination):
+    '''Link one file from the `sibling` install, if it's unchanged.
+
+    Args:
+        name (str):
+            The relative path of the file, using "/" separators.
+        entry (dict[str, int]):
+            The details of the file which is about to be installed. Either
+            "crc", "mode" and "size" (ZIP) or "mode", "modified" and "size" (TAR).
+        manifest (dict[str, dict[str, int]]):
+            The manifest of `sibling`. See `read_manifest`.
+        sibling (str):
+            The absolute path to an installed version of the same package.
+        destination (str):
+            The absolute path to the folder which `name` is installed into.
+
+    Returns:
+        bool: If the file was linked and doesn't need to be extracted.
+
+    '''
+    previous = manifest.get(name)
+
+    if not entry['size'] or not previous:
+        return False
+
+    # A sibling which was installed from another kind of archive has other keys and never matches
+    if any(previous.get(key) != value for key, value in entry.items()):
+        return False
+
+    source = _get_path(sibling, name)
+
+    try:
+        details = os.lstat(source)
+    except OSError:
+        return False
+
+    # Anything that was changed since the sibling was installed isn't trusted
+    if details.st_size != entry['size'] or int(details.st_mtime) != previous.get('mtime'):
+        return False
+
+    target = _get_path(destination, name)
+    parent = os.path.dirname(target)
+
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+
+    if os.path.islink(target) or os.path.isfile(target):
+        os.remove(target)
+
+    archive_cache.link(source, target)
+
+    if entry['mode']:
+        os.chmod(target, entry['mode'])  # A reflink is a new file, with default permissions
+
+    return True
+
+
+def link_unchanged(entries, sibling, destination):
+    '''Link every file which is unchanged since the `sibling` install.
+
+    Args:
+        entries (dict[str, dict[str, int]]):
+            The relative path of every file which is about to be installed,
+            using "/" separators, and its details. See `link_file`.
+        sibling (str):
+            The absolute path to an installed version of the same package.
+        destination (str):
+            The absolute path to the folder which `entries` are installed into.
+
+    Returns:
+        set[str]: The names in `entries` which were linked and don't need to be extracted.
+
+    '''
+    manifest = read_manifest(sibling)
+    linked = set(
+        name for name, entry in entries.items()
+        if link_file(name, entry, manifest, sibling, destination)
+    )
+
+    LOGGER.info('Linked "%s" of "%s" files from "%s".', len(linked), len(entries), sibling)
+
+    return linked
@@ -0,0 +1,900 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''A download engine which fetches a file over several connections at once.
+
+The remote file is split into HTTP Range segments. Each segment is downloaded
+by a pool of threads and written directly into its place in a preallocated
+"{path}.part" file.
+
+While the download runs, a "{path}.part.json" sidecar file records the
+server's ETag / Last-Modified headers and every byte range which has been
+written so far. If the download is interrupted, the next call to `download`
+reads the sidecar, checks that the file on the server hasn't changed, and only
+downloads the missing ranges. Once every byte arrives, the ".part" file is
+renamed to `path`.
+
+The file's sha256 digest is computed while it downloads, so that it can be
+verified without reading the whole file a second time.
+
+If the server doesn't report a file size or doesn't support byte ranges
+(FTP servers, for example), the file is downloaded using a single stream
+and cannot be resumed.
+
+Several downloads can share a `ConnectionLimiter` so that, together, they
+never open more than some number of connections (in total and per host).
+They can also share a `rezzurect.utils.bandwidth.Throttle`, which limits
+how many bytes per second every process on the host downloads.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+from __future__ import division
+import contextlib
+import threading
+import hashlib
+import logging
+import json
+import re
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import rezzurect_exceptions
+from ..vendors import six
+
+
+_CONTENT_RANGE_EXPRESSION = re.compile(
+    r'bytes\s+(?P<start>\d+)-(?P<end>\d+)/(?P<total>\d+|\*)')
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_CONNECTIONS = 4
+DEFAULT_TIMEOUT = 30
+MINIMUM_SEGMENT_SIZE = 8 * 1024 * 1024
+SAVE_INTERVAL = 16 * 1024 * 1024
+LOGGER = logging.getLogger('rezzurect.downloader')
+
+
+class RemoteFile(object):  # pylint: disable=too-few-public-methods
+
+    '''A description of some file on a remote server.
+
+    Attributes:
+        url (str): The address of the file.
+        size (int or NoneType): The number of bytes in the file, if known.
+        supports_ranges (bool): If the server accepts "Range" requests.
+        etag (str): The "ETag" header of the file, if any.
+        last_modified (str): The "Last-Modified" header of the file, if any.
+        sha256 (str): The digest of the file, once it has been downloaded.
+
+    '''
+
+    def __init__(self, url, size=None, supports_ranges=False, etag='', last_modified=''):
+        '''Create the instance and store the server's response details.'''
+        super(RemoteFile, self).__init__()
+
+        self.url = url
+        self.size = size
+        self.supports_ranges = supports_ranges
+        self.etag = etag
+        self.last_modified = last_modified
+        self.sha256 = ''
+
+    def get_validator(self):
+        '''Find the value which can be sent as an "If-Range" header.
+
+        Weak ETags are not allowed in "If-Range" so they're skipped.
+
+        Returns:
+            str: The strong ETag or Last-Modified date, if any.
+
+        '''
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+
+        return self.last_modified
+
+
+class ConnectionLimiter(object):
+
+    '''A thread-safe cap on the number of connections which are open at once.
+
+    Attributes:
+        total (int or NoneType): The most connections allowed to every host combined.
+        per_host (int or NoneType): The most connections allowed to any one host.
+
+    '''
+
+    def __init__(self, total=None, per_host=None):
+        '''Create the instance.
+
+        Args:
+            total (int, optional): The most connections allowed at once. Default: no limit.
+            per_host (int, optional): The most connections allowed to one host. Default: no limit.
+
+        '''
+        super(ConnectionLimiter, self).__init__()
+
+        self._condition = threading.Condition()
+        self._hosts = dict()
+        self._open = 0
+        self.total = total
+        self.per_host = per_host
+
+    @staticmethod
+    def _get_host(url):
+        '''str: The part of `url` which is limited by `per_host`.'''
+        return six.moves.urllib.parse.urlsplit(url).netloc.lower()
+
+    def _is_full(self, host):
+        '''bool: Check if a connection to `host` must wait. The caller must hold the lock.'''
+        if self.total and self._open >= self.total:
+            return True
+
+        return bool(self.per_host) and self._hosts.get(host, 0) >= self.per_host
+
+    def acquire(self, url):
+        '''Wait until a connection to `url` is allowed and then claim it.'''
+        host = self._get_host(url)
+
+        with self._condition:
+            while self._is_full(host):
+                self._condition.wait(1)
+
+            self._open += 1
+            self._hosts[host] = self._hosts.get(host, 0) + 1
+
+    def release(self, url):
+        '''Give back a connection which was claimed by `acquire`.'''
+        host = self._get_host(url)
+
+        with self._condition:
+            self._open -= 1
+            self._hosts[host] -= 1
+
+            if not self._hosts[host]:
+                del self._hosts[host]
+
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def hold(self, url):
+        '''Claim a connection to `url` for as long as the context is open.'''
+        self.acquire(url)
+
+        try:
+            yield
+        finally:
+            self.release(url)
+
+
+_UNLIMITED = ConnectionLimiter()
+
+
+class PartialDownload(object):
+
+    '''The on-disk state of a download which has not finished yet.
+
+    Attributes:
+        path (str): The final location of the downloaded file.
+        remote (`RemoteFile`): The file which is being downloaded.
+        ranges (list[list[int, int]]):
+            Every completed byte range, sorted. Each range's end is exclusive.
+
+    '''
+
+    def __init__(self, path, remote, ranges=None):
+        '''Create the instance.
+
+        Args:
+            path (str): The final location of the downloaded file.
+            remote (`RemoteFile`): The file which is being downloaded.
+            ranges (list[list[int, int]], optional): The byte ranges which are already written.
+
+        '''
+        super(PartialDownload, self).__init__()
+
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.path = path
+        self.remote = remote
+        self.ranges = ranges or []
+
+    @staticmethod
+    def get_part_path(path):
+        '''str: The location of the incomplete data for `path`.'''
+        return path + '.part'
+
+    @classmethod
+    def get_state_path(cls, path):
+        '''str: The location of the sidecar file for `path`.'''
+        return cls.get_part_path(path) + '.json'
+
+    @classmethod
+    def load(cls, path, url):
+        '''Read the partial download of `path`, if there is one.
+
+        Args:
+            path (str): The final location of the downloaded file.
+            url (str): The address that `path` is being downloaded from.
+
+        Returns:
+            `PartialDownload` or NoneType: The found state, if any.
+
+        '''
+        state_path = cls.get_state_path(path)
+
+        if not os.path.isfile(state_path) or not os.path.isfile(cls.get_part_path(path)):
+            return None
+
+        try:
+            with open(state_path, 'r') as file_:
+                data = json.load(file_)
+        except (IOError, ValueError):
+            LOGGER.warning('Partial download state "%s" could not be read.', state_path)
+            return None
+
+        remote = RemoteFile(
+            url,
+            size=data.get('size'),
+            supports_ranges=True,
+            etag=data.get('etag', ''),
+            last_modified=data.get('last_modified', ''),
+        )
+
+        return cls(path, remote, ranges=data.get('ranges', []))
+
+    def add(self, start, end):
+        '''Record that the bytes from `start` to `end` (exclusive) are written.'''
+        with self._lock:
+            self.ranges.append([start, end])
+            self.ranges = _merge_ranges(self.ranges)
+            self._unsaved += end - start
+
+            if self._unsaved < SAVE_INTERVAL:
+                return
+
+            self._unsaved = 0
+            self._write()
+
+    def allocate(self):
+        '''Create an empty ".part" file which is as big as the remote file.'''
+        with open(self.get_part_path(self.path), 'wb') as file_:
+            file_.truncate(self.remote.size)
+
+        self.save()
+
+    def commit(self):
+        '''Move the finished ".part" file to its final location.'''
+        _replace(self.get_part_path(self.path), self.path)
+        _remove(self.get_state_path(self.path))
+
+    def discard(self):
+        '''Delete all of the files for this partial download.'''
+        _remove(self.get_part_path(self.path))
+        _remove(self.get_state_path(self.path))
+
+    def get_prefix_end(self):
+        '''int: The first byte which isn't part of the completed range that starts at zero.'''
+        ranges = self.ranges
+
+        if ranges and ranges[0][0] == 0:
+            return ranges[0][1]
+
+        return 0
+
+    def get_completed_size(self):
+        '''int: The number of bytes which are already written.'''
+        return sum(end - start for start, end in self.ranges)
+
+    def get_missing_ranges(self):
+        '''list[tuple[int, int]]: Every byte range which still must be downloaded.'''
+        missing = []
+        position = 0
+
+        for start, end in self.ranges:
+            if start > position:
+                missing.append((position, start))
+
+            position = max(position, end)
+
+        if position < self.remote.size:
+            missing.append((position, self.remote.size))
+
+        return missing
+
+    def is_valid_for(self, remote):
+        '''Check if this partial download can be continued using `remote`.
+
+        Partial downloads with no validators are rejected because there's no
+        way to tell if the file on the server changed since they were written.
+
+        Args:
+            remote (`RemoteFile`): The latest information from the server.
+
+        Returns:
+            bool: If the partial download matches the file on the server.
+
+        '''
+        if self.remote.size != remote.size:
+            return False
+
+        if not self.remote.etag and not self.remote.last_modified:
+            return False
+
+        return self.remote.etag == remote.etag \
+            and self.remote.last_modified == remote.last_modified
+
+    def save(self):
+        '''Write this state to its sidecar file.'''
+        with self._lock:
+            self._unsaved = 0
+            self._write()
+
+    def _write(self):
+        '''Write the sidecar file. The caller must hold the lock.'''
+        state_path = self.get_state_path(self.path)
+        temporary_path = state_path + '.tmp'
+
+        with open(temporary_path, 'w') as file_:
+            json.dump(
+                {
+                    'url': self.remote.url,
+                    'size': self.remote.size,
+                    'etag': self.remote.etag,
+                    'last_modified': self.remote.last_modified,
+                    'ranges': self.ranges,
+                },
+                file_,
+            )
+
+        _replace(temporary_path, state_path)
+
+
+class _PrefixHasher(object):
+
+    '''Compute the sha256 of a file whose bytes may be written out of order.
+
+    Bytes which arrive at the end of the hashed prefix are hashed right away.
+    Bytes which arrive further ahead are read back from the file once the
+    prefix reaches them, which is usually while they're still in the
+    operating system's file cache.
+
+    '''
+
+    def __init__(self, path):
+        '''Create the instance.
+
+        Args:
+            path (str): The file which is being written.
+
+        '''
+        super(_PrefixHasher, self).__init__()
+
+        self._lock = threading.Lock()
+        self._hasher = hashlib.sha256()
+        self.path = path
+        self.position = 0
+
+    def _read_until(self, end):
+        '''Hash the file from the current position to `end`. The caller must hold the lock.'''
+        if self.position >= end:
+            return
+
+        with open(self.path, 'rb') as file_:
+            file_.seek(self.position)
+
+            while self.position < end:
+                chunk = file_.read(min(CHUNK_SIZE, end - self.position))
+
+                if not chunk:
+                    break
+
+                self._hasher.update(chunk)
+                self.position += len(chunk)
+
+    def catch_up(self, end):
+        '''Hash up to `end` unless another thread is already doing it.'''
+        if not self._lock.acquire(False):
+            return
+
+        try:
+            self._read_until(end)
+        finally:
+            self._lock.release()
+
+    def get_digest(self, size):
+        '''str: Hash whatever is left of the first `size` bytes and get the hex digest.'''
+        with self._lock:
+            self._read_until(size)
+
+            return self._hasher.hexdigest()
+
+    def update(self, offset, data):
+        '''Hash `data` if it was written at the end of the hashed prefix.'''
+        with self._lock:
+            if offset == self.position:
+                self._hasher.update(data)
+                self.position += len(data)
+
+
+class _Progress(object):  # pylint: disable=too-few-public-methods
+
+    '''A thread-safe byte counter which forwards its total to a report hook.'''
+
+    def __init__(self, total, reporthook=None, completed=0):
+        '''Create the instance.
+
+        Args:
+            total (int or NoneType): The expected number of bytes, if known.
+            reporthook (callable[int, int, int], optional):
+                A function which takes the number of downloaded bytes, the
+                size of each block, and the total size.
+            completed (int, optional): The bytes that are already downloaded.
+
+        '''
+        super(_Progress, self).__init__()
+
+        self._lock = threading.Lock()
+        self._reporthook = reporthook
+        self.completed = completed
+        self.total = total
+
+    def add(self, count):
+        '''Add `count` bytes to the progress and report it.'''
+        with self._lock:
+            self.completed += count
+            completed = self.completed
+
+        if self._reporthook and self.total:
+            self._reporthook(completed, 1, self.total)
+
+
+def _merge_ranges(ranges):
+    '''list[list[int, int]]: Combine every overlapping or touching range.'''
+    merged = []
+
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return merged
+
+
+def _remove(path):
+    '''Delete `path` if it exists.'''
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def _replace(source, destination):
+    '''Rename `source` to `destination`, overwriting `destination` if needed.'''
+    # Note: Python 2 has no `os.replace` and Windows won't rename onto an existing file
+    _remove(destination)
+    os.rename(source, destination)
+
+
+def _is_http(url):
+    '''bool: Check if `url` is an address which can accept HTTP headers.'''
+    return url.lower().startswith(('http://', 'https://'))
+
+
+def _get_header(response, name):
+    '''str: Get a header from some urllib response, if it exists.'''
+    return response.info().get(name, '') or ''
+
+
+def _open(url, headers=None, timeout=DEFAULT_TIMEOUT):
+    '''Open `url` with the given extra HTTP headers.'''
+    request = six.moves.urllib.request.Request(url, headers=headers or dict())
+
+    return six.moves.urllib.request.urlopen(request, timeout=timeout)
+
+
+def _copy_response(response, file_, callback, limit=None, throttle=None):
+    '''Write the contents of `response` into an open file.
+
+    Args:
+        response (file-like): Some urllib response to read from.
+        file_ (file-like): An open, writable file which is already at the right position.
+        callback (callable[bytes]): A function which is given every written chunk.
+        limit (int, optional): The maximum number of bytes to copy.
+        throttle (`rezzurect.utils.bandwidth.Throttle`, optional): A bandwidth limit.
+
+    Returns:
+        int: The number of bytes that were copied.
+
+    '''
+    copied = 0
+
+    while limit is None or copied < limit:
+        size = CHUNK_SIZE
+
+        if limit is not None:
+            size = min(size, limit - copied)
+
+        chunk = response.read(size)
+
+        if not chunk:
+            break
+
+        if throttle:
+            throttle.consume(len(chunk))
+
+        file_.write(chunk)
+        file_.flush()
+        copied += len(chunk)
+        callback(chunk)
+
+    return copied
+
+
+def get_remote_file(url, timeout=DEFAULT_TIMEOUT, limiter=None):
+    '''Ask the server for the size of `url` and if it supports byte ranges.
+
+    A one-byte Range request is sent instead of a HEAD request because some
+    download servers only report "Content-Range" for ranged GET requests.
+
+    Args:
+        url (str): The address to check.
+        timeout (int, optional): The number of seconds before the request gives up.
+        limiter (`ConnectionLimiter`, optional): A cap on the number of open connections.
+
+    Returns:
+        `RemoteFile`: The description of the file.
+
+    '''
+    if not _is_http(url):
+        return RemoteFile(url)
+
+    with (limiter or _UNLIMITED).hold(url):
+        return _get_remote_file(url, timeout)
+
+
+def _get_remote_file(url, timeout):
+    '''`RemoteFile`: Send the request for `get_remote_file`.'''
+    response = _open(url, headers={'Range': 'bytes=0-0'}, timeout=timeout)
+
+    try:
+        etag = _get_header(response, 'ETag')
+        last_modified = _get_header(response, 'Last-Modified')
+        match = _CONTENT_RANGE_EXPRESSION.match(_get_header(response, 'Content-Range'))
+
+        if response.getcode() == 206 and match and match.group('total') != '*':
+            return RemoteFile(
+                response.geturl(),
+                size=int(match.group('total')),
+                supports_ranges=True,
+                etag=etag,
+                last_modified=last_modified,
+            )
+
+        # A 206's Content-Length is the size of the range, not of the file
+        length = _get_header(response, 'Content-Length') if response.getcode() != 206 else ''
+
+        return RemoteFile(
+            response.geturl(),
+            size=int(length) if length.isdigit() else None,
+            etag=etag,
+            last_modified=last_modified,
+        )
+    finally:
+        response.close()
+
+
+def split_segments(size, connections, minimum=MINIMUM_SEGMENT_SIZE):
+    '''Divide `size` bytes into evenly-sized, inclusive byte ranges.
+
+    Args:
+        size (int): The total number of bytes to split.
+        connections (int): The maximum number of segments to make.
+        minimum (int, optional): The smallest number of bytes that a segment may have.
+
+    Returns:
+        list[tuple[int, int]]: The first and last byte of every segment.
+
+    '''
+    if size <= 0:
+        return []
+
+    count = max(1, min(connections, size // max(minimum, 1)))
+    step = -(-size // count)  # Ceiling division
+
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+def plan_segments(missing, connections, minimum=MINIMUM_SEGMENT_SIZE):
+    '''Split every missing byte range into segments which can be downloaded.
+
+    Args:
+        missing (list[tuple[int, int]]): Byte ranges whose ends are exclusive.
+        connections (int): The number of simultaneous connections that will be used.
+        minimum (int, optional): The smallest number of bytes that a segment may have.
+
+    Returns:
+        list[tuple[int, int]]: The first and last byte of every segment.
+
+    '''
+    total = sum(end - start for start, end in missing)
+    segments = []
+
+    for start, end in missing:
+        size = end - start
+        share = max(1, int(round(connections * size / total))) if total else 1
+
+        segments.extend(
+            (start + first, start + last)
+            for first, last in split_segments(size, share, minimum=minimum)
+        )
+
+    return segments
+
+
+def download_segment(remote, path, start, end, callback, timeout=DEFAULT_TIMEOUT, limiter=None,
+                     throttle=None):
+    '''Download the bytes from `start` to `end` (inclusive) into `path`.
+
+    Args:
+        remote (`RemoteFile`): The file to download from.
+        path (str): The preallocated file to write into.
+        start (int): The first byte to download.
+        end (int): The last byte to download.
+        callback (callable[int, bytes]):
+            A function which is given the offset and data of every written chunk.
+        timeout (int, optional): The number of seconds before the request gives up.
+        limiter (`ConnectionLimiter`, optional): A cap on the number of open connections.
+        throttle (`rezzurect.utils.bandwidth.Throttle`, optional): A bandwidth limit.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.StaleDownloadError`:
+            If the file on the server changed.
+        RuntimeError: If the server ignored the range or sent too few bytes.
+
+    '''
+    headers = {'Range': 'bytes={start}-{end}'.format(start=start, end=end)}
+    validator = remote.get_validator()
+
+    if validator:
+        headers['If-Range'] = validator
+
+    position = [start]
+
+    def _record(chunk):
+        callback(position[0], chunk)
+        position[0] += len(chunk)
+
+    with (limiter or _UNLIMITED).hold(remote.url):
+        response = _open(remote.url, headers=headers, timeout=timeout)
+
+        try:
+            match = _CONTENT_RANGE_EXPRESSION.match(_get_header(response, 'Content-Range'))
+
+            if response.getcode() == 200 and validator:
+                raise rezzurect_exceptions.StaleDownloadError(
+                    'File "{remote.url}" changed on the server.'.format(remote=remote))
+
+            if response.getcode() != 206 or not match or int(match.group('start')) != start:
+                raise RuntimeError(
+                    'Server did not honor range "{start}-{end}" for "{remote.url}".'
+                    ''.format(start=start, end=end, remote=remote))
+
+            expected = end - start + 1
+
+            with open(path, 'r+b') as file_:
+                file_.seek(start)
+                copied = _copy_response(
+                    response, file_, _record, limit=expected, throttle=throttle)
+        finally:
+            response.close()
+
+    if copied != expected:
+        raise RuntimeError('Download was interrupted')
+
+
+def download_stream(url, path, progress, timeout=DEFAULT_TIMEOUT, limiter=None, throttle=None):
+    '''Download `url` into `path` using one connection.
+
+    Raises:
+        RuntimeError: If fewer bytes arrived than the server said it would send.
+
+    Returns:
+        str: The sha256 hex digest of the downloaded file.
+
+    '''
+    hasher = hashlib.sha256()
+
+    def _record(chunk):
+        hasher.update(chunk)
+        progress.add(len(chunk))
+
+    with (limiter or _UNLIMITED).hold(url):
+        response = _open(url, timeout=timeout)
+
+        try:
+            with open(path, 'wb') as file_:
+                copied = _copy_response(response, file_, _record, throttle=throttle)
+        finally:
+            response.close()
+
+    if progress.total is not None and copied != progress.total:
+        raise RuntimeError('Download was interrupted')
+
+    return hasher.hexdigest()
+
+
+def _download_segments(state, segments, connections, progress, hasher, timeout, limiter,
+                       throttle):
+    '''Download every segment using a pool of threads and wait for them to finish.
+
+    Args:
+        state (`PartialDownload`): The download to write into.
+        segments (list[tuple[int, int]]): The inclusive byte ranges to download.
+        connections (int): The number of threads to download with.
+        progress (`_Progress`): The object which records every written byte.
+        hasher (`_PrefixHasher`): The object which hashes the written bytes.
+        timeout (int): The number of seconds before a request gives up.
+        limiter (`ConnectionLimiter` or NoneType): A cap on the number of open connections.
+        throttle (`rezzurect.utils.bandwidth.Throttle` or NoneType): A bandwidth limit.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.StaleDownloadError`:
+            If the file on the server changed.
+        RuntimeError: If any segment failed to download.
+
+    '''
+    queue = six.moves.queue.Queue()
+    errors = []
+    part_path = state.get_part_path(state.path)
+
+    for segment in segments:
+        queue.put(segment)
+
+    def _record(offset, chunk):
+        state.add(offset, offset + len(chunk))
+        hasher.update(offset, chunk)
+        progress.add(len(chunk))
+
+        prefix_end = state.get_prefix_end()
+
+        if prefix_end > hasher.position:
+            hasher.catch_up(prefix_end)
+
+    def _run():
+        while not errors:
+            try:
+                start, end = queue.get_nowait()
+            except six.moves.queue.Empty:
+                return
+
+            try:
+                download_segment(
+                    state.remote,
+                    part_path,
+                    start,
+                    end,
+                    _record,
+                    timeout=timeout,
+                    limiter=limiter,
+                    throttle=throttle,
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                LOGGER.exception('Segment "%s-%s" of "%s" failed.', start, end, state.remote.url)
+                errors.append(error)
+
+    threads = [threading.Thread(target=_run) for _ in range(min(connections, len(segments)))]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for thread in threads:
+            thread.join()
+    finally:
+        state.save()
+
+    for error in errors:
+        if isinstance(error, rezzurect_exceptions.StaleDownloadError):
+            raise error
+
+    if errors:
+        raise RuntimeError('Download was interrupted')
+
+
+def _download_without_ranges(remote, path, reporthook, timeout, limiter, throttle):
+    '''Download `remote` into `path` from the first byte to the last.'''
+    LOGGER.debug('Downloading "%s" using a single stream.', remote.url)
+
+    part_path = PartialDownload.get_part_path(path)
+    _remove(PartialDownload.get_state_path(path))
+
+    remote.sha256 = download_stream(
+        remote.url,
+        part_path,
+        _Progress(remote.size, reporthook),
+        timeout=timeout,
+        limiter=limiter,
+        throttle=throttle,
+    )
+    _replace(part_path, path)
+
+
+def download(url, path, connections=DEFAULT_CONNECTIONS, timeout=DEFAULT_TIMEOUT,
+             reporthook=None, limiter=None, throttle=None):
+    '''Download `url` to `path`, using several connections when possible.
+
+    If an earlier call was interrupted, the download continues from the
+    bytes which were already written, as long as the file on the server
+    still has the same size, ETag, and Last-Modified date.
+
+    Args:
+        url (str):
+            The Internet address to download from.
+        path (str):
+            The absolute path to the file which will be written to.
+        connections (int, optional):
+            The maximum number of simultaneous connections to open.
+        timeout (int, optional):
+            The number of seconds before an unresponsive connection gives up.
+        reporthook (callable[int, int, int], optional):
+            A function in the same style as `urllib.urlretrieve`'s reporthook.
+        limiter (`ConnectionLimiter`, optional):
+            A cap on the number of connections which this download shares
+            with other downloads. `connections` still applies.
+        throttle (`rezzurect.utils.bandwidth.Throttle`, optional):
+            A bandwidth limit which this download shares with other downloads.
+
+    Raises:
+        RuntimeError:
+            If the download was interrupted or the file changed on
+            the server while it was downloading.
+
+    Returns:
+        `RemoteFile`: The description of the downloaded file, including its sha256 digest.
+
+    '''
+    remote = get_remote_file(url, timeout=timeout, limiter=limiter)
+
+    if not remote.supports_ranges:
+        _download_without_ranges(remote, path, reporthook, timeout, limiter, throttle)
+
+        return remote
+
+    state = PartialDownload.load(path, remote.url)
+
+    if state and not state.is_valid_for(remote):
+        LOGGER.info('Discarding stale partial download of "%s".', url)
+        state.discard()
+        state = None
+
+    if state:
+        LOGGER.info(
+            'Resuming "%s" from "%s" of "%s" bytes.',
+            url,
+            state.get_completed_size(),
+            remote.size,
+        )
+    else:
+        state = PartialDownload(path, remote)
+        state.allocate()
+
+    segments = plan_segments(state.get_missing_ranges(), max(connections, 1))
+    progress = _Progress(remote.size, reporthook=reporthook, completed=state.get_completed_size())
+    hasher = _PrefixHasher(state.get_part_path(path))
+    hasher.catch_up(state.get_prefix_end())
+
+    LOGGER.debug('Downloading "%s" using "%s" segments.', url, len(segments))
+
+    try:
+        _download_segments(
+            state, segments, max(connections, 1), progress, hasher, timeout, limiter, throttle)
+    except rezzurect_exceptions.StaleDownloadError:
+        state.discard()
+
+        raise RuntimeError('Download was interrupted because "{url}" changed on the server.'
+                           ''.format(url=url))
+
+    remote.sha256 = hasher.get_digest(remote.size)
+    state.commit()
+
+    return remote
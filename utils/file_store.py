@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''A content-addressed store of installed files, shared by every package version.
+
+Patch releases of the same software are mostly made of identical files.
+When the store is enabled, every file which is extracted into an install
+folder is hashed as it's written. If the store already has a file with the
+same contents and permissions, the installed file is replaced by a hardlink
+to it. Otherwise, the installed file is hardlinked into the store, so that
+later installs can share it.
+
+The store folder is laid out like this:
+
+    {root}/objects/ab/abcdef...-755  # A file, named by its sha256 digest and permissions
+
+The store must be on the same file system as the install folders, which is
+why it's kept under the Rez package root.
+
+Since hardlinks share one inode, every copy of a file shares one
+modification time and owner, too. Install folders must never be written
+into in-place. Every extraction engine removes an existing file before it
+writes a new one.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import logging
+import errno
+import stat
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import checksum
+
+
+FOLDER_NAME = '.rezzurect_files'
+LOGGER = logging.getLogger('rezzurect.file_store')
+
+
+class FileStore(object):
+
+    '''A folder of files which are keyed by their contents and permissions.'''
+
+    def __init__(self, root):
+        '''Create the instance.
+
+        Args:
+            root (str): The absolute path to the store folder.
+
+        '''
+        super(FileStore, self).__init__()
+
+        self.root = root
+
+    def get_object_path(self, digest, mode):
+        '''str: The absolute path where the file for `digest` and `mode` is stored.'''
+        return os.path.join(
+            self.root,
+            'objects',
+            digest[:2],
+            '{digest}-{mode:o}'.format(digest=digest, mode=stat.S_IMODE(mode)),
+        )
+
+    def add(self, path, digest):
+        '''Share the file at `path` with every other file which has the same contents.
+
+        Args:
+            path (str): The absolute path to some regular file which was just installed.
+            digest (str): The sha256 hex digest of `path`.
+
+        Returns:
+            int: The number of bytes saved, which is 0 if `path` was added to the store.
+
+        '''
+        details = os.lstat(path)
+
+        if not stat.S_ISREG(details.st_mode) or not details.st_size:
+            return 0
+
+        object_path = self.get_object_path(digest, details.st_mode)
+
+        try:
+            object_details = os.stat(object_path)
+        except OSError:
+            object_details = None
+
+        if object_details and object_details.st_ino == details.st_ino:
+            return 0
+
+        try:
+            if object_details and object_details.st_size == details.st_size:
+                # `path` is replaced by a link in a single rename so it's never missing
+                _replace_with_link(object_path, path)
+
+                return details.st_size
+
+            _make_directory(os.path.dirname(object_path))
+            _replace_with_link(path, object_path)
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.EMLINK, errno.EPERM):
+                raise
+
+            LOGGER.debug('File "%s" could not be linked with the store. %s', path, error)
+
+        return 0
+
+
+def _make_directory(path):
+    '''Create `path` if it doesn't exist, ignoring other processes which make it too.'''
+    try:
+        os.makedirs(path)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+
+def _replace_with_link(source, destination):
+    '''Make `destination` a hardlink of `source`, replacing whatever was at `destination`.'''
+    temporary_path = '{path}.{pid}.link'.format(path=destination, pid=os.getpid())
+
+    if os.path.lexists(temporary_path):
+        os.remove(temporary_path)
+
+    os.link(source, temporary_path)
+
+    if os.name == 'nt' and os.path.isfile(destination):
+        os.remove(destination)
+
+    os.rename(temporary_path, destination)
+
+
+def dedupe(folder, store, dry_run=False):
+    '''Share every file in an existing install folder with the store.
+
+    Args:
+        folder (str): The absolute path to some folder of installed files.
+        store (`FileStore`): The store to share files with.
+        dry_run (bool, optional): If True, only count the bytes which would be saved.
+
+    Returns:
+        int: The number of bytes saved (or that would be saved).
+
+    '''
+    saved = 0
+    seen = set()  # The files that a dry run would have added to the store
+    store_root = os.path.normpath(store.root)
+
+    for root, folders, files in os.walk(folder):
+        # The store itself may be inside of `folder`
+        folders[:] = [name for name in folders
+                      if os.path.normpath(os.path.join(root, name)) != store_root]
+
+        for name in files:
+            path = os.path.join(root, name)
+            details = os.lstat(path)
+
+            if not stat.S_ISREG(details.st_mode) or not details.st_size:
+                continue
+
+            digest = checksum.get_file_digest(path)
+
+            if not dry_run:
+                saved += store.add(path, digest)
+
+                continue
+
+            object_path = store.get_object_path(digest, details.st_mode)
+
+            try:
+                stored = os.stat(object_path).st_ino
+            except OSError:
+                stored = None
+
+            if stored != details.st_ino and (stored or object_path in seen):
+                saved += details.st_size
+
+            seen.add(object_path)
+
+    return saved
+
+
+def get_store(enabled, package_root):
+    '''Create the store for `package_root`, if the store is enabled.
+
+    Args:
+        enabled (bool): If False, no store is made.
+        package_root (str): The folder which every installed Rez package is in.
+
+    Returns:
+        `FileStore` or NoneType: The store, if it's enabled.
+
+    '''
+    if not enabled or not package_root:
+        return None
+
+    return FileStore(os.path.join(package_root, FOLDER_NAME))
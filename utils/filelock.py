@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''An exclusive, cross-process lock which is backed by a file on-disk.
+
+Example:
+    >>> with FileLock('/tmp/some_download.lock'):
+    ...     pass  # Only one process on the host can run this block at a time
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock(object):
+
+    '''A lock which blocks other processes until it is released.'''
+
+    def __init__(self, path):
+        '''Create the instance.
+
+        Args:
+            path (str): The absolute path to the file to lock. It will be created, if needed.
+
+        '''
+        super(FileLock, self).__init__()
+
+        self._file = None
+        self.path = path
+
+    def acquire(self, blocking=True):
+        '''Lock the file, waiting for other processes to release it if `blocking`.
+
+        Returns:
+            bool: If the lock was acquired.
+
+        '''
+        directory = os.path.dirname(self.path)
+
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process may have made the folder at the same time
+                if not os.path.isdir(directory):
+                    raise
+
+        file_ = open(self.path, 'a+')
+
+        try:
+            acquired = _lock(file_, blocking)
+        except Exception:
+            file_.close()
+            raise
+
+        if not acquired:
+            file_.close()
+
+            return False
+
+        self._file = file_
+
+        return True
+
+    def release(self):
+        '''Unlock the file so that other processes can use it.'''
+        if not self._file:
+            return
+
+        try:
+            _unlock(self._file)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        '''Wait for the lock and return this instance.'''
+        self.acquire()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        '''Release the lock.'''
+        self.release()
+
+
+def _lock(file_, blocking):
+    '''bool: Lock the open file, using whatever the current OS supports.'''
+    if fcntl:
+        flags = fcntl.LOCK_EX
+
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+
+        try:
+            fcntl.flock(file_.fileno(), flags)
+        except (IOError, OSError):
+            if blocking:
+                raise
+
+            return False
+
+        return True
+
+    while True:
+        file_.seek(0)
+
+        try:
+            msvcrt.locking(file_.fileno(), msvcrt.LK_NBLCK, 1)
+        except (IOError, OSError):
+            if not blocking:
+                return False
+
+            time.sleep(0.1)
+        else:
+            return True
+
+
+def _unlock(file_):
+    '''Unlock the open file.'''
+    if fcntl:
+        fcntl.flock(file_.fileno(), fcntl.LOCK_UN)
+    else:
+        file_.seek(0)
+        msvcrt.locking(file_.fileno(), msvcrt.LK_UNLCK, 1)
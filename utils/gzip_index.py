@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Extract gzip-compressed TAR archives in parallel, using a seek-point index.
+
+A gzip stream can normally only be decompressed from its first byte. The
+first time that an archive is extracted, this module records a "zran"
+index while it decompresses. The index holds a snapshot of the inflate
+window every few MB of uncompressed data, so decompression can later
+restart from any of those points. The offset of every TAR member's data is
+recorded too.
+
+The index is written beside the archive as two files:
+
+    {base}.zran          # The inflate window snapshots
+    {base}.members.json  # Every TAR member, its metadata, and its data offset
+
+Every later extraction splits the archive's files into groups of similar
+size and extracts each group in its own process, seeking straight to each
+member's data.
+
+This needs the optional `indexed_gzip` package. Without it, `is_supported`
+is always False and callers should extract archives the usual way.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import multiprocessing
+import hashlib
+import logging
+import tarfile
+import json
+import os
+
+try:
+    import indexed_gzip
+except ImportError:
+    indexed_gzip = None
+
+# IMPORT LOCAL LIBRARIES
+from . import tar_extract
+
+
+_INDEXABLE_TYPES = (tarfile.REGTYPE, tarfile.AREGTYPE, tarfile.DIRTYPE, tarfile.SYMTYPE, tarfile.LNKTYPE)
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_SPACING = 4 * 1024 * 1024
+INDEX_SUFFIX = '.zran'
+MEMBERS_SUFFIX = '.members.json'
+LOGGER = logging.getLogger('rezzurect.gzip_index')
+
+
+def _get_member_record(member):
+    '''dict[str]: Describe `member` so that it can be saved as JSON.'''
+    return {
+        'gid': member.gid,
+        'linkname': member.linkname,
+        'mode': member.mode,
+        'mtime': member.mtime,
+        'name': member.name,
+        'offset_data': member.offset_data,
+        'size': member.size,
+        'type': member.type.decode('ascii') if isinstance(member.type, bytes) else member.type,
+        'uid': member.uid,
+    }
+
+
+def _get_member(record):
+    '''`tarfile.TarInfo`: Rebuild a member from the output of `_get_member_record`.'''
+    member = tarfile.TarInfo(record['name'])
+    member.gid = record['gid']
+    member.linkname = record['linkname']
+    member.mode = record['mode']
+    member.mtime = record['mtime']
+    member.size = record['size']
+    member.type = record['type'].encode('ascii')
+    member.uid = record['uid']
+
+    return member
+
+
+def _split(records, count):
+    '''Divide file records into `count` runs of neighboring files with a similar total size.
+
+    Neighboring files are kept together so that each process reads one
+    region of the archive, from front to back.
+
+    Returns:
+        list[list[dict[str]]]: The groups of records. Empty groups are omitted.
+
+    '''
+    total = sum(record['size'] for record in records)
+    target = total / float(max(count, 1))
+    groups = [[]]
+    size = 0
+
+    for record in records:
+        if size >= target * len(groups) and len(groups) < count:
+            groups.append([])
+
+        groups[-1].append(record)
+        size += record['size']
+
+    return [group for group in groups if group]
+
+
+def _extract_files(arguments):
+    '''Extract some regular files using the zran index. This runs in a separate process.
+
+    Args:
+        arguments (tuple[str, str, str, list[dict[str]], `rezzurect.utils.file_store.FileStore`]):
+            The path to the archive, its zran index, the folder to extract
+            into, the records of every file to extract, and the store to
+            share files with, if any.
+
+    Returns:
+        int: The number of extracted files.
+
+    '''
+    path, index_path, destination, records, store = arguments
+
+    with indexed_gzip.IndexedGzipFile(path, index_file=index_path) as file_:
+        for record in records:
+            target = os.path.join(destination, record['name'])
+
+            if os.path.islink(target) or os.path.isfile(target):
+                os.remove(target)
+
+            file_.seek(record['offset_data'])
+            remaining = record['size']
+            hasher = hashlib.sha256()
+
+            with open(target, 'wb') as output:
+                while remaining > 0:
+                    chunk = file_.read(min(CHUNK_SIZE, remaining))
+
+                    if not chunk:
+                        raise EOFError('Archive "{path}" ended inside of "{name}".'
+                                       ''.format(path=path, name=record['name']))
+
+                    output.write(chunk)
+                    hasher.update(chunk)
+                    remaining -= len(chunk)
+
+            tar_extract.set_metadata(_get_member(record), target)
+
+            if store:
+                store.add(target, hasher.hexdigest())
+
+    return len(records)
+
+
+def _write_index(file_, members, size, index_path, members_path):
+    '''Save the seek points of `file_` and the offset of every member, atomically.
+
+    Args:
+        file_ (`indexed_gzip.IndexedGzipFile`): The archive, with its full index built.
+        members (list[`tarfile.TarInfo`]): Every member of the archive.
+        size (int): The size of the compressed archive, which is used to check the index later.
+        index_path (str): The absolute path to write the zran index to.
+        members_path (str): The absolute path to write the members index to.
+
+    '''
+    # Index files are written to temporary paths first so that readers never see half of one
+    temporary_index_path = '{path}.{pid}.tmp'.format(path=index_path, pid=os.getpid())
+    temporary_members_path = '{path}.{pid}.tmp'.format(path=members_path, pid=os.getpid())
+    file_.export_index(temporary_index_path)
+
+    with open(temporary_members_path, 'w') as handler:
+        json.dump({'members': [_get_member_record(member) for member in members], 'size': size}, handler)
+
+    # The members index is renamed last because `read_members` only trusts it once the zran index exists
+    for temporary_path, final_path in (
+            (temporary_index_path, index_path),
+            (temporary_members_path, members_path),
+    ):
+        if os.name == 'nt' and os.path.isfile(final_path):
+            os.remove(final_path)
+
+        os.rename(temporary_path, final_path)
+
+
+def get_index_paths(base):
+    '''tuple[str, str]: The zran index and the members index for the archive at `base`.'''
+    return (base + INDEX_SUFFIX, base + MEMBERS_SUFFIX)
+
+
+def is_supported(path):
+    '''bool: Check if the archive at `path` can be indexed.'''
+    return bool(indexed_gzip) and path.lower().endswith(('.tar.gz', '.tgz'))
+
+
+def read_members(path, base):
+    '''Get the members index for the archive at `path`, if it's there and up to date.
+
+    Args:
+        path (str): The absolute path to some gzip-compressed TAR archive.
+        base (str): The path which the index files are named after. See `get_index_paths`.
+
+    Returns:
+        list[dict[str]] or NoneType: Every member of the archive, if it has a complete index.
+
+    '''
+    index_path, members_path = get_index_paths(base)
+
+    if not os.path.isfile(index_path):
+        return None
+
+    try:
+        with open(members_path, 'r') as file_:
+            data = json.load(file_)
+    except (IOError, ValueError):
+        return None
+
+    if data.get('size') != os.path.getsize(path):
+        return None
+
+    return data.get('members')
+
+
+def extract_and_index(path, destination, base, spacing=DEFAULT_SPACING,
+                      workers=tar_extract.DEFAULT_WORKERS, exclude=None, store=None):
+    '''Extract the archive at `path` and write its index files.
+
+    Args:
+        path (str): The absolute path to some gzip-compressed TAR archive.
+        destination (str): The absolute path to the folder to extract into.
+        base (str): The path which the index files are named after. See `get_index_paths`.
+        spacing (int, optional): The number of uncompressed bytes between seek points.
+        workers (int, optional): The number of threads which write files.
+        exclude (iterable[str], optional): Install profile globs for the paths to skip.
+        store (`rezzurect.utils.file_store.FileStore`, optional): A store to share files with.
+
+    '''
+    members = []
+    index_path, members_path = get_index_paths(base)
+
+    with indexed_gzip.IndexedGzipFile(path, spacing=spacing) as file_:
+        # Every member is indexed, even excluded ones, so that the index suits every install profile
+        tar_extract.extract(
+            file_,
+            destination,
+            workers=workers,
+            callback=members.append,
+            exclude=exclude,
+            store=store,
+        )
+
+        if any(member.type not in _INDEXABLE_TYPES for member in members):
+            # Devices and FIFOs can't be extracted out of order so the archive is never indexed
+            LOGGER.info('Archive "%s" has special files and will not be indexed.', path)
+
+            return
+
+        file_.build_full_index()
+
+        try:
+            _write_index(file_, members, os.path.getsize(path), index_path, members_path)
+        except (IOError, OSError):
+            # The archive may live in a read-only cache. It still extracted fine.
+            LOGGER.warning('Index of archive "%s" could not be written to "%s".', path, base)
+
+            return
+
+    LOGGER.info('Indexed "%s" members of archive "%s".', len(members), path)
+
+
+def extract_indexed(path, destination, base, members, processes=None, exclude=None, store=None):
+    '''Extract the archive at `path` in parallel, using its index.
+
+    Args:
+        path (str): The absolute path to some gzip-compressed TAR archive.
+        destination (str): The absolute path to the folder to extract into.
+        base (str): The path which the index files are named after. See `get_index_paths`.
+        members (list[dict[str]]): The archive's members. See `read_members`.
+        processes (int, optional): The number of extraction processes. Default: one per CPU.
+        exclude (iterable[str], optional): Install profile globs for the paths to skip.
+        store (`rezzurect.utils.file_store.FileStore`, optional): A store to share files with.
+
+    '''
+    processes = processes or multiprocessing.cpu_count()
+    index_path, _ = get_index_paths(base)
+    directories = []
+    files = []
+    links = []
+    records = {record['name']: record for record in members}
+    copies = dict()  # Each excluded file that a hard link needs and the link which gets its data
+
+    for record in members:
+        member = _get_member(record)
+
+        if tar_extract.is_excluded(member, exclude):
+            continue
+
+        source = records.get(member.linkname) if member.islnk() else None
+
+        if source and member.linkname not in copies and \
+                tar_extract.is_excluded(_get_member(source), exclude):
+            # The first link to an excluded file is written with its data, instead
+            tar_extract.make_directory(os.path.dirname(os.path.join(destination, record['name'])))
+            files.append(dict(source, name=record['name']))
+            copies[member.linkname] = record['name']
+
+            continue
+
+        target = os.path.join(destination, record['name'])
+
+        if member.isdir():
+            tar_extract.make_directory(target)
+            directories.append((member, target))
+        elif member.isreg():
+            tar_extract.make_directory(os.path.dirname(target))
+            files.append(record)
+        else:
+            tar_extract.make_directory(os.path.dirname(target))
+            links.append((member, target))
+
+    groups = _split(files, processes)
+    jobs = [(path, index_path, destination, group, store) for group in groups]
+
+    LOGGER.debug('Extracting "%s" files of "%s" with "%s" processes.', len(files), path, len(jobs))
+
+    if len(jobs) > 1:
+        pool = multiprocessing.Pool(len(jobs))
+
+        try:
+            pool.map(_extract_files, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            _extract_files(job)
+
+    for member, target in links:
+        if os.path.islink(target) or os.path.isfile(target):
+            os.remove(target)
+
+        if member.issym():
+            os.symlink(member.linkname, target)
+        else:
+            linkname = copies.get(member.linkname, member.linkname)
+            os.link(os.path.join(destination, linkname), target)
+
+        tar_extract.set_metadata(member, target)
+
+    # Deepest folders first, so a parent's modification time isn't changed by its children
+    for member, target in sorted(directories, key=lambda item: item[1], reverse=True):
+        tar_extract.set_metadata(member, target)
+
+
+def extract(path, destination, base='', spacing=DEFAULT_SPACING, processes=None,
+            workers=tar_extract.DEFAULT_WORKERS, exclude=None, store=None):
+    '''Extract the archive at `path`, using (or building) its seek-point index.
+
+    Args:
+        path (str):
+            The absolute path to some gzip-compressed TAR archive.
+        destination (str):
+            The absolute path to the folder to extract into.
+        base (str, optional):
+            The path which the index files are named after. Default: `path`.
+        spacing (int, optional):
+            The number of uncompressed bytes between seek points, if a new index is built.
+        processes (int, optional):
+            The number of extraction processes, if an index exists. Default: one per CPU.
+        workers (int, optional):
+            The number of threads which write files, if no index exists yet.
+        exclude (iterable[str], optional):
+            Install profile globs for the paths to skip. See `rezzurect.utils.install_profile`.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with the files in this store.
+
+    Raises:
+        RuntimeError: If `indexed_gzip` isn't installed.
+
+    '''
+    if not indexed_gzip:
+        raise RuntimeError('Archive "{path}" cannot be indexed because indexed_gzip is not installed.'
+                           ''.format(path=path))
+
+    base = base or path
+    members = read_members(path, base)
+
+    if members is None:
+        extract_and_index(
+            path, destination, base, spacing=spacing, workers=workers, exclude=exclude, store=store)
+    else:
+        extract_indexed(
+            path, destination, base, members, processes=processes, exclude=exclude, store=store)
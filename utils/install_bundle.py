@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Save a finished install folder into one file and restore it somewhere else.
+
+A bundle is a plain TAR archive. Its first member is an index which holds
+the install record of the folder (see `rezzurect.utils.install_metadata`)
+and the number of members which follow it:
+
+    .rezzurect_bundle.json  # {"members": 18211, "record": {"package": "nuke", ...}, ...}
+    Nuke11.2
+    plugins/...
+
+Bundles are uncompressed by default. Most of an install is binaries which
+compress poorly, and an uncompressed bundle is restored with large
+sequential reads while a pool of threads writes its files (see
+`rezzurect.utils.tar_extract`). Restoring an install on a new machine is a
+bulk copy, instead of running each of the package's install steps again.
+
+A bundle is restored into a stage, a hidden sibling folder, which is only
+moved into place once every member was written. See
+`rezzurect.utils.staged_install`.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import tarfile
+import logging
+import time
+import json
+import io
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import install_metadata
+from . import staged_install
+from . import tar_extract
+
+
+INDEX_NAME = '.rezzurect_bundle.json'
+FORMAT_VERSION = 1
+BUFFER_SIZE = 8 * 1024 * 1024
+LOGGER = logging.getLogger('rezzurect.install_bundle')
+
+
+def _add_index(tar, index):
+    '''Write `index` into `tar`, as a JSON member.'''
+    data = json.dumps(index, indent=4, sort_keys=True).encode('utf-8')
+    info = tarfile.TarInfo(INDEX_NAME)
+    info.size = len(data)
+    info.mtime = int(index['created'])
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _count_members(folder):
+    '''int: The number of TAR members which `folder`'s contents make.'''
+    count = 0
+
+    for _, folders, files in os.walk(folder):
+        count += len(folders) + len(files)
+
+    return count
+
+
+def export(folder, path, compress=False):
+    '''Save the install folder, `folder`, into a bundle file.
+
+    Args:
+        folder (str): The absolute path to some finished install folder.
+        path (str): The absolute path to write the bundle to.
+        compress (bool, optional): If True, the bundle is gzip-compressed.
+
+    Raises:
+        EnvironmentError: If `folder` doesn't exist.
+
+    Returns:
+        dict[str]: The index of the bundle.
+
+    '''
+    if not os.path.isdir(folder):
+        raise EnvironmentError('Folder "{folder}" does not exist.'.format(folder=folder))
+
+    index = {
+        'created': time.time(),
+        'members': _count_members(folder),
+        'name': os.path.basename(os.path.normpath(folder)),
+        'record': install_metadata.read(folder),
+        'version': FORMAT_VERSION,
+    }
+    temporary_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+
+    LOGGER.info('Exporting "%s" members of "%s".', index['members'], folder)
+
+    try:
+        with open(temporary_path, 'wb', BUFFER_SIZE) as file_:
+            with tarfile.open(fileobj=file_, mode='w:gz' if compress else 'w',
+                              format=tarfile.PAX_FORMAT) as tar:
+                _add_index(tar, index)
+
+                for name in sorted(os.listdir(folder)):
+                    tar.add(os.path.join(folder, name), arcname=name)
+
+        if os.name == 'nt' and os.path.isfile(path):
+            os.remove(path)
+
+        os.rename(temporary_path, path)
+    finally:
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+
+    LOGGER.info('Exported "%s" into bundle "%s".', folder, path)
+
+    return index
+
+
+def read_index(path):
+    '''Get the index of the bundle at `path`, without reading the rest of it.
+
+    Raises:
+        RuntimeError: If `path` isn't a bundle or was made by a newer version of rezzurect.
+
+    Returns:
+        dict[str]: The index. See `export`.
+
+    '''
+    with tarfile.open(path, mode='r|*') as tar:
+        member = tar.next()
+
+        if not member or member.name != INDEX_NAME:
+            raise RuntimeError('File "{path}" is not an install bundle.'.format(path=path))
+
+        index = json.loads(tar.extractfile(member).read().decode('utf-8'))
+
+    if index.get('version', 0) > FORMAT_VERSION:
+        raise RuntimeError('Bundle "{path}" needs a newer version of rezzurect.'.format(path=path))
+
+    return index
+
+
+def restore(path, destination, workers=tar_extract.DEFAULT_WORKERS, replace=False, store=None):
+    '''Restore the bundle at `path` as the install folder, `destination`.
+
+    Args:
+        path (str):
+            The absolute path to some bundle file.
+        destination (str):
+            The absolute path to the install folder to make.
+        workers (int, optional):
+            The number of threads which write files.
+        replace (bool, optional):
+            If True, an existing `destination` folder is replaced.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every restored file is shared with this store.
+
+    Raises:
+        RuntimeError:
+            If `destination` already has files and `replace` is False or if
+            the bundle is incomplete.
+
+    Returns:
+        dict[str]: The index of the restored bundle.
+
+    '''
+    index = read_index(path)
+    destination = os.path.normpath(destination)
+
+    if os.path.isdir(destination) and os.listdir(destination) and not replace:
+        raise RuntimeError('Folder "{destination}" already exists.'.format(destination=destination))
+
+    members = []
+
+    LOGGER.info('Restoring "%s" members of "%s".', index['members'], path)
+
+    with staged_install.Stage(destination) as stage:
+        with open(path, 'rb', BUFFER_SIZE) as file_:
+            tar_extract.extract(
+                file_,
+                stage.path,
+                workers=workers,
+                callback=members.append,
+                exclude=[INDEX_NAME, staged_install.MARKER_NAME],
+                store=store,
+            )
+
+        if len(members) - 1 != index['members']:
+            raise RuntimeError(
+                'Bundle "{path}" is incomplete. It has "{count}" of "{total}" members.'
+                ''.format(path=path, count=len(members) - 1, total=index['members']))
+
+    LOGGER.info('Restored bundle "%s" into "%s".', path, destination)
+
+    return index
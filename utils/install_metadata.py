@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Read and write the record of how a package's install folder was made.
+
+The record is a JSON file at the root of the install folder. It's written
+once the install succeeds.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import logging
+import json
+import os
+
+
+FILE_NAME = '.rezzurect_install.json'
+LOGGER = logging.getLogger('rezzurect.install_metadata')
+
+
+def get_path(install):
+    '''str: The record file of the install folder, `install`.'''
+    return os.path.join(install, FILE_NAME)
+
+
+def read(install):
+    '''dict[str]: The record of the install folder, `install`, or an empty dict if it has none.'''
+    try:
+        with open(get_path(install), 'r') as file_:
+            return json.load(file_)
+    except (IOError, ValueError):
+        return dict()
+
+
+def update(install, **values):
+    '''Add `values` to the record of the install folder, `install`.
+
+    Args:
+        install (str): The absolute path to some package's install folder.
+        **values: Every key to add (or replace) and its value.
+
+    Returns:
+        dict[str]: The whole, updated record.
+
+    '''
+    path = get_path(install)
+    record = read(install)
+    record.update(values)
+    temporary_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+
+    with open(temporary_path, 'w') as file_:
+        json.dump(record, file_, indent=4, sort_keys=True)
+
+    if os.name == 'nt' and os.path.isfile(path):
+        os.remove(path)
+
+    os.rename(temporary_path, path)
+
+    LOGGER.debug('Updated install record "%s".', path)
+
+    return record
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Choose which parts of a package's payload to skip while it's installed.
+
+A profile is a named list of exclusion globs, per package. They're defined
+in the "install_profiles" key of a .respawnrc file:
+
+    install_profiles:
+        houdini:
+            render: ["houdini/demo", "houdini/help/*.zip"]
+            workstation: ["houdini/demo"]
+        nuke:
+            render: ["plugins/*/samples", "Documentation"]
+
+The profile to use is chosen with the "install_profile" key or the
+"RESPAWN_INSTALL_PROFILE" environment variable. "full" (or any profile
+which a package doesn't define) excludes nothing.
+
+Globs are `fnmatch` patterns which are compared to paths relative to the
+install folder, using "/" separators. A folder which matches is skipped,
+along with everything inside of it.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import fnmatch
+import posixpath
+
+
+FULL = 'full'
+
+
+def _normalize(name):
+    '''str: Make some archive member's name relative, with "/" separators.'''
+    name = name.replace('\\', '/')
+
+    while name.startswith('./'):
+        name = name[2:]
+
+    return name.strip('/')
+
+
+def get_patterns(package, profile, profiles):
+    '''Find the exclusion globs of a package's install profile.
+
+    Args:
+        package (str): The name of the package. Example: "houdini".
+        profile (str): The name of the chosen profile. Example: "render".
+        profiles (dict[str, dict[str, list[str]]]): Every package's profiles.
+
+    Returns:
+        list[str]: The globs to exclude. It's empty for the "full" profile.
+
+    '''
+    if not profile or profile == FULL:
+        return []
+
+    return list(profiles.get(package, dict()).get(profile, []))
+
+
+def get_relative_patterns(patterns, folder):
+    '''Adjust exclusion globs for something which is extracted into a sub-folder.
+
+    Args:
+        patterns (iterable[str]):
+            Globs which are relative to the install folder.
+        folder (str):
+            A folder, relative to the install folder. Example: "python".
+
+    Returns:
+        list[str]:
+            The globs which are relative to `folder`. Globs for other
+            folders are dropped and globs which start with "*" are kept as-is.
+
+    '''
+    prefix = _normalize(folder) + '/'
+    output = []
+
+    for pattern in patterns:
+        pattern = _normalize(pattern)
+
+        if pattern.startswith(prefix):
+            output.append(pattern[len(prefix):])
+        elif pattern.startswith('*'):
+            output.append(pattern)
+
+    return output
+
+
+def is_excluded(name, patterns):
+    '''Check if an archive member is excluded by an install profile.
+
+    Args:
+        name (str): The path of the member, relative to where it's extracted.
+        patterns (iterable[str] or NoneType): Exclusion globs. See `get_patterns`.
+
+    Returns:
+        bool: If `name`, or any folder that it's inside of, matches a glob.
+
+    '''
+    if not patterns:
+        return False
+
+    name = _normalize(name)
+
+    while name:
+        if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            return True
+
+        name = posixpath.dirname(name)
+
+    return False
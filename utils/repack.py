@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Repack a verified TAR archive into a format which installs in parallel.
+
+A gzip-compressed TAR archive can only be decompressed front to back, by one
+core. When the "repack_archives" setting is on, each verified archive in the
+archive cache is repacked once into a ZIP file which is kept beside it:
+
+    {root}/objects/ab/abcdef...         # The original archive
+    {root}/objects/ab/abcdef....rzpack  # The repacked copy of it
+
+Every member of the repacked copy is compressed on its own, so later
+installs (on any host which shares the cache) extract members in parallel
+with `rezzurect.utils.zip_extract`. Members which are already compressed,
+such as the inner installers that most vendor archives hold, are stored
+as-is. They can be read straight out of the repacked copy, at their offset,
+without being decompressed or copied first.
+
+Folders, permissions and symbolic links are kept the same way as in a ZIP
+archive which was made on Unix. Hard links, which a ZIP archive can't hold,
+are listed in an index member which is read back after extraction.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import threading
+import tempfile
+import zipfile
+import fnmatch
+import logging
+import tarfile
+import struct
+import shutil
+import copy
+import time
+import json
+import stat
+import sys
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import install_profile
+from . import delta_install
+from . import tar_extract
+from . import zip_extract
+
+
+SUFFIX = '.rzpack'
+INDEX_NAME = '.rezzurect_repack.json'
+FORMAT_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+_ZIP_EPOCH = 315532800  # 1980-01-01, the earliest time that a ZIP member can have
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_COMPRESSED_MAGICS = (
+    b'PK\x03\x04',  # zip
+    b'\x1f\x8b',  # gzip
+    b'BZh',  # bzip2
+    b'\xfd7zXZ\x00',  # xz
+    b'\x28\xb5\x2f\xfd',  # zstd
+    b'\xed\xab\xee\xdb',  # rpm
+)
+LOGGER = logging.getLogger('rezzurect.repack')
+
+
+def _get_name(name):
+    '''str: Make some TAR member's name relative, with "/" separators.'''
+    name = name.replace('\\', '/')
+
+    while name.startswith('./'):
+        name = name[2:]
+
+    name = name.strip('/')
+
+    return '' if name == '.' else name
+
+
+def _make_info(name, member, file_type):
+    '''`zipfile.ZipInfo`: Describe a TAR member, with its Unix permissions, as a ZIP member.'''
+    info = zipfile.ZipInfo(name, date_time=time.localtime(max(member.mtime, _ZIP_EPOCH))[:6])
+    info.create_system = 3  # Unix
+    info.external_attr = (file_type | stat.S_IMODE(member.mode)) << 16
+
+    return info
+
+
+def _write_file(zip_file, info, source, size):
+    '''Copy a regular file into `zip_file`, storing it as-is if it's already compressed.'''
+    head = source.read(CHUNK_SIZE)
+    info.file_size = size
+
+    if head.startswith(_COMPRESSED_MAGICS):
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+
+    if sys.version_info < (3, 6) and size <= len(head):
+        zip_file.writestr(info, head)
+
+        return
+
+    if sys.version_info < (3, 6):  # `zipfile.ZipFile.open` can't write, yet
+        _write_through_file(zip_file, info, head, source)
+
+        return
+
+    with zip_file.open(info, 'w') as output:
+        output.write(head)
+        shutil.copyfileobj(source, output, CHUNK_SIZE)
+
+
+def _write_through_file(zip_file, info, head, source):
+    '''Copy a large file into `zip_file` through a temporary file, so it's never all in memory.
+
+    `zipfile.ZipFile.write` streams from disk but `zipfile.ZipFile.writestr`
+    needs the whole file as one string.
+
+    '''
+    handle, temporary_path = tempfile.mkstemp(
+        suffix='.tmp', dir=os.path.dirname(os.path.abspath(zip_file.filename)))
+
+    try:
+        with os.fdopen(handle, 'wb') as file_:
+            file_.write(head)
+            shutil.copyfileobj(source, file_, CHUNK_SIZE)
+
+        modified = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(temporary_path, (modified, modified))
+        zip_file.write(temporary_path, arcname=info.filename, compress_type=info.compress_type)
+    finally:
+        os.remove(temporary_path)
+
+    # `write` describes the member from the temporary file so its permissions are set again
+    written = zip_file.getinfo(info.filename)
+    written.create_system = info.create_system
+    written.external_attr = info.external_attr
+
+
+def _replace(source, destination):
+    '''Rename `source` to `destination`, overwriting `destination` if needed.'''
+    if os.name == 'nt' and os.path.isfile(destination):
+        os.remove(destination)
+
+    os.rename(source, destination)
+
+
+def get_path(path):
+    '''str: Where the repacked copy of the archive at `path` is kept.'''
+    return path + SUFFIX
+
+
+def is_supported(path):
+    '''bool: Check if the archive at `path` is a TAR archive that can be repacked.'''
+    try:
+        return tarfile.is_tarfile(path)
+    except (IOError, OSError):
+        return False
+
+
+def repack(path, destination=''):
+    '''Repack the TAR archive at `path` into a ZIP file.
+
+    Args:
+        path (str):
+            The absolute path to some TAR archive. It may be compressed.
+        destination (str, optional):
+            The path to write the repacked copy to. Default: `get_path(path)`.
+
+    Returns:
+        str: The path to the repacked copy.
+
+    '''
+    destination = destination or get_path(path)
+    temporary_path = '{path}.{pid}.tmp'.format(path=destination, pid=os.getpid())
+    links = []
+
+    LOGGER.info('Repacking archive "%s".', path)
+
+    try:
+        with tarfile.open(path, mode='r|*') as tar, \
+                zipfile.ZipFile(temporary_path, 'w', allowZip64=True) as zip_file:
+            for member in tar:
+                name = _get_name(member.name)
+
+                if not name:
+                    continue
+
+                if member.isdir():
+                    zip_file.writestr(_make_info(name + '/', member, stat.S_IFDIR), b'')
+                elif member.issym():
+                    info = _make_info(name, member, stat.S_IFLNK)
+                    info.compress_type = zipfile.ZIP_STORED
+                    zip_file.writestr(info, member.linkname.encode('utf-8'))
+                elif member.islnk():
+                    links.append([name, _get_name(member.linkname)])
+                elif member.isreg():
+                    info = _make_info(name, member, stat.S_IFREG)
+                    _write_file(zip_file, info, tar.extractfile(member), member.size)
+                else:
+                    LOGGER.warning('Special file "%s" in "%s" was skipped.', name, path)
+
+            index = {'links': links, 'source': os.path.basename(path), 'version': FORMAT_VERSION}
+            zip_file.writestr(INDEX_NAME, json.dumps(index, sort_keys=True))
+
+        _replace(temporary_path, destination)
+    finally:
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+
+    LOGGER.info('Repacked archive "%s" into "%s".', path, destination)
+
+    return destination
+
+
+def read_index(zip_file):
+    '''dict[str]: The index of an opened, repacked archive. See `repack`.'''
+    return json.loads(zip_file.read(INDEX_NAME).decode('utf-8'))
+
+
+def extract(path, destination, processes=None, include=None, exclude=None, store=None):
+    '''Extract the repacked archive at `path` into the `destination` folder.
+
+    Args:
+        path (str):
+            The absolute path to some repacked archive.
+        destination (str):
+            The absolute path to the folder to extract into.
+        processes (int, optional):
+            The number of extraction processes. Default: one per CPU.
+        include (iterable[str], optional):
+            `fnmatch` patterns for the file names of the members to extract.
+            See `rezzurect.utils.tar_extract.is_included`. Default: Every member.
+        exclude (iterable[str], optional):
+            Install profile globs for the paths to skip. See `rezzurect.utils.install_profile`.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+
+    '''
+    zip_extract.extract(
+        path,
+        destination,
+        processes=processes,
+        include=include,
+        exclude=list(exclude or []) + [INDEX_NAME],
+        store=store,
+    )
+
+    copies = dict()  # Each filtered-out target and the first link which got its data
+
+    with zipfile.ZipFile(path, 'r') as zip_file:
+        for name, target in read_index(zip_file)['links']:
+            if not _is_included(name, include) or install_profile.is_excluded(name, exclude):
+                continue
+
+            if target in copies:
+                _extract_link(zip_file, name, copies[target], destination, True, store=store)
+
+                continue
+
+            linkable = _is_included(target, include) and \
+                not install_profile.is_excluded(target, exclude)
+            _extract_link(zip_file, name, target, destination, linkable, store=store)
+
+            if not linkable:
+                copies[target] = name
+
+
+def _is_included(name, include):
+    '''bool: Check if the file name of the member, `name`, matches `include`, if any.'''
+    if not include:
+        return True
+
+    return any(fnmatch.fnmatch(os.path.basename(name), pattern) for pattern in include)
+
+
+def _extract_link(zip_file, name, target, destination, linkable, store=None):
+    '''Make the hard link, `name`, to the member, `target`, of an opened, repacked archive.
+
+    Args:
+        zip_file (`zipfile.ZipFile`):
+            The opened, repacked archive.
+        name (str):
+            The relative path of the hard link.
+        target (str):
+            The relative path of the member which `name` links to.
+        destination (str):
+            The absolute path to the folder which the archive was extracted into.
+        linkable (bool):
+            If False, `target` was filtered out (by `include` or `exclude`) so its
+            data is extracted as `name`, instead.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, extracted data is shared with this store.
+
+    '''
+    source = os.path.join(destination, *target.split('/'))
+    link_path = os.path.join(destination, *name.split('/'))
+
+    if not linkable or not os.path.isfile(source):
+        try:
+            info = copy.copy(zip_file.getinfo(target))
+        except KeyError:
+            LOGGER.warning('Hard link "%s" was skipped. "%s" is not in the archive.', name, target)
+
+            return
+
+        info.filename = name  # The data is still read from `target`, by its `orig_filename`
+        zip_extract.extract_member(zip_file, info, destination, store=store)
+
+        return
+
+    tar_extract.make_directory(os.path.dirname(link_path))
+
+    if os.path.islink(link_path) or os.path.isfile(link_path):
+        os.remove(link_path)
+
+    try:
+        os.link(source, link_path)
+    except (AttributeError, OSError):  # `os.link` doesn't exist for Python 2 on Windows
+        shutil.copy2(source, link_path)
+
+
+def extract_nested(path, routes, workers=tar_extract.DEFAULT_WORKERS, store=None, manifest=False):
+    '''Extract the TAR archives inside of a repacked archive, each on its own thread.
+
+    Args:
+        path (str):
+            The absolute path to some repacked archive.
+        routes (iterable[tuple[str, str, list[str], str]]):
+            See `rezzurect.utils.tar_extract.extract_nested`.
+        workers (int, optional):
+            The number of threads which write the files of each inner archive.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+        manifest (bool, optional):
+            If True, a manifest is written into each route's folder.
+
+    Raises:
+        Exception: The first error that any inner archive raised.
+
+    Returns:
+        list[str]: The name of every inner archive which was extracted.
+
+    '''
+    jobs = []
+
+    with zipfile.ZipFile(path, 'r') as zip_file:
+        for info in zip_file.infolist():
+            if info.filename.endswith('/') or stat.S_ISLNK(info.external_attr >> 16):
+                continue
+
+            for route in routes:
+                pattern, destination, exclude, sibling = tar_extract.get_route(route)
+
+                if fnmatch.fnmatch(os.path.basename(info.filename), pattern):
+                    jobs.append((info.filename, destination, exclude, sibling))
+
+                    break
+
+    errors = []
+    manifests = dict()
+    lock = threading.Lock()
+
+    def _extract(name, destination, exclude, sibling):
+        LOGGER.debug('Extracting inner archive "%s" into "%s".', name, destination)
+
+        try:
+            with zipfile.ZipFile(path, 'r') as zip_file:
+                entries = tar_extract.extract(
+                    zip_file.open(name),
+                    destination,
+                    workers=workers,
+                    exclude=exclude,
+                    store=store,
+                    sibling=sibling,
+                )
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception('Inner archive "%s" failed to extract.', name)
+            errors.append(error)
+
+            return
+
+        with lock:  # Inner archives which share a folder share one manifest
+            manifests.setdefault(destination, dict()).update(entries)
+
+    threads = [threading.Thread(target=_extract, args=job) for job in jobs]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    if manifest:
+        for destination, entries in manifests.items():
+            delta_install.write_manifest(destination, entries)
+
+    return [name for name, _, _, _ in jobs]
+
+
+def extract_inner_zip(path, pattern, destination, threads=None, **kwargs):
+    '''Extract a ZIP archive which is stored, as-is, inside of a repacked archive.
+
+    The inner archive is read in place, so it's never decompressed or copied first.
+
+    Args:
+        path (str):
+            The absolute path to some repacked archive.
+        pattern (str):
+            An `fnmatch` pattern for the file name of the inner ZIP archive.
+        destination (str):
+            The absolute path to the folder to extract into.
+        threads (int, optional):
+            The number of extraction threads. Default: one per CPU.
+        **kwargs:
+            Any other option of `rezzurect.utils.zip_extract.extract_shared`.
+
+    Returns:
+        str: The name of the extracted member or "", if no stored member matched.
+
+    '''
+    with zipfile.ZipFile(path, 'r') as zip_file:
+        for info in zip_file.infolist():
+            if info.compress_type == zipfile.ZIP_STORED and \
+                    fnmatch.fnmatch(os.path.basename(info.filename), pattern):
+                break
+        else:
+            return ''
+
+    with open(path, 'rb') as file_:
+        file_.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(file_.read(_LOCAL_HEADER.size))
+        start = info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+
+        zip_extract.extract_shared(
+            zip_extract.get_file_reader(file_, start=start),
+            info.file_size,
+            destination,
+            threads=threads,
+            **kwargs
+        )
+
+    return info.filename
@@ -4,3 +4,15 @@
 
 class ContextNotFound(Exception):
     pass
+
+
+class StaleDownloadError(RuntimeError):
+    pass
+
+
+class ChecksumError(RuntimeError):
+    pass
+
+
+class RpmError(RuntimeError):
+    pass
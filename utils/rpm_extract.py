@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Extract the files of an RPM package without `rpm2cpio` or `cpio`.
+
+An RPM file is laid out like this:
+
+    lead       # 96 bytes, which only identify the file as an RPM
+    signature  # A header structure, padded to a multiple of 8 bytes
+    header     # A header structure which describes the package
+    payload    # A compressed "newc" cpio archive of the package's files
+
+The header says how the payload is compressed. gzip and bzip2 are always
+supported. xz and lzma need Python's `lzma` module (Python 3.3+) and zstd
+needs `compression.zstd` (Python 3.14+) or the `zstandard` package.
+
+The cpio archive is decompressed and written to disk as a stream, so the
+payload is never held in memory or written anywhere else.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import threading
+import hashlib
+import logging
+import struct
+import stat
+import zlib
+import bz2
+import os
+
+try:
+    import lzma
+except ImportError:  # Python 2
+    lzma = None
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+# IMPORT LOCAL LIBRARIES
+from . import rezzurect_exceptions
+from . import install_profile
+from . import tar_extract
+
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_WORKERS = 4
+_CPIO_HEADER_SIZE = 110
+_CPIO_MAGICS = (b'070701', b'070702')
+_CPIO_TRAILER = 'TRAILER!!!'
+_HEADER_MAGIC = b'\x8e\xad\xe8\x01'
+_LEAD_MAGIC = b'\xed\xab\xee\xdb'
+_LEAD_SIZE = 96
+_PAYLOAD_COMPRESSOR_TAG = 1125
+_PAYLOAD_FORMAT_TAG = 1124
+_STRING_TYPE = 6
+LOGGER = logging.getLogger('rezzurect.rpm_extract')
+
+
+class _DecompressingReader(object):
+
+    '''A file-like object which decompresses another file-like object as it's read.'''
+
+    def __init__(self, fileobj, decompressor):
+        '''Create the instance.
+
+        Args:
+            fileobj (file-like):
+                The compressed data.
+            decompressor (object):
+                Any object with a `decompress(bytes)` method, like `zlib.decompressobj()`.
+
+        '''
+        super(_DecompressingReader, self).__init__()
+
+        self._fileobj = fileobj
+        self._decompressor = decompressor
+        self._buffer = b''
+        self._offset = 0
+        self._finished = False
+
+    def read(self, size):
+        '''bytes: Read exactly `size` bytes or fewer, if the payload ended.'''
+        if len(self._buffer) - self._offset < size:
+            # Most reads are small cpio headers, so the buffer is only
+            # copied when it needs more data, not after every read
+            #
+            pieces = [self._buffer[self._offset:]]
+            available = len(pieces[0])
+
+            while available < size and not self._finished:
+                chunk = self._fileobj.read(CHUNK_SIZE)
+
+                if chunk:
+                    data = self._decompressor.decompress(chunk)
+                else:
+                    self._finished = True
+                    flush = getattr(self._decompressor, 'flush', None)
+                    data = flush() if flush else b''
+
+                pieces.append(data)
+                available += len(data)
+
+            self._buffer = b''.join(pieces)
+            self._offset = 0
+
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+
+        return data
+
+
+def _read_exactly(fileobj, size, path):
+    '''bytes: Read `size` bytes from `fileobj` or raise an error if it ends too soon.'''
+    data = fileobj.read(size)
+
+    if len(data) != size:
+        raise rezzurect_exceptions.RpmError('RPM "{path}" ended unexpectedly.'.format(path=path))
+
+    return data
+
+
+def _read_header(fileobj, path):
+    '''Read one RPM header structure.
+
+    Args:
+        fileobj (file-like): The RPM, positioned at the start of the header.
+        path (str): The RPM's path, which is only used for error messages.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.RpmError`: If the header is malformed.
+
+    Returns:
+        tuple[dict[int, str], int]:
+            The value of every string tag in the header and the header's total size.
+
+    '''
+    intro = _read_exactly(fileobj, 16, path)
+
+    if intro[:4] != _HEADER_MAGIC:
+        raise rezzurect_exceptions.RpmError('RPM "{path}" has a malformed header.'.format(path=path))
+
+    count, data_size = struct.unpack('>II', intro[8:16])
+    index = _read_exactly(fileobj, count * 16, path)
+    data = _read_exactly(fileobj, data_size, path)
+    strings = dict()
+
+    for position in range(count):
+        tag, type_, offset, _ = struct.unpack('>iiii', index[position * 16:position * 16 + 16])
+
+        if type_ == _STRING_TYPE:
+            strings[tag] = data[offset:data.index(b'\0', offset)].decode('utf-8')
+
+    return (strings, 16 + count * 16 + data_size)
+
+
+def _get_decompressor(compressor, path):
+    '''Create an object which decompresses a payload that was compressed by `compressor`.
+
+    Args:
+        compressor (str): The RPM's payload compressor. Example: "xz".
+        path (str): The RPM's path, which is only used for error messages.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.RpmError`:
+            If this Python can't decompress `compressor`.
+
+    Returns:
+        object: An object with a `decompress(bytes)` method.
+
+    '''
+    if compressor == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    if compressor == 'bzip2':
+        return bz2.BZ2Decompressor()
+
+    if compressor in ('xz', 'lzma') and lzma:
+        return lzma.LZMADecompressor()
+
+    if compressor == 'zstd' and zstd:
+        if hasattr(zstd, 'ZstdDecompressor') and hasattr(zstd.ZstdDecompressor, 'decompressobj'):
+            return zstd.ZstdDecompressor().decompressobj()  # The `zstandard` package
+
+        return zstd.ZstdDecompressor()
+
+    raise rezzurect_exceptions.RpmError(
+        'RPM "{path}" is compressed with "{compressor}", which this Python cannot decompress.'
+        ''.format(path=path, compressor=compressor))
+
+
+def _get_target(destination, name):
+    '''Find where a cpio entry goes, refusing any name that would escape `destination`.'''
+    while name.startswith('./'):
+        name = name[2:]
+
+    name = name.lstrip('/')
+
+    if '..' in name.split('/'):
+        raise rezzurect_exceptions.RpmError('cpio entry "{name}" is outside of the package.'
+                                            ''.format(name=name))
+
+    return os.path.join(destination, *name.split('/'))
+
+
+def _remove_existing(path):
+    '''Delete the file or link at `path` so that it can be replaced, like `cpio -u` does.'''
+    if os.path.islink(path) or os.path.isfile(path):
+        os.remove(path)
+
+
+def _set_metadata(path, mode, mtime):
+    '''Apply the permissions and modification time of a cpio entry, like `cpio -m` does.'''
+    os.chmod(path, stat.S_IMODE(mode))
+    os.utime(path, (mtime, mtime))
+
+
+def _write_file(fileobj, target, size, mode, mtime, path, store=None):
+    '''Write the data of a cpio entry to `target` and link its pending hard links to it.'''
+    _remove_existing(target)
+    remaining = size
+    hasher = hashlib.sha256()
+
+    with open(target, 'wb') as file_:
+        while remaining:
+            chunk = _read_exactly(fileobj, min(CHUNK_SIZE, remaining), path)
+            file_.write(chunk)
+            hasher.update(chunk)
+            remaining -= len(chunk)
+
+    _set_metadata(target, mode, mtime)
+
+    if store:
+        store.add(target, hasher.hexdigest())
+
+
+def _link_pending(target, links):
+    '''Make every pending hard link in `links` a link to `target`.'''
+    for link, _, _ in links:
+        _remove_existing(link)
+        os.link(target, link)
+
+
+def _extract_cpio(fileobj, destination, path, exclude=None, store=None):
+    '''Write every entry of a "newc" cpio stream into `destination`.
+
+    Args:
+        fileobj (file-like): The decompressed cpio stream.
+        destination (str): The absolute path to the folder to extract into.
+        path (str): The RPM's path, which is only used for error messages.
+        exclude (iterable[str], optional): Install profile globs for the paths to skip.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+
+    Returns:
+        int: The number of extracted entries.
+
+    '''
+    directories = []
+    pending_links = dict()  # Hard links whose data comes with a later entry
+    count = 0
+
+    while True:
+        header = _read_exactly(fileobj, _CPIO_HEADER_SIZE, path)
+
+        if header[:6] not in _CPIO_MAGICS:
+            raise rezzurect_exceptions.RpmError('RPM "{path}" has an unsupported cpio payload.'
+                                                ''.format(path=path))
+
+        fields = [int(header[6 + index * 8:14 + index * 8], 16) for index in range(13)]
+        inode, mode, _, _, links, mtime, size = fields[:7]
+        name_size = fields[11]
+        name = _read_exactly(fileobj, name_size, path)[:-1].decode('utf-8')
+        _read_exactly(fileobj, (4 - (_CPIO_HEADER_SIZE + name_size) % 4) % 4, path)
+
+        if name == _CPIO_TRAILER:
+            break
+
+        target = _get_target(destination, name)
+        padding = (4 - size % 4) % 4
+
+        if install_profile.is_excluded(name, exclude):
+            pending = pending_links.pop(inode, None) if stat.S_ISREG(mode) and size else None
+
+            if not pending:
+                _read_exactly(fileobj, size + padding, path)
+
+                continue
+
+            # The data belongs to hard links which aren't excluded so the first one gets it
+            link, link_mode, link_mtime = pending[0]
+            _write_file(fileobj, link, size, link_mode, link_mtime, path, store=store)
+            _link_pending(link, pending[1:])
+            _read_exactly(fileobj, padding, path)
+
+            continue
+
+        count += 1
+
+        if stat.S_ISDIR(mode):
+            tar_extract.make_directory(target)
+            directories.append((target, mode, mtime))
+        elif stat.S_ISLNK(mode):
+            tar_extract.make_directory(os.path.dirname(target))
+            _remove_existing(target)
+            os.symlink(_read_exactly(fileobj, size, path).decode('utf-8'), target)
+        elif stat.S_ISREG(mode):
+            tar_extract.make_directory(os.path.dirname(target))
+
+            if links > 1 and not size:
+                pending_links.setdefault(inode, []).append((target, mode, mtime))
+
+                continue
+
+            _write_file(fileobj, target, size, mode, mtime, path, store=store)
+            _link_pending(target, pending_links.pop(inode, []))
+        else:
+            LOGGER.warning('Special file "%s" in "%s" was skipped.', name, path)
+            _read_exactly(fileobj, size, path)
+
+        _read_exactly(fileobj, padding, path)
+
+    # Hard links of an empty file never get an entry with data, so the file is made here
+    for links in pending_links.values():
+        target, mode, mtime = links[0]
+        _remove_existing(target)
+        open(target, 'wb').close()
+        _set_metadata(target, mode, mtime)
+        _link_pending(target, links[1:])
+
+    # Deepest folders first, so a parent's modification time isn't changed by its children
+    for target, mode, mtime in sorted(directories, reverse=True):
+        _set_metadata(target, mode, mtime)
+
+    return count
+
+
+def extract(path, destination, exclude=None, store=None):
+    '''Extract every file in the RPM at `path` into `destination`.
+
+    This is the same as `cd destination && rpm2cpio path | cpio -idm`.
+
+    Args:
+        path (str): The absolute path to some RPM file.
+        destination (str): The absolute path to the folder to extract into.
+        exclude (iterable[str], optional):
+            Install profile globs for the paths to skip. See `rezzurect.utils.install_profile`.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.RpmError`:
+            If `path` isn't a valid RPM or its payload can't be decompressed.
+
+    Returns:
+        int: The number of extracted entries.
+
+    '''
+    with open(path, 'rb') as file_:
+        if _read_exactly(file_, _LEAD_SIZE, path)[:4] != _LEAD_MAGIC:
+            raise rezzurect_exceptions.RpmError('File "{path}" is not an RPM.'.format(path=path))
+
+        _, size = _read_header(file_, path)
+        _read_exactly(file_, (8 - size % 8) % 8, path)  # The signature is padded to 8 bytes
+        tags, _ = _read_header(file_, path)
+
+        if tags.get(_PAYLOAD_FORMAT_TAG, 'cpio') != 'cpio':
+            raise rezzurect_exceptions.RpmError(
+                'RPM "{path}" has a "{format_}" payload. Only cpio is supported.'
+                ''.format(path=path, format_=tags[_PAYLOAD_FORMAT_TAG]))
+
+        decompressor = _get_decompressor(tags.get(_PAYLOAD_COMPRESSOR_TAG, 'gzip'), path)
+        count = _extract_cpio(
+            _DecompressingReader(file_, decompressor),
+            destination,
+            path,
+            exclude=exclude,
+            store=store,
+        )
+
+    LOGGER.debug('Extracted "%s" entries from "%s".', count, path)
+
+    return count
+
+
+def extract_many(paths, destination, workers=DEFAULT_WORKERS, exclude=None, store=None):
+    '''Extract several RPMs into `destination` at the same time.
+
+    Decompression releases the GIL, so each RPM is extracted on its own thread.
+
+    Args:
+        paths (iterable[str]): The absolute path to every RPM file to extract.
+        destination (str): The absolute path to the folder to extract into.
+        workers (int, optional): The most RPMs to extract at once.
+        exclude (iterable[str], optional): Install profile globs for the paths to skip.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+
+    Raises:
+        `rezzurect.utils.rezzurect_exceptions.RpmError`:
+            If any RPM failed to extract. Every failure is in the message.
+
+    '''
+    paths = list(paths)
+    errors = []
+    lock = threading.Lock()
+
+    def _extract():
+        while True:
+            with lock:
+                if not paths:
+                    return
+
+                path = paths.pop(0)
+
+            try:
+                extract(path, destination, exclude=exclude, store=store)
+            except Exception as error:  # pylint: disable=broad-except
+                LOGGER.exception('RPM "%s" failed to extract.', path)
+                errors.append('{path}: {error}'.format(path=path, error=error))
+
+    threads = [threading.Thread(target=_extract) for _ in range(max(min(workers, len(paths)), 1))]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise rezzurect_exceptions.RpmError(
+            'RPMs failed to extract. {errors}'.format(errors=' '.join(sorted(errors))))
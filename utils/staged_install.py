@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Make an install in a hidden folder and move it into place once it's finished.
+
+An install which fails (or whose process is killed) part-way through would
+otherwise leave a half-made install folder, which later builds either trust
+or have to scan and clean up. Instead, each install is made in a "stage", a
+hidden folder beside the install folder (so that it's on the same file
+system). Once the install succeeds, a completion marker is written into the
+stage and the stage is renamed to the install folder in one step.
+
+The install folder may already hold files which something else wrote, such
+as the package.py that Rez writes before the build runs. The whole folder
+is only swapped if it's missing, empty, or holds nothing but an earlier
+finished install (the marker lists the names which each install made).
+Otherwise, only the stage's files are moved into it and the rest are left
+alone.
+
+    /packages/nuke_installation/.11.2v3.node-01_4242_1537217563.stage  # An install in progress
+    /packages/nuke_installation/11.2v3/.rezzurect_complete             # A finished install
+
+Each stage is locked while its install runs. A stage whose lock is free
+was abandoned by a process which crashed, or whose install failed, and it's
+deleted on a background thread by the next install into the same folder.
+Stages which were made by another host can't be checked with a lock so
+they're only deleted once they're older than `EXPIRATION`.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import threading
+import platform
+import logging
+import shutil
+import errno
+import json
+import time
+import os
+import re
+
+# IMPORT LOCAL LIBRARIES
+from . import filelock
+
+
+MARKER_NAME = '.rezzurect_complete'
+EXPIRATION = 24 * 60 * 60
+_STAGE_SUFFIX = '.stage'
+_RETIRED_SUFFIX = '.retired'
+_LOCK_SUFFIX = '.lock'
+_STAGE_EXPRESSION = re.compile(
+    r'^\.(?P<name>.+)\.(?P<host>[^._]+)_(?P<pid>\d+)_\d+\.(?P<kind>stage|retired)$')
+LOGGER = logging.getLogger('rezzurect.staged_install')
+
+
+def _get_host():
+    '''str: The name of this machine, without any "." or "_" which stage names rely on.'''
+    return re.sub(r'[._]', '-', platform.node() or 'localhost')
+
+
+def _remove_folder(path):
+    '''Delete a stage (or a retired install) and its lock file.'''
+    LOGGER.debug('Removing abandoned folder "%s".', path)
+    shutil.rmtree(path, ignore_errors=True)
+
+    try:
+        os.remove(path + _LOCK_SUFFIX)
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            LOGGER.debug('Lock file of "%s" could not be removed. %s', path, error)
+
+
+def _is_abandoned(path):
+    '''bool: Check if `path` is a retired install or a stage which nothing installs into.'''
+    match = _STAGE_EXPRESSION.match(os.path.basename(path))
+
+    if not match:
+        return False
+
+    if match.group('kind') == 'retired':
+        return True
+
+    if match.group('host') != _get_host():
+        try:
+            return time.time() - os.path.getmtime(path) > EXPIRATION
+        except OSError:
+            return False
+
+    lock = filelock.FileLock(path + _LOCK_SUFFIX)
+
+    if not lock.acquire(blocking=False):
+        return False
+
+    lock.release()
+
+    return True
+
+
+def clean(install):
+    '''Delete every abandoned stage and retired install beside the install folder, `install`.
+
+    Args:
+        install (str): The absolute path to some install folder.
+
+    Returns:
+        list[str]: The absolute path to every deleted folder.
+
+    '''
+    install = os.path.normpath(install)
+    parent = os.path.dirname(install)
+    removed = []
+
+    try:
+        names = os.listdir(parent)
+    except OSError:
+        return removed
+
+    for name in names:
+        match = _STAGE_EXPRESSION.match(name)
+
+        if not match or match.group('name') != os.path.basename(install):
+            continue
+
+        path = os.path.join(parent, name)
+
+        if _is_abandoned(path):
+            _remove_folder(path)
+            removed.append(path)
+
+    return removed
+
+
+def clean_in_background(install):
+    '''`threading.Thread`: Run `clean` without waiting for it to finish.'''
+    thread = threading.Thread(target=clean, args=(install, ))
+    thread.daemon = True  # An unfinished clean-up is just picked up by the next install
+    thread.start()
+
+    return thread
+
+
+def get_target(path):
+    '''str: The install folder which the stage at `path` is for, or `path`, if it's not a stage.'''
+    path = os.path.normpath(path)
+    match = _STAGE_EXPRESSION.match(os.path.basename(path))
+
+    if not match or match.group('kind') != 'stage':
+        return path
+
+    return os.path.join(os.path.dirname(path), match.group('name'))
+
+
+def is_complete(install):
+    '''bool: Check if the install folder, `install`, was moved into place by a finished stage.'''
+    return os.path.isfile(os.path.join(install, MARKER_NAME))
+
+
+def _read_names(install):
+    '''Get the names which a finished stage moved into the install folder, `install`.
+
+    Returns:
+        set[str] or NoneType: The names or None, if `install` has no marker or it lists nothing.
+
+    '''
+    try:
+        with open(os.path.join(install, MARKER_NAME), 'r') as file_:
+            return set(json.load(file_)['names']) | {MARKER_NAME}
+    except (IOError, ValueError, KeyError, TypeError):  # Older markers only hold a time
+        return None
+
+
+class Stage(object):
+
+    '''A hidden folder which an install is made in, before it's moved into place.
+
+    Example:
+        >>> with Stage('/packages/nuke_installation/11.2v3') as stage:
+        ...     adapter.install_from_local(source, stage.path)
+
+    '''
+
+    def __init__(self, install):
+        '''Create the instance.
+
+        Args:
+            install (str): The absolute path to the install folder to make.
+
+        '''
+        super(Stage, self).__init__()
+
+        self.install = os.path.normpath(install)
+        self.path = os.path.join(
+            os.path.dirname(self.install),
+            '.{name}.{host}_{pid}_{time}{suffix}'.format(
+                name=os.path.basename(self.install),
+                host=_get_host(),
+                pid=os.getpid(),
+                time=int(time.time() * 1000),
+                suffix=_STAGE_SUFFIX,
+            ),
+        )
+        self._lock = filelock.FileLock(self.path + _LOCK_SUFFIX)
+
+    def start(self):
+        '''Make and lock the stage folder and clean up older stages in the background.'''
+        self._lock.acquire()
+        os.makedirs(self.path)
+        clean_in_background(self.install)
+
+        LOGGER.debug('Staging the install of "%s" in "%s".', self.install, self.path)
+
+    def commit(self):
+        '''Mark the stage as finished and move it into place as the install folder.
+
+        An install folder which is missing, empty or holds only an earlier
+        finished install is swapped for the stage in one rename. The earlier
+        install is deleted in the background.
+
+        An install folder which holds anything else only has the names
+        which the stage made (and those which the earlier install made)
+        replaced. Everything else in it is left alone.
+
+        '''
+        names = sorted(os.listdir(self.path))
+
+        with open(os.path.join(self.path, MARKER_NAME), 'w') as file_:
+            json.dump({'created': time.time(), 'names': names}, file_, sort_keys=True)
+
+        retired = self.path[:-len(_STAGE_SUFFIX)] + _RETIRED_SUFFIX
+
+        try:
+            existing = set(os.listdir(self.install))
+        except OSError:
+            existing = set()
+
+        owned = _read_names(self.install)
+
+        if existing and (owned is None or not existing.issubset(owned)):
+            if not owned:
+                owned = {MARKER_NAME} if MARKER_NAME in existing else set()
+
+            self._merge(existing, owned | set(names), retired)
+        else:
+            self._swap(retired)
+
+        self._release()
+
+        if os.path.isdir(retired):
+            clean_in_background(self.install)
+
+        LOGGER.info('Committed the install of "%s".', self.install)
+
+    def _swap(self, retired):
+        '''Rename the stage to the install folder, after moving any earlier install to `retired`.'''
+        if os.path.isdir(self.install):
+            os.rename(self.install, retired)
+
+        try:
+            os.rename(self.path, self.install)
+        except OSError:
+            if os.path.isdir(retired):
+                os.rename(retired, self.install)
+
+            raise
+
+    def _merge(self, existing, replaced, retired):
+        '''Move the stage's contents into an install folder which has other files.
+
+        Args:
+            existing (set[str]): Every name in the install folder.
+            replaced (set[str]): The names in the install folder which may be replaced.
+            retired (str): The folder which replaced files are moved into, to be deleted later.
+
+        '''
+        LOGGER.debug('Folder "%s" has other files. Only staged files are moved in.', self.install)
+
+        os.makedirs(retired)
+
+        # The marker is moved out first and in last, so the folder is never complete part-way
+        for name in sorted(existing & replaced, key=lambda name: name != MARKER_NAME):
+            os.rename(os.path.join(self.install, name), os.path.join(retired, name))
+
+        for name in sorted(os.listdir(self.path), key=lambda name: name == MARKER_NAME):
+            os.rename(os.path.join(self.path, name), os.path.join(self.install, name))
+
+        os.rmdir(self.path)
+
+    def abandon(self):
+        '''Give up on the stage. It's deleted in the background.'''
+        self._release()
+        clean_in_background(self.install)
+
+        LOGGER.info('Abandoned the staged install of "%s".', self.install)
+
+    def _release(self):
+        '''Unlock the stage and delete its lock file.'''
+        self._lock.release()
+
+        try:
+            os.remove(self._lock.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        '''Start the stage and return this instance.'''
+        self.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        '''Commit the stage, unless an exception was raised. Then, abandon it.'''
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abandon()
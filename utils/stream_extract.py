@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Extract a TAR archive while it downloads, without saving the archive first.
+
+The HTTP response is given directly to `tarfile`'s stream mode ("r|*") so
+members are written to disk as soon as their bytes arrive. If the archive
+must also be kept (for the archive cache, for example), the downloaded bytes
+can be "tee"-ed into a file at the same time.
+
+Members are extracted into a hidden staging folder which is only moved into
+place once the whole archive has been read. That way, an interrupted stream
+never leaves a half-extracted folder which later installs would trust.
+If an expected sha256 digest is given, the archive is hashed as it streams
+and the staging folder is only moved into place if the digest matches.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import hashlib
+import logging
+import tarfile
+import shutil
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import rezzurect_exceptions
+from . import tar_extract
+from . import checksum
+from ..vendors import six
+
+
+DEFAULT_TIMEOUT = 30
+LOGGER = logging.getLogger('rezzurect.stream_extract')
+
+
+class TeeReader(object):
+
+    '''A file-like object which copies and hashes everything that is read from it.'''
+
+    def __init__(self, fileobj, tee=None, reporthook=None, total=None, throttle=None):
+        '''Create the instance.
+
+        Args:
+            fileobj (file-like):
+                The object to read from. Usually, a urllib response.
+            tee (file-like, optional):
+                An open, writable file which gets a copy of every read byte.
+            reporthook (callable[int, int, int], optional):
+                A function in the same style as `urllib.urlretrieve`'s reporthook.
+            total (int, optional):
+                The expected number of bytes, if known.
+            throttle (`rezzurect.utils.bandwidth.Throttle`, optional):
+                A bandwidth limit which every read counts against.
+
+        '''
+        super(TeeReader, self).__init__()
+
+        self._fileobj = fileobj
+        self._tee = tee
+        self._reporthook = reporthook
+        self._throttle = throttle
+        self.hasher = hashlib.sha256()
+        self.completed = 0
+        self.total = total
+
+    def read(self, size=-1):
+        '''Read up to `size` bytes and copy them into the tee file.'''
+        data = self._fileobj.read(size)
+
+        if not data:
+            return data
+
+        if self._throttle:
+            self._throttle.consume(len(data))
+
+        if self._tee:
+            self._tee.write(data)
+
+        self.hasher.update(data)
+        self.completed += len(data)
+
+        if self._reporthook and self.total:
+            self._reporthook(self.completed, 1, self.total)
+
+        return data
+
+
+def _move_children(source, destination):
+    '''Move everything in the `source` folder into the `destination` folder.'''
+    if not os.path.isdir(destination):
+        os.makedirs(destination)
+
+    for name in os.listdir(source):
+        target = os.path.join(destination, name)
+
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target)
+        elif os.path.lexists(target):
+            os.remove(target)
+
+        os.rename(os.path.join(source, name), target)
+
+
+def extract_tar_stream(fileobj, destination, before_commit=None, include=None):
+    '''Extract a TAR archive from a file-like object which can only be read forwards.
+
+    Args:
+        fileobj (file-like):
+            The compressed or uncompressed TAR data.
+        destination (str):
+            The absolute path to the folder to extract into.
+        before_commit (callable, optional):
+            A function which runs after every member is extracted but before
+            they're moved into `destination`. If it raises an exception,
+            nothing is moved.
+        include (iterable[str], optional):
+            `fnmatch` patterns for the file names of the members to extract.
+            See `rezzurect.utils.tar_extract.is_included`. Default: Every member.
+
+    '''
+    parent = os.path.dirname(os.path.normpath(destination))
+    staging = os.path.join(
+        parent,
+        '.{name}.{pid}.stream'.format(name=os.path.basename(destination), pid=os.getpid()),
+    )
+
+    if os.path.isdir(staging):
+        shutil.rmtree(staging)
+
+    os.makedirs(staging)
+
+    try:
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+            tar.extractall(
+                path=staging,
+                members=(member for member in tar if tar_extract.is_included(member, include)),
+            )
+
+        if before_commit:
+            before_commit()
+
+        _move_children(staging, destination)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def extract_url(url, destination, tee_path='', timeout=DEFAULT_TIMEOUT, reporthook=None,
+                size=None, sha256='', throttle=None, include=None):
+    '''Download a TAR archive from `url` and extract it while it downloads.
+
+    Args:
+        url (str):
+            The address of some TAR archive.
+        destination (str):
+            The absolute path to the folder to extract into.
+        tee_path (str, optional):
+            If given, the archive is also saved to this path.
+        timeout (int, optional):
+            The number of seconds before an unresponsive connection gives up.
+        reporthook (callable[int, int, int], optional):
+            A function in the same style as `urllib.urlretrieve`'s reporthook.
+        size (int, optional):
+            The expected size of the archive, if known.
+        sha256 (str, optional):
+            The expected sha256 hex digest of the archive, if known.
+        throttle (`rezzurect.utils.bandwidth.Throttle`, optional):
+            A bandwidth limit which this download shares with other downloads.
+        include (iterable[str], optional):
+            `fnmatch` patterns for the file names of the members to extract. Default: Every member.
+
+    Raises:
+        RuntimeError:
+            If the download was interrupted.
+        `rezzurect.utils.rezzurect_exceptions.ChecksumError`:
+            If the archive doesn't match `size` or `sha256`.
+
+    Returns:
+        str: The sha256 hex digest of the downloaded archive.
+
+    '''
+    LOGGER.debug('Streaming "%s" into "%s".', url, destination)
+
+    response = six.moves.urllib.request.urlopen(url, timeout=timeout)
+    length = response.info().get('Content-Length', '') or ''
+    total = int(length) if length.isdigit() else None
+    part_path = tee_path + '.part' if tee_path else ''
+    tee = open(part_path, 'wb') if part_path else None
+    reader = TeeReader(response, tee=tee, reporthook=reporthook, total=total, throttle=throttle)
+
+    def _verify():
+        # Read whatever trails the end of the TAR archive, so that the tee
+        # is complete and the digest covers the whole file
+        #
+        while reader.read(1024 * 1024):
+            pass
+
+        if total is not None and reader.completed != total:
+            raise RuntimeError('Download was interrupted')
+
+        checksum.verify_digest(
+            url, reader.completed, reader.hasher.hexdigest(), size=size, sha256=sha256)
+
+    try:
+        try:
+            extract_tar_stream(reader, destination, before_commit=_verify, include=include)
+        finally:
+            response.close()
+
+            if tee:
+                tee.close()
+    except rezzurect_exceptions.ChecksumError:
+        if part_path and os.path.isfile(part_path):
+            os.remove(part_path)
+
+        raise
+    except (tarfile.TarError, EOFError, IOError, OSError, RuntimeError,
+            six.moves.http_client.HTTPException):
+        LOGGER.exception('Archive "%s" failed to stream.', url)
+
+        if part_path and os.path.isfile(part_path):
+            os.remove(part_path)
+
+        raise RuntimeError('Download was interrupted')
+
+    if part_path:
+        if os.name == 'nt' and os.path.isfile(tee_path):
+            os.remove(tee_path)
+
+        os.rename(part_path, tee_path)
+
+    return reader.hasher.hexdigest()
@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Extract a TAR archive using one decompression thread and a pool of writers.
+
+`tarfile.TarFile.extractall` does everything on one thread. On network file
+systems, most of its time is spent waiting on each file's open, write,
+chmod, and utime calls, one after another.
+
+Here, the calling thread only reads (and decompresses) the archive, in
+order. Small files are read into memory and handed to a bounded pool of
+worker threads, which write them and set their metadata. Large files are
+written by the calling thread so that memory use stays bounded.
+
+Like `extractall`, directories are created as they're found but their
+permissions and modification times are applied once, at the end.
+Hard links wait for every pending write to finish so that their targets exist.
+A hard link whose target was filtered out (by `include` or `exclude`) gets
+the target's data instead. The archive is read a second time to find it or,
+if it can't be read again, filtered files are kept in a temporary folder
+until the extraction is done.
+
+A manifest of the extracted files can be written from the TAR headers, and
+files which are unchanged since an installed sibling can be linked from it
+instead of being written. See `rezzurect.utils.delta_install`.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import threading
+import tempfile
+import hashlib
+import tarfile
+import fnmatch
+import logging
+import shutil
+import errno
+import stat
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import install_profile
+from . import delta_install
+from ..vendors import six
+
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_WORKERS = 8
+SMALL_FILE_SIZE = 4 * 1024 * 1024
+LOGGER = logging.getLogger('rezzurect.tar_extract')
+
+
+def _is_root():
+    '''bool: Check if the current user can change file ownership.'''
+    return hasattr(os, 'geteuid') and os.geteuid() == 0
+
+
+def make_directory(path):
+    '''Create `path` if it doesn't exist yet.'''
+    try:
+        os.makedirs(path)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+
+def _remove_existing(path):
+    '''Delete the file or link at `path` so that it can be replaced, like `extractall` does.'''
+    if os.path.islink(path) or os.path.isfile(path):
+        os.remove(path)
+
+
+def set_metadata(member, path):
+    '''Apply the owner, permissions, and modification time of `member` to `path`.'''
+    if _is_root() and hasattr(os, 'lchown'):
+        try:
+            os.lchown(path, member.uid, member.gid)
+        except OSError:
+            LOGGER.debug('Ownership of "%s" could not be set.', path)
+
+    if not member.issym():
+        os.chmod(path, member.mode)
+        os.utime(path, (member.mtime, member.mtime))
+
+
+def _write_file(member, path, data, store=None):
+    '''Write a small file and apply its metadata. This runs on a worker thread.'''
+    _remove_existing(path)
+
+    with open(path, 'wb') as file_:
+        file_.write(data)
+
+    set_metadata(member, path)
+
+    if store:
+        store.add(path, hashlib.sha256(data).hexdigest())
+
+
+def _copy_file(member, source, path, store=None):
+    '''Write a large file from the archive, hashing it as it's written, and apply its metadata.
+
+    Returns:
+        str: The sha256 hex digest of the written file.
+
+    '''
+    _remove_existing(path)
+    hasher = hashlib.sha256()
+
+    with open(path, 'wb') as file_:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            file_.write(chunk)
+            hasher.update(chunk)
+
+    set_metadata(member, path)
+
+    if store:
+        store.add(path, hasher.hexdigest())
+
+    return hasher.hexdigest()
+
+
+class _WriterPool(object):
+
+    '''A bounded queue of file writes and the worker threads which run them.'''
+
+    def __init__(self, workers, store=None):
+        '''Create the instance and start its threads.
+
+        Args:
+            workers (int):
+                The number of threads which write files.
+            store (`rezzurect.utils.file_store.FileStore`, optional):
+                If given, every written file is shared with this store.
+
+        '''
+        super(_WriterPool, self).__init__()
+
+        self._store = store
+
+        # Each queued write holds up to `SMALL_FILE_SIZE` bytes so the queue
+        # is bounded to keep memory use in check
+        #
+        self._queue = six.moves.queue.Queue(maxsize=workers * 2)
+        self._threads = [threading.Thread(target=self._run) for _ in range(workers)]
+        self.errors = []
+
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _run(self):
+        '''Write queued files until `None` is queued.'''
+        while True:
+            job = self._queue.get()
+
+            try:
+                if job is None:
+                    return
+
+                if not self.errors:
+                    _write_file(*job, store=self._store)
+            except Exception as error:  # pylint: disable=broad-except
+                LOGGER.exception('Member "%s" failed to extract.', job[0].name)
+                self.errors.append(error)
+            finally:
+                self._queue.task_done()
+
+    def add(self, member, path, data):
+        '''Queue a file to be written, waiting if the queue is full.'''
+        self._queue.put((member, path, data))
+
+    def wait(self):
+        '''Block until every queued file is written.'''
+        self._queue.join()
+
+    def close(self):
+        '''Stop every worker thread, after the queued files are written.'''
+        for _ in self._threads:
+            self._queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+
+def _extract_link(member, path, destination, pool):
+    '''Create a symbolic or hard link, like `extractall` does.'''
+    _remove_existing(path)
+
+    if member.issym():
+        os.symlink(member.linkname, path)
+        set_metadata(member, path)
+
+        return
+
+    # A hard link's target must be written before it can be linked to
+    pool.wait()
+    target = os.path.join(destination, member.linkname)
+
+    try:
+        os.link(target, path)
+    except (AttributeError, OSError):  # `os.link` doesn't exist for Python 2 on Windows
+        shutil.copy2(target, path)
+
+    set_metadata(member, path)
+
+
+def _is_seekable(fileobj):
+    '''bool: Check if `fileobj` can be read again, from the start.'''
+    if not hasattr(fileobj, 'seekable'):
+        # Python 2 files
+        try:
+            fileobj.tell()
+        except (AttributeError, IOError, OSError, ValueError):
+            return False
+
+        return True
+
+    try:
+        return fileobj.seekable()
+    except Exception:  # pylint: disable=broad-except
+        # A member of a streamed TAR archive raises `AttributeError`
+        return False
+
+
+def _link_copies(paths):
+    '''Make every path in `paths` a hard link to the first one, which must exist.'''
+    for path in paths[1:]:
+        _remove_existing(path)
+
+        try:
+            os.link(paths[0], path)
+        except (AttributeError, OSError):  # `os.link` doesn't exist for Python 2 on Windows
+            shutil.copy2(paths[0], path)
+
+
+def _extract_spooled(spooled, orphans, store=None):
+    '''Move filtered-out files, which were kept aside, to the hard links which need them.
+
+    Args:
+        spooled (dict[str, tuple[str, str]]):
+            The name of each filtered-out member, the temporary path that it
+            was written to, and its sha256 hex digest.
+        orphans (dict[str, list[str]]):
+            The name of each filtered-out member and the absolute path of every
+            hard link to it.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every written file is shared with this store.
+
+    '''
+    for name, paths in orphans.items():
+        source, digest = spooled[name]
+        _remove_existing(paths[0])
+        shutil.move(source, paths[0])
+
+        if store:
+            store.add(paths[0], digest)
+
+        _link_copies(paths)
+
+
+def _extract_orphans(fileobj, orphans, store=None):
+    '''Write the data of files which were filtered out, as the hard links which need it.
+
+    Args:
+        fileobj (file-like):
+            The TAR data which was just extracted. It's read again from the start.
+        orphans (dict[str, list[str]]):
+            The name of each filtered-out member and the absolute path of every
+            hard link to it.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every written file is shared with this store.
+
+    '''
+    try:
+        fileobj.seek(0)
+    except (AttributeError, IOError, OSError, ValueError):
+        for name, paths in orphans.items():
+            LOGGER.warning(
+                'Hard links "%s" were skipped. "%s" could not be read again.', paths, name)
+
+        return
+
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            paths = orphans.pop(member.name, None) if member.isreg() else None
+
+            if not paths:
+                continue
+
+            _copy_file(member, tar.extractfile(member), paths[0], store=store)
+            _link_copies(paths)
+
+            if not orphans:
+                break
+
+
+def get_name(member):
+    '''str: The relative path of a member, using "/" separators, as its manifest lists it.'''
+    return '/'.join(part for part in member.name.replace('\\', '/').split('/')
+                    if part not in ('', os.curdir))
+
+
+def get_entry(member):
+    '''dict[str, int]: The manifest entry of a regular file member. See `delta_install`.'''
+    return {'mode': stat.S_IMODE(member.mode), 'modified': int(member.mtime), 'size': member.size}
+
+
+def get_route(route):
+    '''tuple[str, str, list[str] or NoneType, str]: Fill in the optional parts of a route.
+
+    See `extract_nested`.
+
+    '''
+    exclude = route[2] if len(route) > 2 else None
+    sibling = route[3] if len(route) > 3 else ''
+
+    return (route[0], route[1], exclude, sibling)
+
+
+def is_excluded(member, exclude):
+    '''bool: Check if `member` is excluded.
+
+    A hard link isn't excluded by its target. It needs the target's data instead.
+
+    '''
+    return install_profile.is_excluded(member.name, exclude)
+
+
+def is_included(member, include):
+    '''Check if a member should be extracted.
+
+    Args:
+        member (`tarfile.TarInfo`):
+            Some member of a TAR archive.
+        include (iterable[str] or NoneType):
+            `fnmatch` patterns for the file names of the members to extract.
+            If there are none, every member is extracted.
+
+    Returns:
+        bool: If `member` is a folder, it's only included when `include` is empty.
+
+    '''
+    if not include:
+        return True
+
+    if member.isdir():
+        return False
+
+    name = os.path.basename(member.name)
+
+    return any(fnmatch.fnmatch(name, pattern) for pattern in include)
+
+
+def extract(fileobj, destination, workers=DEFAULT_WORKERS, callback=None, include=None,
+            exclude=None, store=None, sibling='', manifest=False):
+    '''Extract the TAR archive in `fileobj` to the `destination` folder.
+
+    Args:
+        fileobj (file-like):
+            The compressed or uncompressed TAR data. It's only read forwards.
+        destination (str):
+            The absolute path to the folder to extract into.
+        workers (int, optional):
+            The number of threads which write files and set their metadata.
+        callback (callable[`tarfile.TarInfo`], optional):
+            A function which is given every member, in archive order.
+        include (iterable[str], optional):
+            `fnmatch` patterns for the file names of the members to extract.
+            Any other member is skipped without being written. The folders
+            of included members are made as needed. Default: Every member.
+        exclude (iterable[str], optional):
+            Install profile globs for the paths to skip, along with anything
+            inside of them. See `rezzurect.utils.install_profile`.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is hashed as it's written and
+            shared with the files in this store.
+        sibling (str, optional):
+            The install folder of another version whose unchanged files are
+            linked instead of written. See `rezzurect.utils.delta_install`.
+        manifest (bool, optional):
+            If True, a manifest of the extracted files is written into `destination`.
+
+    Raises:
+        Exception: The first error that any member raised while it was extracted.
+
+    Returns:
+        dict[str, dict[str, int]]: The manifest entry of every regular file which was extracted.
+
+    '''
+    directories = []
+    known_directories = set()
+    previous = delta_install.read_manifest(sibling) if sibling else dict()
+    entries = dict()
+    linked = 0
+    filtered = set()  # The regular files which `include` or `exclude` skipped
+    orphans = dict()  # Each of those files and the hard links which need its data
+    spooled = dict()  # Filtered files which were kept aside, if `fileobj` can't be read again
+    spooling = not _is_seekable(fileobj)
+    spool = ''
+    pool = _WriterPool(max(workers, 1), store=store)
+
+    def _make_parent(path):
+        parent = os.path.dirname(path)
+
+        if parent not in known_directories:
+            make_directory(parent)
+            known_directories.add(parent)
+
+    try:
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+            for member in tar:
+                if pool.errors:
+                    break
+
+                if callback:
+                    callback(member)
+
+                if is_excluded(member, exclude) or not is_included(member, include):
+                    if member.isreg():
+                        filtered.add(member.name)
+
+                    if member.isreg() and spooling and not spool:
+                        make_directory(destination)
+                        spool = tempfile.mkdtemp(prefix='.filtered_', dir=destination)
+
+                    if member.isreg() and spooling:
+                        path = os.path.join(spool, str(len(spooled)))
+                        spooled[member.name] = (
+                            path, _copy_file(member, tar.extractfile(member), path))
+
+                    continue
+
+                path = os.path.join(destination, member.name)
+
+                if member.isdir():
+                    make_directory(path)
+                    known_directories.add(path.rstrip(os.sep))
+                    directories.append((member, path))
+
+                    continue
+
+                _make_parent(path)
+
+                if member.islnk() and member.linkname in filtered:
+                    orphans.setdefault(member.linkname, []).append(path)
+
+                    continue
+
+                if member.issym() or member.islnk():
+                    _extract_link(member, path, destination, pool)
+
+                    continue
+
+                if not member.isreg():
+                    # Devices and FIFOs are rare, so `tarfile` handles them
+                    pool.wait()
+                    tar.extract(member, path=destination)
+
+                    continue
+
+                name = get_name(member)
+                entries[name] = get_entry(member)
+
+                if previous and delta_install.link_file(
+                        name, entries[name], previous, sibling, destination):
+                    linked += 1
+                elif member.size <= SMALL_FILE_SIZE:
+                    pool.add(member, path, tar.extractfile(member).read())
+                else:
+                    _copy_file(member, tar.extractfile(member), path, store=store)
+
+            pool.wait()
+
+        if pool.errors:
+            raise pool.errors[0]
+
+        if orphans and spool:
+            _extract_spooled(spooled, orphans, store=store)
+        elif orphans:
+            _extract_orphans(fileobj, orphans, store=store)
+    finally:
+        pool.close()
+
+        if spool:
+            shutil.rmtree(spool, ignore_errors=True)
+
+    # Deepest folders first, so a parent's modification time isn't changed by its children
+    for member, path in sorted(directories, key=lambda item: item[1], reverse=True):
+        set_metadata(member, path)
+
+    LOGGER.debug('Extracted "%s" directories into "%s".', len(directories), destination)
+
+    if sibling:
+        LOGGER.info('Linked "%s" of "%s" files from "%s".', linked, len(entries), sibling)
+
+    if manifest:
+        delta_install.write_manifest(destination, entries)
+
+    return entries
+
+
+def extract_nested(fileobj, routes, workers=DEFAULT_WORKERS, store=None, manifest=False):
+    '''Extract TAR archives which are inside of another TAR archive, without writing them to disk.
+
+    The outer archive is read once, front to back. Each inner archive is
+    decompressed straight out of the outer archive's stream. Members which
+    match no route are skipped.
+
+    Args:
+        fileobj (file-like):
+            The compressed or uncompressed outer TAR data. It's only read forwards.
+        routes (iterable[tuple[str, str, list[str], str]]):
+            An `fnmatch` pattern for the file name of some inner archive,
+            the absolute path to the folder to extract it into and,
+            optionally, install profile globs to exclude from it and the
+            folder of an installed sibling to link unchanged files from.
+            Example: [("python*.tar.gz", "/install/python", ["*/test"])].
+        workers (int, optional):
+            The number of threads which write files and set their metadata.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with the files in this store.
+        manifest (bool, optional):
+            If True, a manifest is written into each route's folder. Inner
+            archives which share a folder share one manifest.
+
+    Returns:
+        list[str]: The name of every inner archive which was extracted.
+
+    '''
+    extracted = []
+    manifests = dict()
+
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            if not member.isreg():
+                continue
+
+            name = os.path.basename(member.name)
+
+            for route in routes:
+                pattern, destination, exclude, sibling = get_route(route)
+
+                if fnmatch.fnmatch(name, pattern):
+                    LOGGER.debug(
+                        'Extracting inner archive "%s" into "%s".', member.name, destination)
+                    entries = extract(
+                        tar.extractfile(member),
+                        destination,
+                        workers=workers,
+                        exclude=exclude,
+                        store=store,
+                        sibling=sibling,
+                    )
+                    manifests.setdefault(destination, dict()).update(entries)
+                    extracted.append(member.name)
+
+                    break
+
+    if manifest:
+        for destination, entries in manifests.items():
+            delta_install.write_manifest(destination, entries)
+
+    return extracted
@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Extract a ZIP archive using a pool of processes.
+
+Unlike a TAR archive, every member of a ZIP archive is compressed on its own
+and the central directory, at the end of the file, says where each one is.
+So the central directory is read once, the files are divided into batches of
+a similar total size, and each batch is inflated by a separate process which
+opens its own handle to the archive.
+
+`zipfile.ZipFile.extractall` also drops the Unix permission bits which are
+stored in each member's `external_attr`. They're restored here, so
+executables stay executable, and Unix symbolic links are made as links
+instead of as files which contain the link's target.
+
+A ZIP archive which is itself a member of a TAR archive can be extracted
+without writing it to disk, using `extract_from_tar`. It's spooled into
+anonymous memory (or, past a memory limit, an unlinked temporary file)
+and inflated from there by a pool of threads.
+
+'''
+
+# IMPORT STANDARD LIBRARIES
+import multiprocessing
+import threading
+import posixpath
+import tempfile
+import zipfile
+import fnmatch
+import hashlib
+import logging
+import tarfile
+import heapq
+import mmap
+import stat
+import os
+
+# IMPORT LOCAL LIBRARIES
+from . import install_profile
+from . import delta_install
+from . import tar_extract
+
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 512 * 1024 * 1024
+_UNIX_SYSTEM = 3  # The `zipfile.ZipInfo.create_system` of archives which were made on Unix
+LOGGER = logging.getLogger('rezzurect.zip_extract')
+
+
+def _get_mode(info):
+    '''int: The Unix mode of some ZIP member or 0, if the archive wasn't made on Unix.'''
+    if info.create_system != _UNIX_SYSTEM:
+        return 0
+
+    return info.external_attr >> 16
+
+
+def _split(infos, count):
+    '''Divide ZIP members into `count` batches with a similar total size.
+
+    The largest members are placed first, each into the batch which is
+    currently the smallest.
+
+    Returns:
+        list[list[str]]: The names of the members in each batch. Empty batches are omitted.
+
+    '''
+    batches = [(0, index, []) for index in range(max(count, 1))]
+
+    for info in sorted(infos, key=lambda info: info.file_size, reverse=True):
+        size, index, names = heapq.heappop(batches)
+        names.append(info.filename)
+        heapq.heappush(batches, (size + info.file_size, index, names))
+
+    return [names for _, _, names in sorted(batches, key=lambda batch: batch[1]) if names]
+
+
+def _get_name(info):
+    '''str: The relative path of a member, using "/". Like `zipfile`, it can't escape its folder.'''
+    name = os.path.splitdrive(info.filename.replace('\\', '/'))[1]
+
+    return '/'.join(part for part in name.split('/') if part not in ('', os.curdir, os.pardir))
+
+
+def _get_target(info, destination):
+    '''str: The absolute path where a member is extracted to, inside of `destination`.'''
+    return os.path.join(destination, *_get_name(info).split('/'))
+
+
+def _get_entries(files):
+    '''dict[str, dict[str, int]]: The manifest entry of each file. See `delta_install`.'''
+    return {
+        _get_name(info): {
+            'crc': info.CRC,
+            'mode': stat.S_IMODE(_get_mode(info)),
+            'size': info.file_size,
+        }
+        for info in files if not stat.S_ISLNK(_get_mode(info))
+    }
+
+
+def _link_unchanged(files, destination, sibling):
+    '''list[`zipfile.ZipInfo`]: Link the files which are unchanged since `sibling`. Get the rest.'''
+    if not sibling:
+        return files
+
+    linked = delta_install.link_unchanged(_get_entries(files), sibling, destination)
+
+    return [info for info in files if _get_name(info) not in linked]
+
+
+def extract_member(zip_file, info, destination, store=None):
+    '''Extract one file or link and restore its Unix permissions.
+
+    Args:
+        zip_file (`zipfile.ZipFile`):
+            The opened archive.
+        info (`zipfile.ZipInfo`):
+            The member to extract.
+        destination (str):
+            The absolute path to the folder to extract into.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, the file is hashed as it's written and shared with this store.
+
+    '''
+    mode = _get_mode(info)
+    path = _get_target(info, destination)
+    tar_extract.make_directory(os.path.dirname(path))
+
+    # An existing file may be a hardlink which other installs share, so it's never overwritten
+    if os.path.islink(path) or os.path.isfile(path):
+        os.remove(path)
+
+    if stat.S_ISLNK(mode) and hasattr(os, 'symlink'):
+        os.symlink(zip_file.read(info).decode('utf-8'), path)
+
+        return
+
+    hasher = hashlib.sha256()
+    source = zip_file.open(info)
+
+    try:
+        with open(path, 'wb') as file_:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                file_.write(chunk)
+                hasher.update(chunk)
+    finally:
+        source.close()
+
+    if stat.S_IMODE(mode):
+        os.chmod(path, stat.S_IMODE(mode))
+
+    if store:
+        store.add(path, hasher.hexdigest())
+
+
+def _extract_batch(arguments):
+    '''Extract some members of a ZIP archive. This runs in a separate process.
+
+    Args:
+        arguments (tuple[str, str, list[str], `rezzurect.utils.file_store.FileStore`]):
+            The path to the archive, the folder to extract into, the names
+            of every member to extract, and the store to share files with, if any.
+
+    Returns:
+        int: The number of extracted members.
+
+    '''
+    path, destination, names, store = arguments
+
+    with zipfile.ZipFile(path, 'r') as zip_file:
+        for name in names:
+            extract_member(zip_file, zip_file.getinfo(name), destination, store=store)
+
+    return len(names)
+
+
+class _PositionalReader(object):
+
+    '''A read-only, seekable file which has its own position in some shared data.
+
+    Every thread gets its own reader so that they never move each other's position.
+
+    '''
+
+    def __init__(self, read_at, size):
+        '''Create the instance.
+
+        Args:
+            read_at (callable[int, int] -> bytes):
+                A function which returns the bytes at some offset, up to some count.
+            size (int):
+                The total number of bytes in the shared data.
+
+        '''
+        super(_PositionalReader, self).__init__()
+
+        self._read_at = read_at
+        self._position = 0
+        self._size = size
+
+    def read(self, size=-1):
+        '''bytes: Read up to `size` bytes from the current position.'''
+        if size is None or size < 0:
+            size = self._size - self._position
+
+        data = self._read_at(self._position, min(size, self._size - self._position))
+        self._position += len(data)
+
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        '''Move the position, like `file.seek`.'''
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+
+        self._position = max(offset, 0)
+
+        return self._position
+
+    def tell(self):
+        '''int: The current position.'''
+        return self._position
+
+    @staticmethod
+    def seekable():
+        '''bool: Every reader can seek.'''
+        return True
+
+    def close(self):
+        '''Do nothing. The shared data is closed by whoever created it.'''
+        pass
+
+
+def get_file_reader(file_, start=0):
+    '''Make a positional read function for an open file.
+
+    Args:
+        file_ (file): Some file which was opened for reading, in binary mode.
+        start (int, optional): The byte in `file_` which offset 0 refers to.
+
+    Returns:
+        callable[int, int] -> bytes: A function which reads up to some count, from some offset.
+
+    '''
+    if hasattr(os, 'pread'):
+        return lambda offset, size: os.pread(file_.fileno(), size, start + offset)
+
+    lock = threading.Lock()
+
+    def _read_at(offset, size):
+        with lock:
+            file_.seek(start + offset)
+
+            return file_.read(size)
+
+    return _read_at
+
+
+def _is_included(info, include):
+    '''bool: Check if a member matches `include`. See `rezzurect.utils.tar_extract.is_included`.'''
+    if not include:
+        return True
+
+    if info.filename.endswith('/'):
+        return False
+
+    name = posixpath.basename(info.filename)
+
+    return any(fnmatch.fnmatch(name, pattern) for pattern in include)
+
+
+def _get_infos(zip_file, exclude, include=None):
+    '''list[`zipfile.ZipInfo`]: Every member of `zip_file` which is included and isn't excluded.'''
+    return [
+        info for info in zip_file.infolist()
+        if _is_included(info, include) and not install_profile.is_excluded(info.filename, exclude)
+    ]
+
+
+def _make_directories(infos, destination):
+    '''list[`zipfile.ZipInfo`]: Create the folder of every member which is a folder.'''
+    directories = [info for info in infos if info.filename.endswith('/')]
+
+    # Folders are made up-front so that the workers never race to make the same one
+    for info in directories:
+        tar_extract.make_directory(_get_target(info, destination))
+
+    return directories
+
+
+def _set_directory_modes(directories, destination):
+    '''Restore the Unix permissions of every member which is a folder.'''
+    # Deepest folders first, in case a folder's permissions don't allow writing into it
+    for info in sorted(directories, key=lambda info: info.filename, reverse=True):
+        mode = stat.S_IMODE(_get_mode(info))
+
+        if mode:
+            os.chmod(_get_target(info, destination), mode)
+
+
+def extract(path, destination, processes=None, exclude=None, store=None, sibling='',
+            manifest=False, include=None):
+    '''Extract the ZIP archive at `path` into the `destination` folder.
+
+    Args:
+        path (str):
+            The absolute path to some ZIP archive.
+        destination (str):
+            The absolute path to the folder to extract into.
+        processes (int, optional):
+            The number of extraction processes. Default: one per CPU.
+        exclude (iterable[str], optional):
+            Install profile globs for the paths to skip. See `rezzurect.utils.install_profile`.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+        sibling (str, optional):
+            The install folder of another version of the same package. Files
+            which are unchanged since it was installed are hardlinked from it
+            instead of extracted. See `rezzurect.utils.delta_install`.
+        manifest (bool, optional):
+            If True, a manifest of the extracted files is written into `destination`.
+        include (iterable[str], optional):
+            `fnmatch` patterns for the file names of the members to extract.
+            If there are any, every other member (and every folder) is skipped.
+
+    '''
+    processes = processes or multiprocessing.cpu_count()
+
+    with zipfile.ZipFile(path, 'r') as zip_file:
+        infos = _get_infos(zip_file, exclude, include=include)
+
+    directories = _make_directories(infos, destination)
+    files = [info for info in infos if not info.filename.endswith('/')]
+    pending = _link_unchanged(files, destination, sibling)
+    jobs = [(path, destination, names, store) for names in _split(pending, processes)]
+
+    LOGGER.debug(
+        'Extracting "%s" files of "%s" with "%s" processes.', len(pending), path, len(jobs))
+
+    if len(jobs) > 1:
+        pool = multiprocessing.Pool(len(jobs))
+
+        try:
+            pool.map(_extract_batch, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            _extract_batch(job)
+
+    _set_directory_modes(directories, destination)
+
+    if manifest:
+        delta_install.write_manifest(destination, _get_entries(files))
+
+
+def extract_shared(read_at, size, destination, threads=None, exclude=None, store=None, sibling='',
+                   manifest=False):
+    '''Extract a ZIP archive which is held in memory, or in an open file, using threads.
+
+    `zlib` releases the GIL while it inflates, so threads extract in parallel.
+
+    Args:
+        read_at (callable[int, int] -> bytes):
+            A function which returns the archive's bytes at some offset, up to some count.
+            It's called from several threads at once.
+        size (int):
+            The size of the archive, in bytes.
+        destination (str):
+            The absolute path to the folder to extract into.
+        threads (int, optional):
+            The number of extraction threads. Default: one per CPU.
+        exclude (iterable[str], optional):
+            Install profile globs for the paths to skip.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+        sibling (str, optional):
+            The install folder of another version of the same package. Files
+            which are unchanged since it was installed are hardlinked from it
+            instead of extracted. See `rezzurect.utils.delta_install`.
+        manifest (bool, optional):
+            If True, a manifest of the extracted files is written into `destination`.
+
+    Raises:
+        Exception: The first error that any thread raised.
+
+    '''
+    threads = threads or multiprocessing.cpu_count()
+
+    with zipfile.ZipFile(_PositionalReader(read_at, size), 'r') as zip_file:
+        infos = _get_infos(zip_file, exclude)
+
+    directories = _make_directories(infos, destination)
+    files = [info for info in infos if not info.filename.endswith('/')]
+    pending = _link_unchanged(files, destination, sibling)
+    errors = []
+
+    def _extract(names):
+        try:
+            with zipfile.ZipFile(_PositionalReader(read_at, size), 'r') as zip_file:
+                for name in names:
+                    if errors:
+                        return
+
+                    extract_member(zip_file, zip_file.getinfo(name), destination, store=store)
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception('Zip members failed to extract.')
+            errors.append(error)
+
+    workers = [
+        threading.Thread(target=_extract, args=(names, )) for names in _split(pending, threads)]
+
+    LOGGER.debug('Extracting "%s" files with "%s" threads.', len(pending), len(workers))
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    if errors:
+        raise errors[0]
+
+    _set_directory_modes(directories, destination)
+
+    if manifest:
+        delta_install.write_manifest(destination, _get_entries(files))
+
+
+def extract_from_tar(fileobj, pattern, destination, memory_limit=DEFAULT_MEMORY_LIMIT, threads=None,
+                     exclude=None, store=None, sibling='', manifest=False):
+    '''Extract a ZIP archive which is inside of a TAR archive, without writing it to disk.
+
+    The ZIP member is copied out of the TAR stream into anonymous memory if
+    it fits in `memory_limit` or, otherwise, into a temporary file which is
+    deleted as soon as it's created. Nothing is left behind either way.
+
+    Args:
+        fileobj (file-like):
+            The compressed or uncompressed TAR data. It's only read forwards.
+        pattern (str):
+            An `fnmatch` pattern for the file name of the ZIP member.
+        destination (str):
+            The absolute path to the folder to extract into.
+        memory_limit (int, optional):
+            The largest ZIP archive, in bytes, which may be held in memory.
+        threads (int, optional):
+            The number of extraction threads. Default: one per CPU.
+        exclude (iterable[str], optional):
+            Install profile globs for the paths inside of the ZIP archive to skip.
+        store (`rezzurect.utils.file_store.FileStore`, optional):
+            If given, every extracted file is shared with this store.
+        sibling (str, optional):
+            The install folder of another version of the same package. Files
+            which are unchanged since it was installed are hardlinked from it
+            instead of extracted. See `rezzurect.utils.delta_install`.
+        manifest (bool, optional):
+            If True, a manifest of the extracted files is written into `destination`.
+
+    Returns:
+        str: The name of the extracted ZIP member or an empty string, if no member matched.
+
+    '''
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            if member.isreg() and fnmatch.fnmatch(os.path.basename(member.name), pattern):
+                break
+        else:
+            return ''
+
+        source = tar.extractfile(member)
+
+        if member.size and member.size <= memory_limit:
+            LOGGER.debug('Spooling "%s" into memory.', member.name)
+            spool = mmap.mmap(-1, member.size)
+            read_at = lambda offset, size: spool[offset:offset + size]
+        else:
+            LOGGER.debug('Spooling "%s" into a temporary file.', member.name)
+            spool = tempfile.TemporaryFile()
+            read_at = get_file_reader(spool)
+
+        try:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+
+                if not chunk:
+                    break
+
+                spool.write(chunk)
+
+            spool.flush()
+            extract_shared(
+                read_at,
+                member.size,
+                destination,
+                threads=threads,
+                exclude=exclude,
+                store=store,
+                sibling=sibling,
+                manifest=manifest,
+            )
+        finally:
+            spool.close()
+
+    return member.name